@@ -29,16 +29,69 @@ write_byte_data(address, register, value)
 """
 
 import smbus
+import iCogsStream
+import iCogsRecord
+import iCogsRegisters
+import iCogsWatch
 import logging
 import time
 import math
 import sys
 
+# numpy is only needed for the flicker analysis
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 SENSOR_ADDR = 0x44
 
 # The time between a write and subsequent read
 WAITTIME = 0.5
 
+# Full Scale Range in Lux for each setting of the range bits B1 & B0 of command register 2
+FULLSCALERANGES = [1000, 4000, 16000, 64000]
+# In IR sensing the full scale range is always this, whatever the range bits
+IRFULLSCALE = 65535
+# ADC resolution in counts, and integration time in seconds, for each setting of bits B3 & B2
+ADCRESOLUTIONS = [65536, 4096, 256, 16]
+INTEGRATIONTIMES = [0.090, 0.00563, 0.000351, 0.000022]
+
+# Readings above this fraction of the ADC resolution are treated as saturated
+SATURATION = 0.95
+# Only step down to a lower range when the reading is below this fraction of it
+UNDERRANGE = 0.8
+
+# The range and resolution settings and the Lux per count, cached by the auto ranging
+autorange = {"range": None, "resolution": None, "scale": None}
+
+#Interrupt Persist, the number of integration cycles out of the window before the flag is set
+PERSIST_1 = 0b00
+PERSIST_4 = 0b01
+PERSIST_8 = 0b10
+PERSIST_16 = 0b11
+
+# The smallest distance in counts of the threshold window from the reading, so noise does not trigger it
+MINWINDOW = 2
+
+#Operation Modes, bits 7 - 5 of the Command Register
+POWERDOWN = 0b000
+ALS_ONCE = 0b001
+IR_ONCE = 0b010
+ALS_CONTINUOUS = 0b101
+IR_CONTINUOUS = 0b110
+
+# The fraction of the IR reading, scaled by IRFULLSCALE as in CalculateLux, removed from the ALS Lux value
+# to compensate for IR. This depends on the light source and should be calibrated against a lux meter.
+IRCOEFFICIENT = 0.5
+
+# The paired ALS and IR readings and the compensated Lux values are published here
+dual_stream = iCogsStream.SampleStream("Ls.1 ALS IR")
+
+# The number of samples captured, and the number in each window analysed, for flicker analysis
+FLICKERSAMPLES = 4096
+FLICKERWINDOW = 512
+
 def ReadAllData():
     # Read out all 255 bytes from the device
     # capture all the readings for printing later
@@ -57,45 +110,31 @@ def ReadAllData():
         print(" ")
     return
 
+def ReadRegisterMap(volatile=False):
+    # Read the configuration registers in the register map, a block at a time, and print them decoded
+    # The status and data registers are only read if volatile is True, as reading them can clear flags
+    snapshot = iCogsRegisters.ReadSnapshot(bus, SENSOR_ADDR, "Ls.1", volatile=volatile)
+    iCogsRegisters.PrintSnapshot("Ls.1", snapshot)
+    return
+
+def WatchRegisters():
+    # Repeatedly read a range of registers and print the fields that change, until Ctrl-C is pressed
+    start = int(input("First register (hex):"), 16)
+    length = int(input("Number of registers:"))
+    rate = float(input("Reads per second:"))
+    if length < 1 or rate <= 0:
+        print("At least 1 register and a positive rate are required")
+        return
+    iCogsWatch.Watch(bus, SENSOR_ADDR, "Ls.1", start, length, rate)
+    return
+
 def ReadCommandReg1():
     #Read out and decode the first command register
     reg_addr = 0x00
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Comand Register 1 setting (0x00):%x" % byte)
-    # Decode the values
-    # Interrupt Persist bits
-    ipb = (byte & 0b00000011)
-    logging.debug("Interrupt Persist Selection %s" % ipb)
-    if ipb == 0b00:
-        print("Ls.1 Interrupt Persist Number of Cycles: 1")
-    elif ipb == 0b01:
-        print("Ls.1 Interrupt Persist Number of Cycles: 4")
-    elif ipb == 0b10:
-        print("Ls.1 Interrupt Persist Number of Cycles: 8")
-    elif ipb == 0b11:
-        print("Ls.1 Interrupt Persist Number of Cycles: 16")
-
-    # Interrupt Flag Bit
-    ifb = (byte & 0b00000100) >> 2
-    logging.debug("Interrupt Flag Bit (1=Interrupt is triggered) %s" % ifb)
-    if ifb:
-        print("Ls.1 Interrupt Flag Bit: Interrupt is Triggered")
-    else:
-        print("Ls.1 Interrupt Flag Bit: Interrupt is cleared or not triggered yet")
-
-    # Operation Mode Bits
-    omb = (byte & 0b11100000) >> 5
-    logging.debug("Operation Mode Bits %s" % omb)
-    if omb == 0b000:
-        print("Ls.1 Operation Mode: Powered down (Default)")
-    elif omb == 0b001:
-        print("Ls.1 Operation Mode: Measuring ALS once every integration cycle")
-    elif omb == 0b010:
-        print("Ls.1 Operation Mode: IR Once")
-    elif omb == 0b101:
-        print("Ls.1 Operation Mode: Measuring ALS continuously")
-    elif omb == 0b110:
-        print("Ls.1 Operation Mode: Measuring IR continuously")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ls.1", reg_addr, byte)
     return
 
 def ReadCommandReg2():
@@ -103,30 +142,8 @@ def ReadCommandReg2():
     reg_addr = 0x01
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Comand Register 2 setting (0x01):%x" % byte)
-    # Decode the values
-    # Full Scale Range bits
-    fcr = (byte & 0b00000011)
-    logging.debug("Full Scale Range Selection %s" % fcr)
-    if fcr == 0b00:
-        print("Ls.1 Full Scale Range: 1")
-    elif fcr == 0b01:
-        print("Ls.1 Full Scale Range: 2")
-    elif fcr == 0b10:
-        print("Ls.1 Full Scale Range: 3")
-    elif fcr == 0b11:
-        print("Ls.1 Full Scale Range: 4")
-
-    # ADC Resolution Data
-    adc = (byte & 0b00001100) >> 2
-    logging.debug("ADC Resolution Bit %s" % adc)
-    if adc == 0b00:
-        print("Ls.1 ADC Resolution Data: 16")
-    elif adc == 0b01:
-        print("Ls.1 ADC Resolution Data: 12")
-    elif adc == 0b10:
-        print("Ls.1 ADC Resolution Data: 8")
-    elif adc == 0b11:
-        print("Ls.1 ADC Resolution Data: 4")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ls.1", reg_addr, byte)
     return
 
 def TurnOffSensor():
@@ -228,6 +245,268 @@ def SensorRangeResolution():
 
 
 
+def SetRangeResolution(range_bits, resolution_bits):
+    # Set the full scale range and ADC resolution in command register 2 with a single write,
+    # then wait for one conversion at the new resolution rather than WAITTIME
+    # The cached Lux per count is updated to match
+    reg_addr = 0x01
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    towrite = iCogsRegisters.EncodeFields("Ls.1", reg_addr, {"RES": resolution_bits, "RANGE": range_bits}, byte)
+    logging.debug("Byte to write to set range %d and resolution %d bits %x" % (FULLSCALERANGES[range_bits], resolution_bits, towrite))
+    bus.write_byte_data(SENSOR_ADDR, reg_addr, towrite)
+    # The conversion in progress when the settings changed is discarded, so allow for 2
+    time.sleep(INTEGRATIONTIMES[resolution_bits] * 2)
+    autorange["range"] = range_bits
+    autorange["resolution"] = resolution_bits
+    autorange["scale"] = FULLSCALERANGES[range_bits] / ADCRESOLUTIONS[resolution_bits]
+    logging.info("Auto Range set to range %d Lux, ADC resolution %d, scale %f Lux per count" % (FULLSCALERANGES[range_bits], ADCRESOLUTIONS[resolution_bits], autorange["scale"]))
+    return
+
+def InitialiseAutoRange():
+    # Read the current range and resolution from command register 2 into the auto ranging cache
+    reg_addr = 0x01
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    autorange["range"] = byte & 0b00000011
+    autorange["resolution"] = (byte & 0b00001100) >> 2
+    autorange["scale"] = FULLSCALERANGES[autorange["range"]] / ADCRESOLUTIONS[autorange["resolution"]]
+    logging.info("Auto Range initialised from command register 2 (0x01):%x" % byte)
+    return
+
+def ChooseResolution(lux, range_bits, accuracy):
+    # Return the resolution bits with the shortest integration time that gives a reading of the given
+    # Lux at least 1 / accuracy counts, i.e. the step between counts is within the accuracy
+    # If none is good enough the highest resolution is returned
+    for resolution_bits in (0b11, 0b10, 0b01):
+        counts = lux * ADCRESOLUTIONS[resolution_bits] / FULLSCALERANGES[range_bits]
+        if counts * accuracy >= 1:
+            return resolution_bits
+    return 0b00
+
+def AutoRangeLux(accuracy=0.01):
+    # Read and return the Lux value, adjusting the range and resolution as the light level changes
+    # accuracy is the target accuracy as a fraction of the reading, e.g. 0.01 for 1%
+    # A saturated reading moves up a range and is taken again. Otherwise the lowest range that will not
+    # saturate and the fastest resolution that meets the accuracy are chosen for the next reading.
+    # The sensor must be in ALS continuous mode
+    if autorange["scale"] is None:
+        InitialiseAutoRange()
+    lux = 0
+    for attempt in range(len(FULLSCALERANGES) + len(ADCRESOLUTIONS)):
+        range_bits = autorange["range"]
+        resolution_bits = autorange["resolution"]
+        data = ReadDataRegisters()
+        lux = data * autorange["scale"]
+        if data >= ADCRESOLUTIONS[resolution_bits] * SATURATION and range_bits < len(FULLSCALERANGES) - 1:
+            logging.debug("Reading %d saturated at range %d" % (data, FULLSCALERANGES[range_bits]))
+            SetRangeResolution(range_bits + 1, resolution_bits)
+            continue
+        new_range = range_bits
+        while new_range > 0 and lux < FULLSCALERANGES[new_range - 1] * UNDERRANGE:
+            new_range = new_range - 1
+        new_resolution = ChooseResolution(lux, new_range, accuracy)
+        if new_range != range_bits or new_resolution != resolution_bits:
+            SetRangeResolution(new_range, new_resolution)
+            if data * accuracy < 1 and data > 0:
+                # This reading did not meet the accuracy, so take it again with the new settings
+                continue
+        break
+    logging.info("Auto Ranged LUX value %f" % lux)
+    return lux
+
+def AutoRangeReadings():
+    # Print auto ranged Lux readings and the reading rate until Ctrl-C is pressed
+    SensorALSMode()
+    print("Printing Auto Ranged Lux readings, press Ctrl-C to stop")
+    readings = 0
+    start = time.monotonic()
+    try:
+        while True:
+            lux = AutoRangeLux()
+            readings = readings + 1
+            print("LUX: %10.3f  Range: %5d  ADC Resolution: %5d" % (lux, FULLSCALERANGES[autorange["range"]], ADCRESOLUTIONS[autorange["resolution"]]))
+            time.sleep(INTEGRATIONTIMES[autorange["resolution"]])
+    except KeyboardInterrupt:
+        print("")
+    print("%d readings at %f readings per second" % (readings, readings / (time.monotonic() - start)))
+    return
+
+
+def SetInterruptPersist(persist):
+    # Set the interrupt persist bits 1 & 0 of the Command Register 0x00
+    # persist is one of PERSIST_1, PERSIST_4, PERSIST_8 or PERSIST_16
+    if not iCogsRegisters.WriteFields(bus, SENSOR_ADDR, "Ls.1", 0x00, {"PRST": persist}, 0):
+        print("Sensor Interrupt Persist not set")
+    return
+
+def SetInterruptThresholds(low, high):
+    # Set the low and high interrupt thresholds, in counts, in registers 0x04 - 0x07
+    # All 4 registers are written in one transaction so the window is never half updated
+    data_addr = 0x04
+    values = [low & 0xff, low >> 8, high & 0xff, high >> 8]
+    logging.debug("Interrupt Threshold values to write (0x04 - 0x07):%s" % values)
+    bus.write_i2c_block_data(SENSOR_ADDR, data_addr, values)
+    readback = bus.read_i2c_block_data(SENSOR_ADDR, data_addr, 4)
+    logging.info("Interrupt Threshold Registers After setting (0x04 - 0x07):%s" % readback)
+    if readback != values:
+        print("Interrupt Thresholds not set to Low %d, High %d" % (low, high))
+    return
+
+def ArmThresholdWindow(hysteresis=0.1, persist=PERSIST_4):
+    # Set the interrupt threshold window around the current reading, hysteresis is the fraction of the
+    # reading either side of it, and clear the interrupt flag by reading the Command Register
+    # Returns the reading, in counts, the window is centred on
+    data = ReadDataRegisters()
+    width = max(int(data * hysteresis), MINWINDOW)
+    low = max(data - width, 0)
+    high = min(data + width, 0xffff)
+    SetInterruptPersist(persist)
+    SetInterruptThresholds(low, high)
+    bus.read_byte_data(SENSOR_ADDR, 0x00)
+    logging.info("Threshold window armed around %d counts, low %d, high %d" % (data, low, high))
+    return data
+
+def CheckThresholdFlag(hysteresis=0.1, persist=PERSIST_4):
+    # Check only the interrupt flag bit 2 of the Command Register 0x00, reading it clears the flag
+    # If the light level has moved out of the window, re-arm the window around the new reading and
+    # return the new reading in Lux, otherwise return None
+    reg_addr = 0x00
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    if (byte & 0b00000100) >> 2 == 0:
+        return None
+    if autorange["scale"] is None:
+        InitialiseAutoRange()
+    data = ArmThresholdWindow(hysteresis, persist)
+    lux = data * autorange["scale"]
+    logging.info("Threshold window crossed, new LUX value %f" % lux)
+    return lux
+
+def ThresholdChangeMonitor(interval=1.0, hysteresis=0.1, persist=PERSIST_4):
+    # Print the Lux reading each time the light level changes by more than the hysteresis,
+    # checking only the interrupt flag every interval seconds, until Ctrl-C is pressed
+    SensorALSMode()
+    InitialiseAutoRange()
+    data = ArmThresholdWindow(hysteresis, persist)
+    print("Light level %f Lux, waiting for changes, press Ctrl-C to stop" % (data * autorange["scale"]))
+    try:
+        while True:
+            time.sleep(interval)
+            lux = CheckThresholdFlag(hysteresis, persist)
+            if lux is not None:
+                print("%s Light level changed to %f Lux" % (time.strftime("%H:%M:%S"), lux))
+    except KeyboardInterrupt:
+        print("")
+    return
+
+
+def CaptureFlicker(samples=FLICKERSAMPLES, resolution_bits=0b10):
+    # Capture samples back to back at the highest rate the bus allows, for flicker analysis
+    # The sensor is put in ALS continuous mode at the given low resolution (default 8 bit, 0.35mS
+    # integration) in the current range, and the data registers are read as a single word each time
+    # Returns arrays of the times in seconds and the readings in counts, and the achieved sample rate
+    if autorange["range"] is None:
+        InitialiseAutoRange()
+    SetRangeResolution(autorange["range"], resolution_bits)
+    SensorALSMode()
+    times = numpy.empty(samples, dtype=numpy.float64)
+    values = numpy.empty(samples, dtype=numpy.uint16)
+    # Look up the functions once, outside the loop
+    read_word = bus.read_word_data
+    clock = time.perf_counter
+    for n in range(samples):
+        values[n] = read_word(SENSOR_ADDR, 0x02)
+        times[n] = clock()
+    rate = (samples - 1) / (times[-1] - times[0])
+    logging.info("Flicker capture of %d samples at %f samples per second" % (samples, rate))
+    return [times, values, rate]
+
+def FlickerMetrics(times, values, window=FLICKERWINDOW):
+    # Analyse each window of the captured samples for flicker
+    # The samples are resampled onto evenly spaced times, as the bus reads are not evenly spaced
+    # Returns a list of [start time, dominant frequency in Hz, percent flicker, flicker index] per window
+    results = []
+    for start in range(0, len(values) - window + 1, window):
+        t = times[start:start + window]
+        even_t = numpy.linspace(t[0], t[-1], window)
+        v = numpy.interp(even_t, t, values[start:start + window].astype(numpy.float64))
+        spacing = even_t[1] - even_t[0]
+        mean = v.mean()
+        # Dominant frequency from the FFT, ignoring the DC term
+        spectrum = numpy.abs(numpy.fft.rfft(v - mean))
+        frequencies = numpy.fft.rfftfreq(window, spacing)
+        dominant = frequencies[numpy.argmax(spectrum[1:]) + 1]
+        # Percent Flicker is the modulation depth, Flicker Index is the area above the mean over the total area
+        vmax = v.max()
+        vmin = v.min()
+        if vmax + vmin > 0:
+            percent = 100 * (vmax - vmin) / (vmax + vmin)
+        else:
+            percent = 0.0
+        total = v.sum()
+        if total > 0:
+            index = numpy.clip(v - mean, 0, None).sum() / total
+        else:
+            index = 0.0
+        results.append([t[0] - times[0], dominant, percent, index])
+    return results
+
+def FlickerAnalysis():
+    # Capture the light level at a high rate and print the flicker metrics for each window
+    if numpy is None:
+        print("Flicker analysis requires numpy, install it with: sudo apt-get install python3-numpy")
+        return
+    times, values, rate = CaptureFlicker()
+    print("Achieved sample rate %.1f samples per second, flicker up to %.1f Hz can be detected" % (rate, rate / 2))
+    print("  Time (s)  Frequency (Hz)  Percent Flicker  Flicker Index")
+    for start, dominant, percent, index in FlickerMetrics(times, values):
+        print("  %8.3f  %14.1f  %15.1f  %13.3f" % (start, dominant, percent, index))
+    return
+
+
+def OneShotReading(command, mode):
+    # Start a single conversion in the given mode (ALS_ONCE or IR_ONCE) by writing the Command Register,
+    # given the rest of its value in command, wait for exactly the integration time and read the result
+    # There is no read back of the Command Register and no WAITTIME, as the result shows it worked
+    reg_addr = 0x00
+    bus.write_byte_data(SENSOR_ADDR, reg_addr, (command & 0b00011111) | (mode << 5))
+    time.sleep(INTEGRATIONTIMES[autorange["resolution"]])
+    return bus.read_word_data(SENSOR_ADDR, 0x02)
+
+def ReadALSIRPair():
+    # Take an ALS and an IR one shot reading back to back and return the paired, timestamped sample
+    # with the ALS value scaled to Lux, the IR value scaled by the IR full scale range the same as
+    # CalculateLux, and the IR compensated Lux value
+    if autorange["scale"] is None:
+        InitialiseAutoRange()
+    command = bus.read_byte_data(SENSOR_ADDR, 0x00)
+    timestamp = time.time()
+    als = OneShotReading(command, ALS_ONCE) * autorange["scale"]
+    ir = OneShotReading(command, IR_ONCE) * IRFULLSCALE / ADCRESOLUTIONS[autorange["resolution"]]
+    lux = max(als - IRCOEFFICIENT * ir, 0)
+    sample = {"time": timestamp, "als": als, "ir": ir, "lux": lux}
+    logging.info("ALS / IR pair %s" % sample)
+    return sample
+
+def DualChannelReadings(interval=0.1):
+    # Publish and print paired ALS / IR readings every interval seconds until Ctrl-C is pressed
+    # The integration time is the main part of the time taken, so 12 bit (5.6mS) or lower resolution
+    # gives many pairs per second
+    InitialiseAutoRange()
+    print("Printing ALS / IR readings, press Ctrl-C to stop")
+    pairs = 0
+    start = time.monotonic()
+    try:
+        while True:
+            sample = ReadALSIRPair()
+            dual_stream.Publish(sample)
+            pairs = pairs + 1
+            print("%s ALS: %10.3f  IR: %10.3f  Compensated LUX: %10.3f" % (time.strftime("%H:%M:%S", time.localtime(sample["time"])), sample["als"], sample["ir"], sample["lux"]))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("")
+    print("%d pairs at %f pairs per second" % (pairs, pairs / (time.monotonic() - start)))
+    return
+
+
 #### Calcuation routines
 
 def ReadDataRegisters():
@@ -272,8 +551,8 @@ def FullScaleRange(mode):
     # the value returned is based on the mode of operation, "ALS" or "IR"
     # If using IR sensing the value returned is always 65535, else it is based on B1 & B0
     if mode == "IR":
-        logging.info("Full Scale Range mode is IR, returning 65535")
-        return 65535
+        logging.info("Full Scale Range mode is IR, returning %d" % IRFULLSCALE)
+        return IRFULLSCALE
 
     # retrieve data ad decode
     reg_addr = 0x01
@@ -345,7 +624,13 @@ def HelpText():
     print("1 - Read Command Register 1")
     print("2 - Read Command Register 2")
     print("A - Read all data blocks")
+    print("M - Read and decode the configuration registers in the register map")
+    print("G - Watch a range of registers for changes")
     print("L - Calculate lux Reading")
+    print("R - Auto Ranged lux Readings")
+    print("C - Monitor for lux Changes")
+    print("F - Flicker Analysis")
+    print("D - Dual Channel ALS / IR Readings")
     print("t - Turn on ALS Mode")
     print("i - Turn on IR Mode")
     print("o - Turn off Sensor")
@@ -362,7 +647,7 @@ print ("")
 print ("Press h for help")
 print ("")
 
-bus = smbus.SMBus(1)
+bus = iCogsRecord.OpenBus(smbus.SMBus, 1)
 
 logging.basicConfig(filename="Ls_1.txt", filemode="w", level=logging.DEBUG, format='%(asctime)s:%(levelname)s:%(message)s')
 
@@ -382,8 +667,20 @@ while True:
         ReadCommandReg2()
     elif choice == "L":
         CalculateLux()
+    elif choice == "R":
+        AutoRangeReadings()
+    elif choice == "C":
+        ThresholdChangeMonitor()
+    elif choice == "F":
+        FlickerAnalysis()
+    elif choice == "D":
+        DualChannelReadings()
     elif choice == "A":
         ReadAllData()
+    elif choice == "M":
+        ReadRegisterMap()
+    elif choice == "G":
+        WatchRegisters()
     elif choice == "t":
         SensorRangeResolution()
         SensorALSMode()
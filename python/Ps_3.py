@@ -9,13 +9,9 @@ The Ps.3 is based on the MPL3115A2 Absolute Pressure Sensor, but like all iCogs,
 comes with an additional EEPROM to provide the capability to store additional information e.g
 enviromental specific data.
 
-This module uses 'Repeated Start' (see www.i2c-bus.org/repeated-start-condition) so requires
-the following
-1. Navigate to /sys/module/i2c_bcm2708/parameters
-2. Modify 'combined'
-    sudo nano combined
-    change N to Y
-    Save and Exit
+This module uses 'Repeated Start' (see www.i2c-bus.org/repeated-start-condition). This is provided
+by iCogsBus, which sends each register read as a combined write / read transaction, so the
+i2c_bcm2708 'combined' parameter does not need to be changed and no superuser access is required.
 
 Note: The operating modes can only be changed when in standby.
 
@@ -26,14 +22,16 @@ iCogs range of sensors.
 This program is free software; you can redistribute it and / or modify it under the terms of
 the GNU General Public licence as published by the Free Foundation version 2 of the licence.
 
-This uses the SMBus functionality of the Raspberry Pi to read and write data for the sensors.
+This uses the iCogsBus I2C functionality to read and write data for the sensors.
 
-SMBus Commands used
+iCogsBus Commands used
 
-iCog = smbus.SMBus(i2cbus number)
+iCog = iCogsBus.I2CBus(i2cbus number)
 
 read_byte_data(address, register) - returns a string containing the value in hex
 write_byte_data(address, register, value)
+read_i2c_block_data(address, register, length) - returns length consecutive registers
+read_combined(address, [(register, length), ...]) - reads several register blocks in one go
 
 """
 
@@ -55,12 +53,24 @@ write_byte_data(address, register, value)
 # read and decode registers
 
 
-import smbus
+import iCogsBus
+import iCogsDecode
+import iCogsPoll
+import iCogsRecord
+import iCogsRegisters
+import iCogsSampler
+import iCogsStream
+import iCogsWatch
 import logging
 import time
 import math
 import sys
-import subprocess
+
+# numpy is only needed to convert batches of pressure readings to altitude
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 SENSOR_ADDR = 0x60
 
@@ -79,20 +89,33 @@ RAW = 0b01000000
 ALTIMETER = 0b10000000
 BAROMETER = 0b00000000
 
-def SetRepeatedStartMode():
-    # This function sets the I2C bus to use Repeated Start Mode
-    # Command to run as Superuser is
-    #   echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined
-    logging.info("Setting Repeated Start for I2C comms")
-    try:
-        response = subprocess.call(["echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined"], shell=True)
-        logging.debug("Used subprocess call to set Repeated Start command and got this response %x" % response)
-    except:
-        e = sys.exc_info()
-        logging.critical("Failed to Set Repeated Start mode, program aborted with response %s: %s" % (e[0], e[1]))
-        print("Failed to Set Repeated Start mode, program aborted")
-        sys.exit()
+# Constants of the formula used by the sensor to convert pressure to altitude
+# altitude = ALTITUDE_SCALE * (1 - (pressure / sea level pressure) ^ ALTITUDE_EXPONENT)
+ALTITUDE_SCALE = 44330.77
+ALTITUDE_EXPONENT = 0.1902632
+
+# The equivalent sea level pressure in Pa, cached from the BAR_IN registers
+barometric = {"sealevel": None}
+
+# Ps.3 periodic readings are published here, e.g. for an iCogsHistory to follow
+sample_stream = iCogsStream.SampleStream("Ps.3 Samples")
+
+# DR_STATUS flags, overwrite and data ready for Pressure / Temperature, Pressure and Temperature
+PTOW = 0b10000000
+POW = 0b01000000
+TOW = 0b00100000
+PTDR = 0b00001000
+PDR = 0b00000100
+TDR = 0b00000010
 
+# The minimum time between samples, in seconds, for each oversample ratio (CTRL_REG1 bits 5 - 3)
+OVERSAMPLETIMES = [0.006, 0.010, 0.018, 0.034, 0.066, 0.130, 0.258, 0.512]
+
+# The maximum time to wait for new data, in seconds
+DATATIMEOUT = 2.0
+
+# Counts of the data ready gated readings, reset by EnableDataEvents
+dataready = {"samples": 0, "polls": 0, "pressure_overwrites": 0, "temperature_overwrites": 0}
 
 def ReadAllData():
     # Read out all 255 bytes from the device
@@ -112,6 +135,24 @@ def ReadAllData():
         print(" ")
     return
 
+def ReadRegisterMap(volatile=False):
+    # Read the configuration registers in the register map, a block at a time, and print them decoded
+    # The status and data registers are only read if volatile is True, as reading them can clear flags
+    snapshot = iCogsRegisters.ReadSnapshot(bus, SENSOR_ADDR, "Ps.3", volatile=volatile)
+    iCogsRegisters.PrintSnapshot("Ps.3", snapshot)
+    return
+
+def WatchRegisters():
+    # Repeatedly read a range of registers and print the fields that change, until Ctrl-C is pressed
+    start = int(input("First register (hex):"), 16)
+    length = int(input("Number of registers:"))
+    rate = float(input("Reads per second:"))
+    if length < 1 or rate <= 0:
+        print("At least 1 register and a positive rate are required")
+        return
+    iCogsWatch.Watch(bus, SENSOR_ADDR, "Ps.3", start, length, rate)
+    return
+
 def WhoAmI():
     # Read out and confirm the 'Who Am I' value of 0xC4
     byte = bus.read_byte_data(SENSOR_ADDR,0x0C)
@@ -157,17 +198,17 @@ def SoftwareReset():
     towrite = byte | value
     logging.debug("Byte to write to perform Software Reset %x" % towrite)
     bus.write_byte_data(SENSOR_ADDR, reg_addr, towrite)
-    time.sleep(0.5)
-    in_st = 1
-    while in_st:
-        # Wait while the Software Reset runs
+    print("Sensor In Software Reset")
+    def ResetComplete():
+        # The sensor does not respond until it has rebooted, which the poll treats as not complete
         byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
         logging.info ("Control Register 1 After enabling Software Reset:%x" % byte)
-        in_st = (byte & value) >> 2
-        if in_st == 0b1:
-            print("Sensor In Software Reset")
-    print ("Software Reset Completed")
-    logging.debug("Software Reset Completed")
+        return (byte & value) == 0
+    if iCogsPoll.PollUntil(ResetComplete, expected=0.001, timeout=1.0, max_interval=0.1, name="Ps.3 Software Reset"):
+        print ("Software Reset Completed")
+        logging.debug("Software Reset Completed")
+    else:
+        print ("Software Reset NOT Completed, timed out waiting for the sensor")
     return
 
 def SetOutputMode(mode):
@@ -246,6 +287,48 @@ def ReadAltimeterMode():
     logging.info("Altimeter - Barometer Mode Control Register is Barometer Mode")
     return BAROMETER
 
+def WriteRegisterBlock(reg_addr, values, name):
+    # Write the values to consecutive registers starting at reg_addr in a single transaction, so the
+    # sensor never uses a half updated multi byte setting, then verify them all with a single read
+    # name is used to describe the registers in the log and messages
+    # Returns True if the values read back match
+    logging.debug("%s values to write from register %x: %s" % (name, reg_addr, values))
+    bus.write_i2c_block_data(SENSOR_ADDR, reg_addr, values)
+    readback = bus.read_i2c_block_data(SENSOR_ADDR, reg_addr, len(values))
+    logging.info("%s after writing the required values: %s" % (name, readback))
+    if readback == list(values):
+        print("%s set to the requested values" % name)
+        return True
+    print("%s NOT set to the requested values, read back %s" % (name, readback))
+    return False
+
+def SignedByte(value):
+    # Return the given signed value as an 8 bit 2's compliment byte
+    return int(value) & 0xff
+
+def SetOffsets(pressure, temperature, altitude):
+    # Set the user offsets OFF_P (0x2B), OFF_T (0x2C) and OFF_H (0x2D) in one transaction
+    # pressure is in Pa (4 Pa per bit), temperature in Deg C (0.0625 Deg C per bit) and altitude in
+    # meters (1 m per bit), each limited to a signed 8 bit value
+    values = [SignedByte(max(min(round(pressure / 4), 127), -128)),
+              SignedByte(max(min(round(temperature / 0.0625), 127), -128)),
+              SignedByte(max(min(round(altitude), 127), -128))]
+    return WriteRegisterBlock(0x2B, values, "Pressure, Temperature and Altitude Offsets (OFF_P, OFF_T, OFF_H)")
+
+def SetTargetsWindows(pressure_target, temperature_target, pressure_window, temperature_window):
+    # Set the pressure / altitude and temperature targets and windows used for the threshold interrupts,
+    # P_TGT (0x16, 0x17), T_TGT (0x18), P_WND (0x19, 0x1A) and T_WND (0x1B), in one transaction
+    # In Barometer mode the pressure values are in Pa (2 Pa per bit), in Altimeter mode in meters
+    # The temperature values are in whole Deg C
+    if ReadAltimeterMode() == ALTIMETER:
+        p_tgt = int(pressure_target) & 0xffff
+        p_wnd = int(pressure_window) & 0xffff
+    else:
+        p_tgt = int(pressure_target / 2) & 0xffff
+        p_wnd = int(pressure_window / 2) & 0xffff
+    values = [p_tgt >> 8, p_tgt & 0xff, SignedByte(temperature_target), p_wnd >> 8, p_wnd & 0xff, int(temperature_window) & 0xff]
+    return WriteRegisterBlock(0x16, values, "Pressure and Temperature Targets and Windows")
+
 def SetBarometricInput(sealevel):
     # This is used to calibrate the sensor for the difference between current altitude and sea level.
     # input is the equivalent Sea level presure, in 2 Pa units
@@ -254,9 +337,8 @@ def SetBarometricInput(sealevel):
     # The value stored in the register is in 2 Pa units, so divide given value by 2 and remove fraction
     sealevelvalue = int(sealevel / 2)
     logging.info("Requested Sea Level Value and equivalent data to write: %f / %f" % (sealevel, sealevelvalue))
-    # Read out current reading first
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    # Read out current reading first, both registers in one transaction
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[0], 2)
     logging.debug("Barometric Input Equivalent Sea Level current values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
     current_offset = (data_h << 8) + data_l
     logging.info("Current Sea Level offset %f and requried Sea Level Offset %f" % (current_offset, sealevelvalue))
@@ -264,20 +346,12 @@ def SetBarometricInput(sealevel):
         # The value required is different to the value currently set
         towrite_h = (sealevelvalue >> 8)
         towrite_l = (sealevelvalue & 0b0000000011111111)
-        # towrite_l may be 2 bytes, need to check during testing
-        logging.debug("New Sea Levels (high & low bytes) to Write in registers (%x, %x): %x / %x)" % (towrite_h, towrite_l, data_addr[0], data_addr[1]))
-        bus.write_byte_data(SENSOR_ADDR, data_addr[0], towrite_h)
-        time.sleep(WAITTIME)
-        bus.write_byte_data(SENSOR_ADDR, data_addr[1], towrite_l)
-        time.sleep(WAITTIME)
-        byte_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-        byte_l = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
-        logging.info ("Set Barometric Input Equivalent Sea Level after writing the required value: %x /  %x" % (byte_h, byte_l))
-        byte = (byte_h << 8) + byte_l
-        if byte == sealevelvalue:
-            print("Barometric Input Equivalent Sea Level set to the requested value: %x" % byte)
+        logging.debug("New Sea Levels (high & low bytes) to Write in registers (%x, %x): %x / %x)" % (data_addr[0], data_addr[1], towrite_h, towrite_l))
+        # Both bytes are written together, so the sensor never sees a half updated sea level
+        if WriteRegisterBlock(data_addr[0], [towrite_h, towrite_l], "Barometric Input Equivalent Sea Level"):
+            barometric["sealevel"] = sealevelvalue * 2
         else:
-            print("Barometric Input Equivalent Sea Level NOT set to the requested value: %x" % byte)
+            barometric["sealevel"] = None
     else:
         logging.debug("Barometric Input Equivalent Sea Level is already set to the requested value")
     return
@@ -287,108 +361,41 @@ def ReadBarometricOffset():
     # Value stored is the equivalent Sea level presure, in 2 Pa units
     # Default value is 1 standard atmosphere (atm) is defined as 101.325 kPa
     data_addr = [0x14, 0x15]
-    # Read out current reading
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    # Read out current reading, both registers in one transaction
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[0], 2)
     logging.debug("Barometric Input Equivalent Sea Level current values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
     current_offset = ((data_h << 8) + data_l) * 2
     logging.info("Current Sea Level offset %f" % current_offset)
     print("Barometric Input Equivalent Sea Level is set to: %d" % current_offset)
-    return
+    barometric["sealevel"] = current_offset
+    return current_offset
 
 def ReadControlRegister1():
     #Read out and decode Control Register 1 0x26
     reg_addr = 0x26
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 1 reading (%x):%x" % (reg_addr,byte))
-    # Decode the values
-    # SBYB - perodic reading mode
-    sbyb = (byte & 0b00000001)
-    logging.debug("System Mode %s" % sbyb)
-    if sbyb == 0b1:
-        print("Ps.3 System Mode is ACTIVE")
-    else:
-        print("Ps.3 System Mode is in STANDBY")
-    # Software Reset
-    sr = (byte & 0b00000100) >> 2
-    logging.debug("Software Reset Flag %s" % sr)
-    if sr == 0b1:
-        print("Ps.3 Software Reset  is Enabled")
-    else:
-        print("Ps.3 Software Reset is Disabled")
-    # Raw Mode
-    raw = (byte & 0b01000000) >> 6
-    logging.debug("Raw Mode  Flag %s" % raw)
-    if raw == 0b1:
-        print("Ps.3 Raw Mode is Enabled")
-    else:
-        print("Ps.3 Raw Mode is Disabled")
-    # Altitude / Barometric Mode
-    aorb = (byte & 0b10000000) >> 7
-    logging.debug("Altitude or Barometric Mode Flag %s" % aorb)
-    if aorb == 0b1:
-        print("Ps.3 Sensor is in Altimeter Mode")
-    else:
-        print("Ps.3 Sensor is in Barometer Mode")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ps.3", reg_addr, byte)
     return
 
 
 ######## Calculation Routines Used
 
-def TwosCompliment(value):
-    # Convert the given 12bit hex value to decimal using 2's compliment
-    return -(value & 0b100000000000) | (value & 0b011111111111)
-
-def TwosCompliment20(value):
-    # Convert the given 20bit hex value to decimal using 2's compliment
-    return -(value & 0b10000000000000000000) | (value & 0b01111111111111111111)
-
-def SignedNumber16(value):
-    # Takes the given number and return a signed version of it
-    # Assumes the number is 16 bit
-    sign = (value & 0b1000000000000000) >> 15
-    value = value & 0b0111111111111111
-    if sign == 0b1:
-        # Sign bit is set, so number is negative
-        value = value * -1
-    return value
-
-
-def SignedNumber24(value):
-    # Takes the given number and return a signed version of it
-    # Assumes the number is 24 bit
-    sign = (value & 0b100000000000000000000000) >> 23
-    value = value & 0b011111111111111111111111
-    if sign == 0b1:
-        # Sign bit is set, so number is negative
-        value = value * -1
-    return value
-
-def SignedNumber32(value):
-    # Takes the given number and return a signed version of it
-    # Assumes the number is 24 bit
-    sign = (value & 0b10000000000000000000000000000000) >> 31
-    value = value & 0b01111111111111111111111111111111
-    if sign == 0b1:
-        # Sign bit is set, so number is negative
-        value = value * -1
-    return value
-
 def ReadTemperature():
     # Read the data out from the Temperature Registers OUT_T_MSB and OUT_T_LSB data registers
     # Register 0x04 - msb, 0x05 bits 7 - 4 - lsb
     # Number is stored as Q8.4, not Q12.4 as stated in the datasheet
     data_addr = [0x04, 0x05]
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[0], 2)
     logging.debug("OUT_T Data Register values (0x%x/0x%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
-    # value is 8 its from data_h and uppper 4 bits from data_l, but for now just merge them together
-    data_out = (data_h << 8) + data_l
-    # output is a signed number.
-    data_out = SignedNumber16(data_out)
-    # Because I merged the numbers together earlier, I now need to divide by 256 to get the right number
-    data_out = data_out / 256
-    logging.info("OUT_T Registers combined %x" % data_out)
+    return ConvertTemperature(data_h, data_l)
+
+def ConvertTemperature(data_h, data_l):
+    # Convert the OUT_T_MSB and OUT_T_LSB register values to Deg C
+    # value is 8 bits from data_h and upper 4 bits from data_l, a 2's compliment Q8.4 number
+    data_out = iCogsDecode.Decode("ps3_temperature", [data_h, data_l])[0]
+    logging.info("OUT_T Registers combined %f" % data_out)
     return data_out
 
 def ReadPressure():
@@ -396,61 +403,125 @@ def ReadPressure():
     # Registers are 0x01, 0x02, 0x03
     # Value read is dependent on the mode of operation
     data_addr = [0x01, 0x02, 0x03]
+    # Read CTRL_REG1 for the mode of operation and the 3 data registers in one transaction
+    ctrl_reg1, data = bus.read_combined(SENSOR_ADDR, [(0x26, 1), (data_addr[0], 3)])
+    ctrl_reg1 = ctrl_reg1[0]
+    data_h, data_c, data_l = data
+    logging.debug("OUT_P Data Register values (%x/%x/%x):%x / %x / %x" % (data_addr[0], data_addr[1], data_addr[2], data_h, data_c, data_l))
+    return ConvertPressure(ctrl_reg1, data_h, data_c, data_l)
+
+def ConvertPressure(ctrl_reg1, data_h, data_c, data_l):
+    # Convert the OUT_P_MSB, OUT_P_CSB and OUT_P_LSB register values using the mode in CTRL_REG1
+    # Returns [value, units]
     # units is used to return the units of the value
     units = ""
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_c = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[2])
-    logging.debug("OUT_P Data Register values (%x/%x/%x):%x / %x / %x" % (data_addr[0], data_addr[1], data_addr[1], data_h, data_c, data_l))
     # The value in the register is dependent on the mode of operation, Altitude or barometer or raw.
-    if ReadOutputMode() == RAW:
+    if (ctrl_reg1 & 0b01000000) == RAW:
         # In this mode, the value is all 24 bits and no fraction / sign
         logging.info("Mode is RAW, so the value is retured")
-        data_out = (data_h << 16) + (data_c << 8) + data_l
+        data_out = iCogsDecode.Unpack("ps3_raw", [data_h, data_c, data_l])[0]
         logging.debug("24 bit number retrieved from the sensor: %x" % data_out)
         units = ""
         return [data_out, units]
-    if ReadAltimeterMode() == ALTIMETER:
-        # In this mode, the data is a 20 bit signed Q16.4 format number
-        # Therefore current value needs signing and dividing by 65536
-        data_out = (data_h << 24) + (data_c << 16) + (data_l << 8)
-        logging.debug("32 bit number retrieved from the sensor: %x" % data_out)
-        data_out = SignedNumber32(data_out)
-        logging.debug("Altimeter Pressure Converted using Signed Number %f" % data_out)
-        data_out = data_out / 65536
+    if (ctrl_reg1 & 0b10000000) == ALTIMETER:
+        # In this mode, the data is a 20 bit 2's compliment Q16.4 format number
+        data_out = iCogsDecode.Decode("ps3_altitude", [data_h, data_c, data_l])[0]
         logging.info("Altimeter Pressure Value being returned %f" % data_out)
         units = "Meters"
     else:
-        # In this mode the data is in signed Q18.2
-        # Therefore current value needs signing and dividing by 64
-        data_out = (data_h << 16) + (data_c << 8) + data_l
-        logging.debug("24 bit number retrieved from the sensor: %x" % data_out)
-        # pressure is unsigned
-        #data_out = SignedNumber(data_out)
-        #logging.debug("Barometer Pressure Converted using Signed Number %f" % data_out)
-        data_out = data_out / 64
+        # In this mode the data is an unsigned Q18.2 format number
+        data_out = iCogsDecode.Decode("ps3_pressure", [data_h, data_c, data_l])[0]
         logging.info("Barometer Pressure Value being returned %f" % data_out)
         units = "Pascals"
     return [data_out, units]
 
+def ReadPressureTemperature():
+    # Read CTRL_REG1 and the pressure and temperature data registers (0x01 - 0x05) in one transaction
+    # Returns a dictionary of the pressure, its units and the temperature
+    ctrl_reg1, data = bus.read_combined(SENSOR_ADDR, [(0x26, 1), (0x01, 5)])
+    pressure, units = ConvertPressure(ctrl_reg1[0], data[0], data[1], data[2])
+    return {"pressure": pressure, "units": units, "temperature": ConvertTemperature(data[3], data[4])}
+
+def PeriodicReadings():
+    # Read the pressure and temperature at a fixed period, scheduled on absolute deadlines so the
+    # readings stay evenly spaced, until Ctrl-C is pressed, then show the timing histograms
+    # Each reading is also published on sample_stream
+    period = float(input("Period (seconds):"))
+    if period <= 0:
+        print("The period must be greater than 0")
+        return
+    sampler = iCogsSampler.PeriodicSampler("Ps.3 Periodic Readings", ReadPressureTemperature, period)
+    print("Reading every %f seconds, press Ctrl-C to stop" % period)
+    try:
+        for sample in sampler.Samples():
+            sample_stream.Publish(sample)
+            print("%f  %f %s  %f Deg C  (jitter %.6f)" % (sample["time"], sample["pressure"], sample["units"], sample["temperature"], sample["jitter"]))
+    except KeyboardInterrupt:
+        print("")
+    sampler.Report()
+    return
+
+def PressureToAltitude(pressure, sealevel=None):
+    # Convert a pressure, or a numpy array of pressures, in Pa to altitude in meters using the same
+    # formula as the sensor in Altimeter mode, against the cached equivalent sea level pressure
+    if sealevel is None:
+        if barometric["sealevel"] is None:
+            ReadBarometricOffset()
+        sealevel = barometric["sealevel"]
+    return ALTITUDE_SCALE * (1 - (pressure / sealevel) ** ALTITUDE_EXPONENT)
+
+def ReadPressureAltitude():
+    # Read the pressure in Barometer mode and calculate the altitude from it on the host, so both are
+    # available from one reading without switching the sensor between modes
+    # Returns [pressure in Pa, altitude in meters], or None if the sensor is not in Barometer mode
+    pressure, units = ReadPressure()
+    if units != "Pascals":
+        print("Sensor must be in Barometer mode to read pressure and altitude")
+        return None
+    altitude = PressureToAltitude(pressure)
+    logging.info("Pressure %f Pa, calculated altitude %f meters" % (pressure, altitude))
+    return [pressure, altitude]
+
+def SamplePressureAltitude(count=100, interval=0.1):
+    # Read count pressure readings every interval seconds in Barometer mode, then convert the whole
+    # batch to altitude at once
+    # Returns numpy arrays of the times, pressures and altitudes
+    if barometric["sealevel"] is None:
+        ReadBarometricOffset()
+    SetAltimeterMode(BAROMETER)
+    times = numpy.empty(count)
+    pressures = numpy.empty(count)
+    for n in range(count):
+        times[n] = time.time()
+        pressures[n] = ReadPressure()[0]
+        time.sleep(interval)
+    altitudes = PressureToAltitude(pressures)
+    return [times, pressures, altitudes]
+
+def PressureAltitudeBatch():
+    # Take a batch of pressure readings and print the pressure and altitude series summary
+    if numpy is None:
+        print("Batch conversion requires numpy, install it with: sudo apt-get install python3-numpy")
+        return
+    count = int(input("Number of readings:"))
+    if count < 2:
+        print("At least 2 readings are required")
+        return
+    times, pressures, altitudes = SamplePressureAltitude(count)
+    print("%d readings at %.1f readings per second" % (count, (count - 1) / (times[-1] - times[0])))
+    print("Pressure Pa   min %10.2f  mean %10.2f  max %10.2f" % (pressures.min(), pressures.mean(), pressures.max()))
+    print("Altitude m    min %10.2f  mean %10.2f  max %10.2f" % (altitudes.min(), altitudes.mean(), altitudes.max()))
+    return
+
 def ReadTemperatureDelta():
     # Read the data out from the Temperature Delta Registers OUT_T_DELTA_MSB and OUT_T_DELTA_LSB data registers
     # Register 0x0A - msb, 0x0B bits 7 - 4 - lsb
-    # Number is stored as Q8.4, not Q12.4 as stated in the datasheet as degress C
-
-    #Not sure if this is stored as a 2'c compliment, assumes so at the moment
-
+    # Number is stored as a 2's compliment Q8.4, not Q12.4 as stated in the datasheet as degress C
     data_addr = [0x0A, 0x0B]
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[0], 2)
     logging.debug("OUT_T Delta Data Register values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
-    # value is 8 its from data_h and uppper 4 bits from data_l, but for now just merge them together
-    data_out = (data_h << 8) + data_l
-    # output is a 2's compliment number.
-    data_out = TwosCompliment(data_out)
-    # Because I merged the numbers together earlier, I now need to divide by 256 to get the right number
-    data_out = data_out / 256
-    logging.info("OUT_T Delta Registers combined %x" % data_out)
+    data_out = iCogsDecode.Decode("ps3_temperature", [data_h, data_l])[0]
+    logging.info("OUT_T Delta Registers combined %f" % data_out)
     return data_out
 
 def ReadPressureDelta():
@@ -460,35 +531,93 @@ def ReadPressureDelta():
     data_addr = [0x07, 0x08, 0x09]
     # units is used to return the units of the value
     units = ""
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_c = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[2])
+    # Read CTRL_REG1 for the mode of operation and the 3 data registers in one transaction
+    ctrl_reg1, data = bus.read_combined(SENSOR_ADDR, [(0x26, 1), (data_addr[0], 3)])
+    ctrl_reg1 = ctrl_reg1[0]
+    data_h, data_c, data_l = data
     logging.debug("OUT_P_DELTA Data Register values (%x/%x/%x):%x / %x / %x" % (data_addr[0], data_addr[1], data_addr[2], data_h, data_c, data_l))
-    data_out = (data_h << 16) + (data_c << 8) + data_l
-    logging.debug("24 bit number retrieved from the sensor: %x" % data_out)
     # The value in the register is dependent on the mode of operation, Altitude or barometer or raw.
-    if ReadOutputMode() == RAW:
+    if (ctrl_reg1 & 0b01000000) == RAW:
         # In this mode, the value is not used
         logging.info("Mode is RAW, no value is retured")
         return [0, units]
-    if ReadAltimeterMode() == ALTIMETER:
-        # In this mode, the data is a 20 bit 2's compliment number, with 4 decimal places
-        # Therefore current value needs 2'c compliment and dividing by 256 as the lowest 8 bits are fractions
-        data_out = TwosCompliment20(data_out)
-        logging.debug("Altimeter Pressure Delta Converted using 2's Compliment Number %f" % data_out)
-        data_out = data_out / 256
+    if (ctrl_reg1 & 0b10000000) == ALTIMETER:
+        # In this mode, the data is a 20 bit 2's compliment Q16.4 format number
+        data_out = iCogsDecode.Decode("ps3_altitude", [data_h, data_c, data_l])[0]
         logging.info("Altimeter Pressure Delta Value being returned %f" % data_out)
         units = "Meters"
     else:
-        # In this mode the data is a 2'c compliment number with 2 bits being fraction
-        # Therefore current value needs 2's compliment and dividing by 64
-        data_out = TwosCompliment20(data_out)
-        logging.debug("Barometer Pressure Delta Converted using 2's compliment Number %f" % data_out)
-        data_out = data_out / 64
+        # In this mode the data is a 20 bit 2's compliment Q18.2 format number
+        data_out = iCogsDecode.Decode("ps3_pressure_delta", [data_h, data_c, data_l])[0]
         logging.info("Barometer Pressure Delta Value being returned %f" % data_out)
         units = "Pascals"
     return [data_out, units]
 
+def EnableDataEvents():
+    # Set the Data Ready Event Mode and the Pressure and Temperature Data Event Flags in PT_DATA_CFG 0x13
+    # so DR_STATUS reports when new data is available and when unread data has been overwritten
+    enabled = iCogsRegisters.WriteFields(bus, SENSOR_ADDR, "Ps.3", 0x13, {"DREM": 1, "PDEFE": 1, "TDEFE": 1}, WAITTIME)
+    for key in dataready:
+        dataready[key] = 0
+    if enabled:
+        print("Data Ready Event Flags enabled")
+        return True
+    print("Data Ready Event Flags NOT enabled")
+    return False
+
+def ReadNewSample():
+    # Read CTRL_REG1, DR_STATUS (0x06) and the pressure and temperature data registers (0x01 - 0x05)
+    # in one transaction, and return the sample only if new data is available
+    # DR_STATUS is read before the data, as reading OUT_P_MSB / OUT_T_MSB clears its flags
+    # Returns a sample dictionary, or None if there is no new data since the last sample
+    ctrl_reg1, status, data = bus.read_combined(SENSOR_ADDR, [(0x26, 1), (0x06, 1), (0x01, 5)])
+    sample_time = time.time()
+    status = status[0]
+    dataready["polls"] = dataready["polls"] + 1
+    logging.debug("DR_STATUS %x, data registers %s" % (status, data))
+    if (status & PTDR) == 0:
+        return None
+    dataready["samples"] = dataready["samples"] + 1
+    # An overwrite means a sample was produced and replaced before it could be read
+    if status & POW:
+        dataready["pressure_overwrites"] = dataready["pressure_overwrites"] + 1
+    if status & TOW:
+        dataready["temperature_overwrites"] = dataready["temperature_overwrites"] + 1
+    pressure, units = ConvertPressure(ctrl_reg1[0], data[0], data[1], data[2])
+    sample = {"time": sample_time, "pressure": pressure, "units": units, "overwritten": (status & PTOW) != 0}
+    if status & TDR:
+        sample["temperature"] = ConvertTemperature(data[3], data[4])
+    return sample
+
+def WaitForNewSample(cancel=None):
+    # Wait for the next sample, polling DR_STATUS at intervals based on the oversample ratio
+    # Returns the sample, or None if no new data arrived before the timeout or the wait was cancelled
+    ctrl_reg1 = bus.read_byte_data(SENSOR_ADDR, 0x26)
+    expected = OVERSAMPLETIMES[(ctrl_reg1 & 0b00111000) >> 3]
+    return iCogsPoll.PollUntil(ReadNewSample, expected=expected / 4, timeout=DATATIMEOUT, max_interval=expected / 2,
+                               cancel=cancel, name="Ps.3 Data Ready")
+
+def DataReadyReadings():
+    # Print each new sample as it becomes available, until Ctrl-C is pressed, then show how many
+    # reads were made and how many samples were overwritten before they were read
+    if EnableDataEvents() == False:
+        return
+    SetSystemMode(ACTIVE)
+    print("Reading new samples, press Ctrl-C to stop")
+    try:
+        while True:
+            sample = WaitForNewSample()
+            if sample is None:
+                print("No new data available, check the sensor is Active")
+                break
+            print("%f  %f %s  %s Deg C%s" % (sample["time"], sample["pressure"], sample["units"],
+                  sample.get("temperature", "-"), "  (overwritten)" if sample["overwritten"] else ""))
+    except KeyboardInterrupt:
+        pass
+    print("\n%d samples from %d reads, %d pressure and %d temperature samples overwritten before being read"
+          % (dataready["samples"], dataready["polls"], dataready["pressure_overwrites"], dataready["temperature_overwrites"]))
+    return
+
 def HelpText():
     # show the help text
     print("**************************************************************************\n")
@@ -498,6 +627,8 @@ def HelpText():
     print("l - Read Temperature Delta")
     print("w - Who Am I")
     print("A - Read all data blocks")
+    print("M - Read and decode the configuration registers in the register map")
+    print("G - Watch a range of registers for changes")
     print("r - Software Reset")
     print("c - Read Configuration Data")
     print("o - Set Output Mode")
@@ -506,7 +637,12 @@ def HelpText():
     print("p - Read Pressure")
     print("B - Read Current Barometric Offset")
     print("b - Set Barometric Input")
+    print("O - Set Offsets")
     print("d - Read Pressure Deltas")
+    print("N - Read New Samples using Data Ready")
+    print("P - Read Pressure and Altitude")
+    print("I - Periodic Pressure and Temperature Readings on a fixed interval")
+    print("S - Sample a batch of Pressure and Altitude readings")
 
     print("e - Exit Program")
 
@@ -520,11 +656,9 @@ print ("")
 print ("Press h for help")
 print ("")
 
-bus = smbus.SMBus(1)
-
 logging.basicConfig(filename="Ps_3.txt", filemode="w", level=logging.DEBUG, format='%(asctime)s:%(levelname)s:%(message)s')
 
-SetRepeatedStartMode()
+bus = iCogsRecord.OpenBus(iCogsBus.I2CBus, 1)
 
 while True:
     choice = input ("Select Menu Option:")
@@ -533,6 +667,10 @@ while True:
         HelpText()
     elif choice == "A":
         ReadAllData()
+    elif choice == "M":
+        ReadRegisterMap()
+    elif choice == "G":
+        WatchRegisters()
     elif choice == "E" or choice == "e":
         sys.exit()
     elif choice == "t":
@@ -548,9 +686,19 @@ while True:
     elif choice == "p":
         pres = ReadPressure()
         print("\nCurrent Reading is %f %s" % (pres[0], pres[1]))
+    elif choice == "P":
+        reading = ReadPressureAltitude()
+        if reading is not None:
+            print("\nCurrent Pressure is %f Pascals, Altitude %f Meters" % (reading[0], reading[1]))
+    elif choice == "S":
+        PressureAltitudeBatch()
+    elif choice == "I":
+        PeriodicReadings()
     elif choice == "d":
         pres_delta = ReadPressureDelta()
         print("\nCurrent Pressure Delta is %f %s" % (pres_delta[0], pres_delta[1]))
+    elif choice == "N":
+        DataReadyReadings()
     elif choice == "r":
         SoftwareReset()
     elif choice == "c":
@@ -583,6 +731,12 @@ while True:
         print(" Enter required Barometric Input in Pascals")
         reqd = int(input("Pressure Value:"))
         SetBarometricInput(reqd)
+    elif choice == "O":
+        # Set the user offsets
+        pres_offset = float(input("Pressure Offset (Pa):"))
+        temp_offset = float(input("Temperature Offset (Deg C):"))
+        alt_offset = float(input("Altitude Offset (m):"))
+        SetOffsets(pres_offset, temp_offset, alt_offset)
     elif choice == "a":
         #Set Altimeter Mode()
         print("Select =Mode:-")
@@ -9,15 +9,9 @@ The Rs.2 is based on the MMA8652FC 3-Axis, 12-bit Digital Accelerometer, but lik
 comes with an additional EEPROM to provide the capability to store additional information e.g
 enviromental specific data.
 
-This module uses 'Repeated Start' (see www.i2c-bus.org/repeated-start-condition) so requires
-the following which is done programmatically
-1. Open a terminal window
-2. Run the following comamnds
-    sudo su -
-    echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined
-    exit
-
-This changes the contents of combined to 'Y' in /sys/module/i2c_bcm2708/parameters, default is 'N'
+This module uses 'Repeated Start' (see www.i2c-bus.org/repeated-start-condition). This is provided
+by iCogsBus, which sends each register read as a combined write / read transaction, so the
+i2c_bcm2708 'combined' parameter does not need to be changed and no superuser access is required.
 
 Note: The operating modes can only be changed when in standby.
 
@@ -29,14 +23,15 @@ iCogs range of sensors.
 This program is free software; you can redistribute it and / or modify it under the terms of
 the GNU General Public licence as published by the Free Foundation version 2 of the licence.
 
-This uses the SMBus functionality of the Raspberry Pi to read and write data for the sensors.
+This uses the iCogsBus I2C functionality to read and write data for the sensors.
 
-SMBus Commands used
+iCogsBus Commands used
 
-iCog = smbus.SMBus(i2cbus number)
+iCog = iCogsBus.I2CBus(i2cbus number)
 
 read_byte_data(address, register) - returns a string containing the value in hex
 write_byte_data(address, register, value)
+read_i2c_block_data(address, register, length) - returns length consecutive registers
 
 Explanation of the use of masking
 mode = the required values of the bits
@@ -58,12 +53,18 @@ NOTE: For some functions need to also shift the bits
 
 """
 
-import smbus
+import iCogsBus
+import iCogsDecode
+import iCogsPoll
+import iCogsStream
+import iCogsRecord
+import iCogsRegisters
+import iCogsWatch
 import logging
 import time
 import math
 import sys
-import subprocess
+import threading
 
 SENSOR_ADDR = 0x1d
 
@@ -83,22 +84,79 @@ ACTIVE = 0b1
 OFF = 0b00000000
 SINGLE = 0b00010101
 DOUBLE = 0b00101010
+SINGLEDOUBLE = 0b00111111
+# Added to the Tap Detection mode to latch events into PULSE_SRC until it is read
+PULSELATCH = 0b01000000
+
+#FIFO Modes
+FIFO_DISABLED = 0b00
+FIFO_CIRCULAR = 0b01
+FIFO_FILL = 0b10
+FIFO_TRIGGER = 0b11
+
+#FIFO Trigger Sources (TRIG_CFG)
+TRIG_TRANSIENT = 0b00100000
+TRIG_LANDPORT = 0b00010000
+TRIG_PULSE = 0b00001000
+TRIG_FFMT = 0b00000100
+
+#Output Data Rates (DR)
+ODR_800HZ = 0b000
+ODR_400HZ = 0b001
+ODR_200HZ = 0b010
+ODR_100HZ = 0b011
+ODR_50HZ = 0b100
+ODR_12_5HZ = 0b101
+ODR_6_25HZ = 0b110
+ODR_1_56HZ = 0b111
+# The frequency in Hz of each Output Data Rate
+ODR_FREQUENCY = {ODR_800HZ: 800, ODR_400HZ: 400, ODR_200HZ: 200, ODR_100HZ: 100,
+                 ODR_50HZ: 50, ODR_12_5HZ: 12.5, ODR_6_25HZ: 6.25, ODR_1_56HZ: 1.5625}
+
+#High Pass Filter Cut Off (SEL), the cut off frequency also depends on the data rate and power mode
+HPF_CUTOFF_HIGHEST = 0b00
+HPF_CUTOFF_HIGH = 0b01
+HPF_CUTOFF_LOW = 0b10
+HPF_CUTOFF_LOWEST = 0b11
+
+#Auto Sleep Data Rates (ASLP_RATE)
+ASLP_50HZ = 0b00
+ASLP_12_5HZ = 0b01
+ASLP_6_25HZ = 0b10
+ASLP_1_56HZ = 0b11
+
+#Oversampling Power Modes (MODS and SMODS)
+MODS_NORMAL = 0b00
+MODS_LOWNOISE_LOWPOWER = 0b01
+MODS_HIGHRES = 0b10
+MODS_LOWPOWER = 0b11
+
+#Wake From Sleep Sources (CTRL_REG3)
+WAKE_TRANSIENT = 0b01000000
+WAKE_LANDPORT = 0b00100000
+WAKE_PULSE = 0b00010000
+WAKE_FFMT = 0b00001000
+
+#Interrupt Enables (CTRL_REG4)
+INT_ASLP = 0b10000000
+INT_TRANSIENT = 0b00100000
+INT_LANDPORT = 0b00010000
+INT_PULSE = 0b00001000
+INT_FFMT = 0b00000100
+INT_DRDY = 0b00000001
+
+#System Modes as read from SYSMOD
+SYSMOD_STANDBY = 0b00
+SYSMOD_WAKE = 0b01
+SYSMOD_SLEEP = 0b10
+
+# The acceleration represented by 1 bit of the motion and transient thresholds, in g
+THRESHOLD_STEP = 0.063
+
+# The longest time to wait for a tap, in seconds
+TAPTIMEOUT = 30
 
 
-def SetRepeatedStartMode():
-    # This function sets the I2C bus to use Repeated Start Mode
-    # Command to run as Superuser is
-    #   echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined
-    logging.info("Setting Repeated Start for I2C comms")
-    try:
-        response = subprocess.call("echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined", shell=True)
-        logging.debug("Used subprocess call to set Repeated Start command and got this response %x" % response)
-    except:
-        e = sys.exc_info()
-        logging.critical("Failed to Set Repeated Start mode, program aborted with response %s: %s" % (e[0], e[1]))
-        print("Failed to Set Repeated Start mode, program aborted")
-        sys.exit()
-
 def ReadAllData():
     # Read out all 255 bytes from the device
     # capture all the readings for printing later
@@ -117,6 +175,24 @@ def ReadAllData():
         print(" ")
     return
 
+def ReadRegisterMap(volatile=False):
+    # Read the configuration registers in the register map, a block at a time, and print them decoded
+    # The status and data registers are only read if volatile is True, as reading them can clear flags
+    snapshot = iCogsRegisters.ReadSnapshot(bus, SENSOR_ADDR, "Rs.2", volatile=volatile)
+    iCogsRegisters.PrintSnapshot("Rs.2", snapshot)
+    return
+
+def WatchRegisters():
+    # Repeatedly read a range of registers and print the fields that change, until Ctrl-C is pressed
+    start = int(input("First register (hex):"), 16)
+    length = int(input("Number of registers:"))
+    rate = float(input("Reads per second:"))
+    if length < 1 or rate <= 0:
+        print("At least 1 register and a positive rate are required")
+        return
+    iCogsWatch.Watch(bus, SENSOR_ADDR, "Rs.2", start, length, rate)
+    return
+
 def WhoAmI():
     # Read out and confirm the 'Who Am I' value of 0x4a
     reg_addr = 0x0d
@@ -133,22 +209,8 @@ def ReadF_Setup():
     reg_addr = 0x09
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("F_Setup Register reading (%x):%x" % (reg_addr,byte))
-    # Decode the values
-    # FIFO Buffer Overflow mode
-    fbom = (byte & 0b11000000) >> 6
-    logging.debug("FIFO Buffer Overflow bits %s" % fbom)
-    if fbom == 0b00:
-        print("Rs.2 FIFO is disabled")
-    elif fbom == 0b01:
-        print("Rs.2 FIFO contains the most recent samples when overflowed")
-    elif fbom == 0b10:
-        print("Rs.2 FIFO stops accepting new samples when overflowed")
-    elif fbom == 0b11:
-        print("Rs.2 FIFO is in Trigger mode")
-    # FIFO Event Sample Count Watermark
-    fescw = (byte & 0b00111111)
-    logging.debug("FIFO Event Sample Count Watermark %s" % fescw)
-    print ("Rs.2 FIFO Event Sample Count Watermark %s" % fescw)
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Rs.2", reg_addr, byte)
     return
 
 def ReadSystemMode():
@@ -156,27 +218,8 @@ def ReadSystemMode():
     reg_addr = 0x0B
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("SYSMOD Register reading (%x):%x" % (reg_addr,byte))
-    # Decode the values
-    # FIFO Gate Error flag
-    fge = (byte & 0b10000000) >> 7
-    logging.debug("FIFO Gate Error Flag %s" % fge)
-    if fge == 0b1:
-        print("Rs.2 FIFO Gate Error has been detected")
-    else:
-        print("Rs.2 FIFO Gate Error has NOT been detected")
-    # Number of ODR time units since FIFO Gate Error
-    fgerr = (byte & 0b01111100) >> 2
-    logging.debug("Number of ODR time units since FIFO Gate Error %s" % fgerr)
-    print ("Rs.2 Number of ODR time units since FIFO Gate Error %s" % fgerr)
-    # System Mode
-    sysmod = (byte & 0b00000011)
-    logging.debug("System Modebits %s" % sysmod)
-    if sysmod == 0b00:
-        print("Rs.2 In Standby Mode")
-    elif sysmod == 0b01:
-        print("Rs.2 In Wake Mode")
-    elif sysmod == 0b10:
-        print("Rs.2 In Sleep Mode")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Rs.2", reg_addr, byte)
     return
 
 def ReadXYZ_Data_Cfg():
@@ -184,23 +227,8 @@ def ReadXYZ_Data_Cfg():
     reg_addr = 0x0E
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("XYZ_DATA_CFG Register reading (%x):%x" % (reg_addr,byte))
-    # Decode the values
-    # High Pass Filter Out setting
-    hpf = (byte & 0b00010000) >> 4
-    logging.debug("High Pass Filter Out Flag %s" % hpf)
-    if hpf == 0b1:
-        print("Rs.2 High Pass Filter Output Enabled")
-    else:
-        print("Rs.2 Output data is NOT High Pass Filtered")
-    # Full Scale Range setting
-    fsr = (byte & 0b00000011)
-    logging.debug("Full Scale Range setting %s" % fsr)
-    if fsr == 0b00:
-        print("Rs.2 Full Scale Range : +/- 2g")
-    elif fsr == 0b01:
-        print("Rs.2 Full Scale Range : +/- 4g")
-    elif fsr == 0b10:
-        print("Rs.2 Full Scale Range : +/- 8g")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Rs.2", reg_addr, byte)
     return
 
 def ReadControlRegister2():
@@ -208,50 +236,8 @@ def ReadControlRegister2():
     reg_addr = 0x2B
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 2 reading (%x):%x" % (reg_addr,byte))
-    # Decode the values
-    # Self Test Enabled
-    ste = (byte & 0b10000000) >> 7
-    logging.debug("Self Test  Flag %s" % ste)
-    if ste == 0b1:
-        print("Rs.2 Self Test is Enabled")
-    else:
-        print("Rs.2 Self Test is Disabled")
-    # Software Reset
-    sr = (byte & 0b01000000) >> 6
-    logging.debug("Software Reset Flag %s" % sr)
-    if sr == 0b1:
-        print("Rs.2 Software Reset  is Enabled")
-    else:
-        print("Rs.2 Software Reset is Disabled")
-    # Sleep Mode power Scheme
-    smps = (byte & 0b00011000) >> 3
-    logging.debug("Sleep Mode Power Scheme bits %s" % smps)
-    if smps == 0b00:
-        print("Rs.2 Sleep Mode Power Mode: Normal")
-    elif smps == 0b01:
-        print("Rs.2 Sleep Mode Power Mode: Low Noise Low Power")
-    elif smps == 0b10:
-        print("Rs.2 Sleep Mode Power Mode: High Resolution")
-    elif smps == 0b11:
-        print("Rs.2 Sleep Mode Power Mode: Low Power")
-    # Auto Sleep Mode flag
-    sr = (byte & 0b00000100) >> 2
-    logging.debug("Auto Sleep Mode Flag %s" % sr)
-    if sr == 0b1:
-        print("Rs.2 Auto Sleep Mode Flag is Enabled")
-    else:
-        print("Rs.2 Auto Sleep Mode Flag is Disabled")
-    # Active Mode power Scheme
-    amps = (byte & 0b00000011)
-    logging.debug("Active Mode Power Scheme bits %s" % amps)
-    if amps == 0b00:
-        print("Rs.2 Active Mode Power Mode: Normal")
-    elif amps == 0b01:
-        print("Rs.2 Active Mode Power Mode: Low Noise Low Power")
-    elif amps == 0b10:
-        print("Rs.2 Active Mode Power Mode: High Resolution")
-    elif amps == 0b11:
-        print("Rs.2 Active Mode Power Mode: Low Power")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Rs.2", reg_addr, byte)
     return
 
 def ReadFullScaleMode():
@@ -323,6 +309,72 @@ def SetSystemMode(mode):
         logging.debug("Set System Mode is already set in the required mode")
     return
 
+def SetFields(reg_addr, fields):
+    # Set the fields of the register in one write, fields is a dictionary of the field names in the
+    # Rs.2 register map and their values, e.g. SetFields(0x2A, {"DR": ODR_100HZ, "F_READ": 0})
+    if not iCogsRegisters.WriteFields(bus, SENSOR_ADDR, "Rs.2", reg_addr, fields, WAITTIME):
+        print("Sensor %s (%s) NOT set to requested values: %s" % (iCogsRegisters.RegisterName("Rs.2", reg_addr), ", ".join(fields), fields))
+    return
+
+def ReadSystemActive():
+    # Return True if the ACTIVE bit of CTRL_REG1 (0x2A) is set
+    return bus.read_byte_data(SENSOR_ADDR, 0x2A) & 0b00000001 == ACTIVE
+
+def SetDataRate(rate):
+    # Set the Output Data Rate bits 5 - 3 in CTRL_REG1 (0x2A)
+    # rate is one of the ODR_ values, the sensor is put into STANDBY to change it and then restored
+    active = ReadSystemActive()
+    SetSystemMode(STANDBY)
+    SetFields(0x2A, {"DR": rate})
+    if active:
+        SetSystemMode(ACTIVE)
+    return
+
+def ReadDataRate():
+    # Read the Output Data Rate bits from CTRL_REG1 (0x2A) and return the frequency in Hz
+    byte = bus.read_byte_data(SENSOR_ADDR, 0x2A)
+    rate = (byte & 0b00111000) >> 3
+    logging.info("Output Data Rate bits %s, %f Hz" % (rate, ODR_FREQUENCY[rate]))
+    return ODR_FREQUENCY[rate]
+
+def SetFastRead(onoff):
+    # Set the Fast Read bit 1 in CTRL_REG1 (0x2A)
+    # In Fast Read mode only the 8 most significant bits of each axis are available, and a burst read
+    # from OUT_X_MSB (0x01) returns the 3 MSB registers one after the other, in the FIFO as well
+    # The sensor is put into STANDBY to change it and then restored
+    active = ReadSystemActive()
+    SetSystemMode(STANDBY)
+    SetFields(0x2A, {"F_READ": int(onoff)})
+    if active:
+        SetSystemMode(ACTIVE)
+    return
+
+def ReadFastRead():
+    # Return True if the Fast Read bit 1 in CTRL_REG1 (0x2A) is set
+    return (bus.read_byte_data(SENSOR_ADDR, 0x2A) & 0b00000010) >> 1 == 1
+
+def SetPowerMode(mode):
+    # Set the Active Mode oversampling power scheme, MODS bits 1 - 0 in CTRL_REG2 (0x2B)
+    # mode is one of the MODS_ values, the sensor is put into STANDBY to change it and then restored
+    active = ReadSystemActive()
+    SetSystemMode(STANDBY)
+    SetFields(0x2B, {"MODS": mode})
+    if active:
+        SetSystemMode(ACTIVE)
+    return
+
+def SetHighPassFilter(onoff, cutoff=HPF_CUTOFF_HIGHEST):
+    # Set whether the output data is high pass filtered, HPF_OUT bit 4 in XYZ_DATA_CFG (0x0E),
+    # and the cut off, SEL bits 1 - 0 in HP_FILTER_CUTOFF (0x0F)
+    # cutoff is one of the HPF_CUTOFF_ values, the sensor is put into STANDBY to change it and then restored
+    active = ReadSystemActive()
+    SetSystemMode(STANDBY)
+    SetFields(0x0F, {"SEL": cutoff})
+    SetFields(0x0E, {"HPF_OUT": int(onoff)})
+    if active:
+        SetSystemMode(ACTIVE)
+    return
+
 def SetSelfTest(onoff):
     # To activate the self-test by setting the ST bit in the CTRL_REG2 register (0x2B).
     # Enable the Self Test using CTRL_Register 0x2b
@@ -349,9 +401,9 @@ def SetSelfTest(onoff):
 
 def SetPulseConfig(mode):
     # Set the Pulse Configuration used for sensing tap detection
-    # mode can be either OFF, SINGLE or DOUBLE
+    # mode can be either OFF, SINGLE, DOUBLE or SINGLEDOUBLE, optionally with PULSELATCH added
     reg_addr = 0x21
-    mask = 0b00111111
+    mask = 0b01111111
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Set Pulse Configuration Mode (PULSE_CFG) before setting (%x): %x" % (reg_addr,byte))
     logging.debug("Requested Pulse Configuration Mode of operation %x" % mode)
@@ -452,12 +504,67 @@ def SetPulseLatency(interval):
         logging.debug("Sensor already set to requested Pulse Latency Time Window")
     return
 
+def SetPulseWindow(window):
+    # Set the second Pulse Time Window used for sensing double tap detection
+    # window is the value to be written, the time after the latency a second tap must occur in
+    # AS this uses all bits, no need for a mask
+    reg_addr = 0x28
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    logging.info ("Set Pulse Second Time Window (PULSE_WIND) before setting (%x): %x" % (reg_addr,byte))
+    logging.debug("Requested Pulse Second Time Window %x" % window)
+    if byte != window:
+        bus.write_byte_data(SENSOR_ADDR, reg_addr, window)
+        time.sleep(WAITTIME)
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        logging.info ("Set Pulse Second Time Window (PULSE_WIND) Register After setting: %x" % byte)
+        if byte == window:
+            print("Sensor set to requested Pulse Second Time Window: %x" % window)
+        else:
+            print("Sensor NOT set to requested Pulse Second Time Window: %x" % window)
+    else:
+        logging.debug("Sensor already set to requested Pulse Second Time Window")
+    return
+
+def SetFIFOMode(mode, watermark):
+    # Set the FIFO mode and the sample count watermark in the F_SETUP Register 0x09
+    # mode can be FIFO_DISABLED, FIFO_CIRCULAR, FIFO_FILL or FIFO_TRIGGER
+    # In Trigger mode the watermark is the number of samples kept from before the trigger event
+    # The FIFO can only be changed from one mode to another by disabling it first
+    reg_addr = 0x09
+    mask = 0b11000000
+    shift = 6
+    value = (mode << shift) | (watermark & 0b00111111)
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    logging.info ("F_SETUP Register before setting FIFO mode (%x):%x" % (reg_addr,byte))
+    logging.debug("Requested FIFO mode %x and watermark %d" % (mode, watermark))
+    if byte != value:
+        if (byte & mask) != 0 and (byte & mask) != (mode << shift):
+            bus.write_byte_data(SENSOR_ADDR, reg_addr, 0x00)
+        bus.write_byte_data(SENSOR_ADDR, reg_addr, value)
+        time.sleep(WAITTIME)
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        logging.info ("F_SETUP Register After setting FIFO mode:%x" % byte)
+        if byte == value:
+            print("Sensor FIFO set to requested mode: %x" % mode)
+        else:
+            print("Sensor FIFO NOT set to requested mode: %x" % mode)
+    else:
+        logging.debug("Sensor FIFO already in required mode")
+    return
+
+def SetFIFOTrigger(sources):
+    # Set the events that trigger the FIFO when in Trigger mode in the TRIG_CFG Register 0x0A
+    # sources is any combination of TRIG_TRANSIENT, TRIG_LANDPORT, TRIG_PULSE and TRIG_FFMT
+    # Every field of TRIG_CFG is a trigger source, so the sources not given are turned off
+    SetFields(0x0A, iCogsRegisters.FieldValues("Rs.2", 0x0A, sources))
+    return
+
 def SetPulseDetection():
     # Set the Ctrl_Reg4 (0x2D) to Pulse Detection
     # no additional value is required as function sets bit 3 on only
     reg_addr = 0x2D
-    mask = 0b00000100
-    value = 0b00000100
+    mask = 0b00001000
+    value = 0b00001000
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Set Pulse Detection mode (CTRL_REG4) before setting (%x): %x" % (reg_addr,byte))
     logging.debug("Requested Pulse Detection Mode of operation %x" % value)
@@ -480,10 +587,14 @@ def SetPulseDetection():
 def MonitorForTap():
     # Monitor the PULSE_SRC register for a tap being detected and identify on which axis
     reg_addr = 0x22
-    byte = 0x00
     print("Waiting for Tap")
-    while byte == 0x00:
-        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    def TapDetected():
+        return bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    # A tap lasts for the pulse time window, so the interval between polls stays shorter than that
+    byte = iCogsPoll.PollUntil(TapDetected, expected=0.005, timeout=TAPTIMEOUT, max_interval=0.02, name="Rs.2 Tap")
+    if byte is None:
+        print("No Tap Detected in %d seconds" % TAPTIMEOUT)
+        return
     logging.debug("Value returned from tap being detected :%x" % byte)
 
 
@@ -513,7 +624,7 @@ def MonitorForTap():
 def SoftwareReset():
     # Perform a Software Reset using CTRL_Register 0x2b
     # After the software reset, it automatically clears the bit so no need to check / merge
-    reg_addr = 0x0e
+    reg_addr = 0x2b
     value = 0b01000000
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 2 before enabling Software Reset (%x):%x" % (reg_addr,byte))
@@ -521,17 +632,17 @@ def SoftwareReset():
     towrite = byte | value
     logging.debug("Byte to write to perform Software Reset %x" % towrite)
     bus.write_byte_data(SENSOR_ADDR, reg_addr, towrite)
-    time.sleep(0.5)
-    in_st = 1
-    while in_st:
-        # Wait while the Software Reset runs
+    print("Sensor In Software Reset")
+    def ResetComplete():
+        # The sensor does not respond until it has rebooted, which the poll treats as not complete
         byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
         logging.info ("Control Register 2 After enabling Software Reset:%x" % byte)
-        in_st = (byte & 0b01000000) >> 6
-        if in_st == 0b1:
-            print("Sensor In Software Reset")
-    print ("Software Reset Completed")
-    logging.debug("Software Reset Completed")
+        return (byte & value) == 0
+    if iCogsPoll.PollUntil(ResetComplete, expected=0.001, timeout=1.0, max_interval=0.1, name="Rs.2 Software Reset"):
+        print ("Software Reset Completed")
+        logging.debug("Software Reset Completed")
+    else:
+        print ("Software Reset NOT Completed, timed out waiting for the sensor")
     return
 
 def SelfTest():
@@ -668,50 +779,489 @@ def TapDetection():
     return
 
 
+def DecodePulseSource(byte):
+    # Decode the PULSE_SRC register value into a tap event
+    # Returns a dictionary with whether it was a double tap, and the direction for each axis involved
+    event = {"double": (byte & 0b00001000) >> 3 == 1, "axes": {}}
+    for axis, active, polarity in (("X", 0b00010000, 0b00000001), ("Y", 0b00100000, 0b00000010), ("Z", 0b01000000, 0b00000100)):
+        if byte & active:
+            if byte & polarity:
+                event["axes"][axis] = "negative"
+            else:
+                event["axes"][axis] = "positive"
+    return event
+
+# Tap events are published on this stream while the tap event stream is running
+tap_stream = iCogsStream.SampleStream("Rs.2 Tap Events")
+tap_cancel = threading.Event()
+tap_thread = None
+
+def TapStreamLoop(interval):
+    # Wait for tap events and publish each one with the FIFO samples captured before and after it
+    # PULSE_SRC is latched, so a tap is not missed if it occurs between polls
+    reg_addr = 0x22
+    fsr = ReadFullScaleMode()
+    # After the trigger the FIFO keeps filling until it is full, so only the first watermark samples
+    # (F_SETUP 0x09 bits 5:0) are from before the tap
+    watermark = bus.read_byte_data(SENSOR_ADDR, 0x09) & 0b00111111
+    def TapDetected():
+        # The Event Active flag (bit 7) is set when a tap has been latched, reading it clears it
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        if byte & 0b10000000:
+            return byte
+        return 0
+    while not tap_cancel.is_set():
+        # No tap is the normal state, so wait without a timeout until a tap or the stream is stopped
+        byte = iCogsPoll.PollUntil(TapDetected, expected=interval, timeout=None, max_interval=interval,
+                                   cancel=tap_cancel, name="Rs.2 Tap Stream")
+        if byte is None:
+            continue
+        timestamp = time.time()
+        logging.debug("Value returned from tap being detected :%x" % byte)
+        event = DecodePulseSource(byte)
+        event["time"] = timestamp
+        # Reading the samples out of the FIFO re-arms it
+        samples = ReadFIFOSamples(fsr)
+        event["pre_trigger"] = samples[:watermark]
+        event["post_trigger"] = samples[watermark:]
+        logging.info("Tap Event %s" % event)
+        tap_stream.Publish(event)
+    return
+
+def StartTapStream(threshold=0x20, time_limit=0x28, latency=0x28, window=0x3C, pretrigger=16, interval=0.05):
+    # Configure single and double tap detection on all axes, with the FIFO in Trigger mode to capture
+    # the pretrigger samples before each tap, and start a thread publishing the tap events on tap_stream
+    # interval is the time in seconds between checks for a new tap
+    global tap_thread
+    if tap_thread is not None and tap_thread.is_alive():
+        logging.debug("Tap Event Stream already running")
+        return
+    SetSystemMode(STANDBY)
+    SetPulseConfig(SINGLEDOUBLE | PULSELATCH)
+    SetPulseThreshold("X", threshold)
+    SetPulseThreshold("Y", threshold)
+    SetPulseThreshold("Z", threshold)
+    SetPulseTimeWindow(time_limit)
+    SetPulseLatency(latency)
+    SetPulseWindow(window)
+    SetFIFOMode(FIFO_TRIGGER, pretrigger)
+    SetFIFOTrigger(TRIG_PULSE)
+    SetPulseDetection()
+    SetSystemMode(ACTIVE)
+    # Clear any event latched before the stream started
+    bus.read_byte_data(SENSOR_ADDR, 0x22)
+    tap_cancel.clear()
+    tap_thread = threading.Thread(target=TapStreamLoop, args=(interval,), name="Rs.2 Tap Stream", daemon=True)
+    tap_thread.start()
+    logging.info("Tap Event Stream started")
+    return
+
+def StopTapStream():
+    # Stop the thread publishing tap events and disable the FIFO
+    global tap_thread
+    if tap_thread is None:
+        return
+    tap_cancel.set()
+    tap_thread.join()
+    tap_thread = None
+    SetSystemMode(STANDBY)
+    SetFIFOMode(FIFO_DISABLED, 0)
+    logging.info("Tap Event Stream stopped")
+    return
+
+def TapEventStream():
+    # Start the tap event stream and print the events until Ctrl-C is pressed
+    events = tap_stream.Subscribe()
+    StartTapStream()
+    print("Printing Tap Events, press Ctrl-C to stop")
+    try:
+        while True:
+            event = events.get()
+            axes = ", ".join("%s %s" % (axis, direction) for axis, direction in sorted(event["axes"].items()))
+            if event["double"]:
+                kind = "Double Tap"
+            else:
+                kind = "Single Tap"
+            print("%s %s on %s with %d pre trigger and %d post trigger samples" % (time.strftime("%H:%M:%S", time.localtime(event["time"])), kind, axes, len(event["pre_trigger"]), len(event["post_trigger"])))
+    except KeyboardInterrupt:
+        print("")
+    StopTapStream()
+    tap_stream.Unsubscribe(events)
+    return
+
+
+def SaveRateSettings():
+    # Return the CTRL_REG1 (0x2A) and F_SETUP (0x09) values, so they can be restored after a measurement
+    return [bus.read_byte_data(SENSOR_ADDR, 0x2A), bus.read_byte_data(SENSOR_ADDR, 0x09)]
+
+def RestoreRateSettings(settings):
+    # Restore the Output Data Rate, Fast Read mode, FIFO and System Mode saved by SaveRateSettings
+    ctrl_reg1 = iCogsRegisters.FieldValues("Rs.2", 0x2A, settings[0])
+    f_setup = iCogsRegisters.FieldValues("Rs.2", 0x09, settings[1])
+    SetSystemMode(STANDBY)
+    SetFIFOMode(f_setup["F_MODE"], f_setup["F_WMRK"])
+    SetFields(0x2A, {"DR": ctrl_reg1["DR"], "F_READ": ctrl_reg1["F_READ"]})
+    SetSystemMode(ctrl_reg1["ACTIVE"])
+    return
+
+def MeasureReadRate(rate, duration=2.0, fast=False):
+    # Measure how many new samples per second the host can read at the given Output Data Rate
+    # STATUS (0x00) and the axis data are read in one transaction as fast as possible, counting the
+    # samples with the data ready flag set and the samples overwritten before they were read
+    # When fast is True the sensor is in Fast Read mode, so only 3 bytes of axis data are read
+    # Returns [new samples per second, overwritten samples, reads per second]
+    # The Output Data Rate, FIFO and System Mode are restored afterwards
+    status_addr = 0x00
+    length = 7
+    if fast:
+        length = 4
+    settings = SaveRateSettings()
+    try:
+        SetSystemMode(STANDBY)
+        SetFIFOMode(FIFO_DISABLED, 0)
+        SetFields(0x2A, {"DR": rate, "F_READ": int(fast)})
+        SetSystemMode(ACTIVE)
+        reads = 0
+        samples = 0
+        overwritten = 0
+        start = time.monotonic()
+        end = start + duration
+        while time.monotonic() < end:
+            data = bus.read_i2c_block_data(SENSOR_ADDR, status_addr, length)
+            reads = reads + 1
+            if data[0] & 0b00001000:
+                samples = samples + 1
+            if data[0] & 0b10000000:
+                overwritten = overwritten + 1
+        elapsed = time.monotonic() - start
+    finally:
+        RestoreRateSettings(settings)
+    logging.info("Read rate at %f Hz: %d reads, %d samples, %d overwritten in %f seconds" % (ODR_FREQUENCY[rate], reads, samples, overwritten, elapsed))
+    return [samples / elapsed, overwritten, reads / elapsed]
+
+def MeasureDataRates(duration=2.0):
+    # Measure the sustainable read rate for each Output Data Rate on the current bus and print a table
+    # A rate is sustainable if no samples were overwritten and nearly all the samples were read
+    # Returns the highest sustainable Output Data Rate
+    best = None
+    print("  ODR (Hz)  Samples/s  Overwritten  Reads/s  Sustainable")
+    for rate in sorted(ODR_FREQUENCY, key=lambda r: ODR_FREQUENCY[r]):
+        sample_rate, overwritten, read_rate = MeasureReadRate(rate, duration)
+        sustainable = overwritten == 0 and sample_rate >= ODR_FREQUENCY[rate] * 0.95
+        if sustainable:
+            best = rate
+        print("  %8.2f  %9.1f  %11d  %7.0f  %s" % (ODR_FREQUENCY[rate], sample_rate, overwritten, read_rate, sustainable))
+    if best is None:
+        print("No Output Data Rate can be sustained")
+    else:
+        print("Highest sustainable Output Data Rate: %.2f Hz" % ODR_FREQUENCY[best])
+    return best
+
+def BenchmarkFastRead(rate=ODR_800HZ, duration=5.0):
+    # Compare the sustained sample rate in 12 bit mode and in 8 bit Fast Read mode at the given
+    # Output Data Rate. The Output Data Rate, Fast Read mode, FIFO and System Mode are restored
+    # to the settings before the benchmark
+    settings = SaveRateSettings()
+    print("  Mode    Samples/s  Overwritten  Reads/s  Bytes/sample")
+    try:
+        for fast, name, length in ((False, "12 bit", 7), (True, "8 bit", 4)):
+            sample_rate, overwritten, read_rate = MeasureReadRate(rate, duration, fast)
+            print("  %-6s  %9.1f  %11d  %7.0f  %12d" % (name, sample_rate, overwritten, read_rate, length - 1))
+    finally:
+        RestoreRateSettings(settings)
+    return
+
+def ThresholdFields(threshold):
+    # Return the fields of the motion and transient threshold registers for a threshold in g
+    # DBCNTM is set so the debounce counter is cleared, rather than decremented, when the condition ends
+    return {"DBCNTM": 1, "THS": min(int(round(threshold / THRESHOLD_STEP)), 0b01111111)}
+
+def AxisFields(axes, x_field, y_field, z_field):
+    # Return the event enable fields for the axes given as a string, e.g. "XYZ", the other axes are disabled
+    return {x_field: int("X" in axes.upper()), y_field: int("Y" in axes.upper()), z_field: int("Z" in axes.upper())}
+
+def SetMotionDetection(threshold, count, axes="XYZ", freefall=False):
+    # Configure the Freefall / Motion detection block, registers FF_MT_CFG (0x15) to FF_MT_COUNT (0x18)
+    # threshold is in g, count is the number of samples the condition must last for
+    # When freefall is True an event occurs when all the axes given are below the threshold,
+    # otherwise when any of the axes given is above the threshold. Events are latched in FF_MT_SRC.
+    fields = AxisFields(axes, "XEFE", "YEFE", "ZEFE")
+    fields["ELE"] = 1
+    fields["OAE"] = 0 if freefall else 1
+    SetFields(0x15, fields)
+    SetFields(0x17, ThresholdFields(threshold))
+    SetFields(0x18, {"FF_MT_COUNT": count})
+    return
+
+def SetTransientDetection(threshold, count, axes="XYZ"):
+    # Configure the Transient detection block, registers TRANSIENT_CFG (0x1D) to TRANSIENT_COUNT (0x20)
+    # threshold is in g, count is the number of samples the condition must last for
+    # The high pass filtered acceleration is used, so an event occurs on a change in acceleration on
+    # any of the axes given, regardless of the orientation. Events are latched in TRANSIENT_SRC.
+    fields = AxisFields(axes, "XTEFE", "YTEFE", "ZTEFE")
+    fields["ELE"] = 1
+    fields["HPF_BYP"] = 0
+    SetFields(0x1D, fields)
+    SetFields(0x1F, ThresholdFields(threshold))
+    SetFields(0x20, {"TRANSIENT_COUNT": count})
+    return
+
+def SetAutoSleep(rate, count, power_mode):
+    # Configure and enable Auto Sleep, the sensor goes to sleep when no enabled event has occurred for
+    # count periods of 320mS (640mS when the active data rate is 1.56Hz)
+    # rate is the data rate when asleep, one of ASLP_50HZ, ASLP_12_5HZ, ASLP_6_25HZ or ASLP_1_56HZ
+    # power_mode is the oversampling mode when asleep, one of the MODS_ values
+    SetFields(0x2A, {"ASLP_RATE": rate})
+    SetFields(0x29, {"ASLP_COUNT": count})
+    SetFields(0x2B, {"SMODS": power_mode, "SLPE": 1})
+    return
+
+def SetWakeSources(sources):
+    # Set the events that wake the sensor from sleep, in CTRL_REG3 (0x2C)
+    # sources is any combination of WAKE_TRANSIENT, WAKE_LANDPORT, WAKE_PULSE and WAKE_FFMT
+    # The same events must also have their interrupts enabled with SetInterruptEnables
+    fields = iCogsRegisters.FieldValues("Rs.2", 0x2C, sources)
+    SetFields(0x2C, dict((name, value) for name, value in fields.items() if name.startswith("WAKE_")))
+    return
+
+def SetInterruptEnables(enables):
+    # Enable the given interrupts in CTRL_REG4 (0x2D), any other interrupts are left unchanged
+    # enables is any combination of the INT_ values
+    fields = iCogsRegisters.FieldValues("Rs.2", 0x2D, enables)
+    SetFields(0x2D, dict((name, 1) for name, value in fields.items() if value == 1))
+    return
+
+def ConfigureMotionWake(motion=0.5, freefall=None, transient=None, count=2, sleep_count=10, sleep_rate=ASLP_1_56HZ):
+    # Configure the sensor to go to sleep at a low data rate when stationary and wake on motion
+    # motion is the threshold in g for motion on any axis to wake the sensor, or None
+    # freefall is the threshold in g for all axes to drop below to wake the sensor, or None
+    # transient is the threshold in g for a change in acceleration to wake the sensor, or None
+    # Only one of motion or freefall can be used, as they share the same detection block
+    # sleep_count is the number of 320mS periods without an event before the sensor sleeps
+    sources = 0
+    enables = INT_ASLP
+    SetSystemMode(STANDBY)
+    if freefall is not None:
+        SetMotionDetection(freefall, count, freefall=True)
+    elif motion is not None:
+        SetMotionDetection(motion, count)
+    if freefall is not None or motion is not None:
+        sources = sources | WAKE_FFMT
+        enables = enables | INT_FFMT
+    if transient is not None:
+        SetTransientDetection(transient, count)
+        sources = sources | WAKE_TRANSIENT
+        enables = enables | INT_TRANSIENT
+    SetWakeSources(sources)
+    SetInterruptEnables(enables)
+    SetAutoSleep(sleep_rate, sleep_count, MODS_LOWPOWER)
+    SetSystemMode(ACTIVE)
+    return
+
+# While the motion stream is running, wake and sleep events and the samples taken whilst awake are published here
+motion_stream = iCogsStream.SampleStream("Rs.2 Motion")
+motion_cancel = threading.Event()
+motion_thread = None
+
+def MotionStreamLoop(sleep_interval, sample_interval):
+    # Check the system mode every sleep_interval seconds, and when the sensor is awake publish a sample
+    # every sample_interval seconds until it goes back to sleep
+    # SYSMOD (0x0B) and INT_SOURCE (0x0C) are read together, reading SYSMOD clears the Auto Sleep interrupt
+    sysmod_addr = 0x0B
+    data_addr = 0x01
+    fsr = ReadFullScaleMode()
+    # The sensor is awake after going ACTIVE until ASLP_COUNT expires, which is not a wake event,
+    # so the starting state is taken from SYSMOD rather than assumed to be asleep
+    awake = bus.read_byte_data(SENSOR_ADDR, sysmod_addr) & 0b00000011 == SYSMOD_WAKE
+    logging.info("Rs.2 motion stream starting %s" % ("awake" if awake else "asleep"))
+    while not motion_cancel.is_set():
+        if awake:
+            # Read the mode, interrupt source and axis data in one transaction
+            status, data = bus.read_combined(SENSOR_ADDR, [(sysmod_addr, 2), (data_addr, 6)])
+        else:
+            status = bus.read_i2c_block_data(SENSOR_ADDR, sysmod_addr, 2)
+        timestamp = time.time()
+        sysmod = status[0] & 0b00000011
+        if sysmod == SYSMOD_WAKE and not awake:
+            # Clear the latched events that woke the sensor and tell the subscribers
+            sources = []
+            if status[1] & INT_FFMT:
+                sources.append("Motion")
+                bus.read_byte_data(SENSOR_ADDR, 0x16)
+            if status[1] & INT_TRANSIENT:
+                sources.append("Transient")
+                bus.read_byte_data(SENSOR_ADDR, 0x1E)
+            logging.info("Rs.2 woken by %s, INT_SOURCE %x" % (sources, status[1]))
+            motion_stream.Publish({"time": timestamp, "event": "wake", "sources": sources})
+            awake = True
+        elif sysmod != SYSMOD_WAKE and awake:
+            logging.info("Rs.2 gone to sleep, SYSMOD %x" % status[0])
+            motion_stream.Publish({"time": timestamp, "event": "sleep"})
+            awake = False
+        elif awake:
+            x, y, z = iCogsDecode.Decode("rs2_axis", data, fsr)
+            motion_stream.Publish({"time": timestamp, "event": "sample", "x": x, "y": y, "z": z})
+        if awake:
+            motion_cancel.wait(sample_interval)
+        else:
+            motion_cancel.wait(sleep_interval)
+    return
+
+def StartMotionStream(sleep_interval=1.0, sample_interval=0.02, **wake_settings):
+    # Configure motion wake (see ConfigureMotionWake for the settings) and start a thread publishing
+    # on motion_stream only while the sensor is awake
+    global motion_thread
+    if motion_thread is not None and motion_thread.is_alive():
+        logging.debug("Motion Stream already running")
+        return
+    ConfigureMotionWake(**wake_settings)
+    motion_cancel.clear()
+    motion_thread = threading.Thread(target=MotionStreamLoop, args=(sleep_interval, sample_interval), name="Rs.2 Motion Stream", daemon=True)
+    motion_thread.start()
+    logging.info("Motion Stream started")
+    return
+
+def StopMotionStream():
+    # Stop the thread publishing motion samples
+    global motion_thread
+    if motion_thread is None:
+        return
+    motion_cancel.set()
+    motion_thread.join()
+    motion_thread = None
+    logging.info("Motion Stream stopped")
+    return
+
+def MotionWakeStream():
+    # Start the motion stream and print the wake and sleep events until Ctrl-C is pressed
+    # The samples taken whilst awake are counted rather than printed
+    events = motion_stream.Subscribe(1000)
+    StartMotionStream()
+    print("Waiting for Motion, press Ctrl-C to stop")
+    samples = 0
+    try:
+        while True:
+            event = events.get()
+            when = time.strftime("%H:%M:%S", time.localtime(event["time"]))
+            if event["event"] == "wake":
+                samples = 0
+                print("%s Woken by %s" % (when, ", ".join(event["sources"])))
+            elif event["event"] == "sleep":
+                print("%s Gone to sleep after %d samples" % (when, samples))
+            else:
+                samples = samples + 1
+    except KeyboardInterrupt:
+        print("")
+    StopMotionStream()
+    motion_stream.Unsubscribe(events)
+    return
+
+
 ######### Calculation Routines
 
 def ReadXAxisDataRegisters():
     # Read the data out from the X Axis data registers 0x01 - msb, 0x02 bits 7 - 4 - lsb
     data_addr = [0x02, 0x01]
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    # Read the msb and lsb in one transaction
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[1], 2)
     logging.debug("X Axis Data Register values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
-    data_out = (data_h << 4) + (data_l >> 4)
-    logging.info("X Axis Data Register combined %x" % data_out)
+    data_out = iCogsDecode.Unpack("rs2_axis", [data_h, data_l])[0]
+    logging.info("X Axis Data Register combined %d" % data_out)
     return data_out
 
 def ReadYAxisDataRegisters():
     # Read the data out from the Y Axis data registers 0x03 - msb, 0x04 bits 7 - 4 - lsb
     data_addr = [0x04, 0x03]
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    # Read the msb and lsb in one transaction
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[1], 2)
     logging.debug("Y Axis Data Register values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
-    data_out = (data_h << 4) + (data_l >> 4)
-    logging.info("Y Axis Data Register combined %x" % data_out)
+    data_out = iCogsDecode.Unpack("rs2_axis", [data_h, data_l])[0]
+    logging.info("Y Axis Data Register combined %d" % data_out)
     return data_out
 
 def ReadZAxisDataRegisters():
     # Read the data out from the Z Axis data registers 0x05 - msb, 0x06 bits 7 - 4 - lsb
     data_addr = [0x06, 0x05]
-    data_l = bus.read_byte_data(SENSOR_ADDR,data_addr[0])
-    data_h = bus.read_byte_data(SENSOR_ADDR,data_addr[1])
+    # Read the msb and lsb in one transaction
+    data_h, data_l = bus.read_i2c_block_data(SENSOR_ADDR, data_addr[1], 2)
     logging.debug("Z Axis Data Register values (%x/%x):%x /%x" % (data_addr[0], data_addr[1], data_h, data_l))
-    data_out = (data_h << 4) + (data_l >> 4)
-    logging.info("Z Axis Data Register combined %x" % data_out)
+    data_out = iCogsDecode.Unpack("rs2_axis", [data_h, data_l])[0]
+    logging.info("Z Axis Data Register combined %d" % data_out)
+    return data_out
+
+def ReadXYZDataRegisters():
+    # Read the data out from all 3 axis data registers 0x01 - 0x06 in one transaction
+    # Returns the signed 12 bit x, y, z values, each msb followed by the lsb bits 7 - 4
+    data_addr = 0x01
+    data = bus.read_i2c_block_data(SENSOR_ADDR, data_addr, 6)
+    logging.debug("XYZ Axis Data Register values (%x - %x):%s" % (data_addr, data_addr + 5, data))
+    data_out = iCogsDecode.Unpack("rs2_axis", data)
+    logging.info("XYZ Axis Data Registers combined %d / %d / %d" % (data_out[0], data_out[1], data_out[2]))
     return data_out
 
+def ReadFIFOSamples(fsr):
+    # Read out all the samples in the FIFO and return them as a list of x, y, z values
+    # Given the current Full Scale Range
+    # When the FIFO is enabled the STATUS register 0x00 is F_STATUS, with the sample count in bits 5 - 0
+    # In Fast Read mode the samples are packed as 3 bytes, otherwise they are 6 bytes
+    status_addr = 0x00
+    data_addr = 0x01
+    status, ctrl_reg1 = bus.read_combined(SENSOR_ADDR, [(status_addr, 1), (0x2A, 1)])
+    byte = status[0]
+    if ctrl_reg1[0] & 0b00000010:
+        return ReadFIFOFastSamples(fsr, byte)
+    count = byte & 0b00111111
+    logging.debug("F_STATUS Register reading (%x):%x, FIFO sample count %d" % (status_addr, byte, count))
+    if (byte & 0b10000000) >> 7:
+        logging.info("FIFO has overflowed")
+    samples = []
+    if count == 0:
+        return samples
+    # All the samples are read out in one transaction, each is the 6 bytes of the x, y, z registers
+    data = bus.read_i2c_block_data(SENSOR_ADDR, data_addr, count * 6)
+    values = iCogsDecode.Decode("rs2_axis", data, fsr)
+    for n in range(0, count * 3, 3):
+        samples.append(values[n:n+3])
+    return samples
+
+def ReadFIFOFastSamples(fsr, byte):
+    # Read out all the samples in the FIFO when in Fast Read mode, byte is the F_STATUS register value
+    # Each sample is packed as the 3 MSB registers, which are read out in one transaction
+    data_addr = 0x01
+    count = byte & 0b00111111
+    logging.debug("F_STATUS Register reading:%x, FIFO packed sample count %d" % (byte, count))
+    if (byte & 0b10000000) >> 7:
+        logging.info("FIFO has overflowed")
+    samples = []
+    if count == 0:
+        return samples
+    data = bus.read_i2c_block_data(SENSOR_ADDR, data_addr, count * 3)
+    # Each 8 bit value is the top of the 12 bit value, so the Full Scale Range multiplier is 16 times larger
+    values = iCogsDecode.Decode("rs2_axis8", data, fsr * 16)
+    for n in range(0, count * 3, 3):
+        samples.append(values[n:n+3])
+    return samples
+
+def ReadXYZFastDataRegisters():
+    # Read the 8 bit data out from all 3 axis MSB registers in Fast Read mode in one transaction
+    # The sensor skips the LSB registers, so the 3 bytes read from 0x01 are the x, y, z MSB registers
+    data_addr = 0x01
+    data = bus.read_i2c_block_data(SENSOR_ADDR, data_addr, 3)
+    logging.debug("XYZ Axis Fast Read Data Register values:%s" % data)
+    return data
+
+def CalculateFastValues(fsr):
+    # Takes the Fast Read readings and returns the x, y, z values
+    # Given the current Full Scale Range, which is for the 12 bit values so is scaled by 16
+    return iCogsDecode.Decode("rs2_axis8", ReadXYZFastDataRegisters(), fsr * 16)
+
 def CalculateValues(fsr):
     # Takes the readings and returns the x, y, z values
     # Given the current Full Scale Range
-    x = ReadXAxisDataRegisters()
-    y = ReadYAxisDataRegisters()
-    z = ReadZAxisDataRegisters()
+    x, y, z = ReadXYZDataRegisters()
 
-    x = TwosCompliment(x)
     x = x * fsr
-    y = TwosCompliment(y)
     y = y * fsr
-    z = TwosCompliment(z)
     z = z * fsr
     return [x, y, z]
 
@@ -722,15 +1272,7 @@ def CalculateAvgValues(fsr):
     avg_y = 0
     avg_z = 0
     for n in range(0,10):
-        x = ReadXAxisDataRegisters()
-        y = ReadYAxisDataRegisters()
-        z = ReadZAxisDataRegisters()
-        x = TwosCompliment(x)
-        #x = x * fsr
-        y = TwosCompliment(y)
-        #y = y * fsr
-        z = TwosCompliment(z)
-        #z = z * fsr
+        x, y, z = ReadXYZDataRegisters()
         avg_x = avg_x + x
         avg_y = avg_y + y
         avg_z = avg_z + z
@@ -741,10 +1283,6 @@ def CalculateAvgValues(fsr):
 
     return [avg_x, avg_y, avg_z]
 
-def TwosCompliment(value):
-    # Convert the given 12bit hex value to decimal using 2's compliment
-    return -(value & 0b100000000000) | (value & 0b011111111111)
-
 def HelpText():
     # show the help text
     print("**************************************************************************\n")
@@ -752,8 +1290,16 @@ def HelpText():
     print("\n")
     print("T - Self Test")
     print("d - Tap Detection")
+    print("D - Tap Event Stream")
+    print("m - Motion Wake Stream")
+    print("o - Set Output Data Rate")
+    print("R - Measure Sustainable Read Rates")
+    print("F - Set Fast Read (8 bit) Mode")
+    print("b - Benchmark 8 bit against 12 bit Reads")
     print("w - Who Am I")
     print("A - Read all data blocks")
+    print("M - Read and decode the configuration registers in the register map")
+    print("G - Watch a range of registers for changes")
     print("x - Read Axis Values")
     print("r - Software Reset")
     print("c - Read Configuration Data")
@@ -772,12 +1318,9 @@ print ("")
 print ("Press h for help")
 print ("")
 
-bus = smbus.SMBus(1)
-
 logging.basicConfig(filename="Rs_2.txt", filemode="w", level=logging.DEBUG, format='%(asctime)s:%(levelname)s:%(message)s')
 
-#Set Repeated Start Mode
-SetRepeatedStartMode()
+bus = iCogsRecord.OpenBus(iCogsBus.I2CBus, 1)
 
 while True:
     choice = input ("Select Menu Option:")
@@ -786,17 +1329,55 @@ while True:
         HelpText()
     elif choice == "A":
         ReadAllData()
+    elif choice == "M":
+        ReadRegisterMap()
+    elif choice == "G":
+        WatchRegisters()
     elif choice == "E" or choice == "e":
         sys.exit()
     elif choice == "T":
         SelfTest()
     elif choice == "d":
         TapDetection()
+    elif choice == "D":
+        TapEventStream()
+    elif choice == "m":
+        MotionWakeStream()
+    elif choice == "o":
+        # Set Output Data Rate()
+        print("Select Output Data Rate:-")
+        for rate in sorted(ODR_FREQUENCY):
+            print("%d - %.2f Hz" % (rate + 1, ODR_FREQUENCY[rate]))
+        print("0 - return")
+        rate = int(input ("Rate:"))
+        if rate >= 1 and rate <= 8:
+            SetDataRate(rate - 1)
+        elif rate != 0:
+            print("Unknown Output Data Rate Option")
+    elif choice == "R":
+        MeasureDataRates()
+    elif choice == "F":
+        print("Select Read Mode:-")
+        print("1 - 12 bit Normal Read")
+        print("2 - 8 bit Fast Read")
+        print("0 - return")
+        mode = int(input ("Mode:"))
+        if mode == 1:
+            SetFastRead(False)
+        elif mode == 2:
+            SetFastRead(True)
+        elif mode != 0:
+            print("Unknown Read Mode Option")
+    elif choice == "b":
+        BenchmarkFastRead()
     elif choice == "w":
         WhoAmI()
     elif choice == "x":
         fullscalerange = ReadFullScaleMode()
-        g_force = CalculateValues(fullscalerange)
+        if ReadFastRead():
+            g_force = CalculateFastValues(fullscalerange)
+        else:
+            g_force = CalculateValues(fullscalerange)
         print(" Y |             :%f" % g_force[1])
         print("   |")
         print("   |   Z         :%f" % g_force[2])
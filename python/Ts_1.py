@@ -30,19 +30,84 @@ write_byte_data(address, register, value)
 """
 
 import smbus
+import iCogsDecode
+import iCogsExport
+import iCogsPoll
+import iCogsPublish
+import iCogsStream
+import iCogsRecord
+import iCogsRegisters
+import iCogsSampler
+import iCogsWatch
 import logging
 import time
-import math
+import statistics
 import sys
+import threading
+
+# numpy, used by iCogsPsychro, is only needed for the derived readings
+try:
+    import iCogsPsychro
+except ImportError:
+    iCogsPsychro = None
 
 SENSOR_ADDR = 0x5f
 
 # The time between a write and subsequent read
 WAITTIME = 0.5
 
-def TwosCompliment(value):
-    # Convert the given 16bit hex value to decimal using 2's compliment
-    return -(value & 0b1000000000000000) | (value & 0b0111111111111111)
+# The longest time to wait for new data, longer than the slowest (1 Hz) output data rate
+DATATIMEOUT = 2.5
+
+#Output Data Rates
+ODR_ONESHOT = 0b00
+ODR_1HZ = 0b01
+ODR_7HZ = 0b10
+ODR_12_5HZ = 0b11
+
+# Estimate of the conversion time, a fixed time plus a time for each internal sample averaged
+CONVERSIONBASE = 0.001
+SAMPLETIME = 0.00005
+
+#Averaging settings (AV_CONF), the number of internal samples averaged for each reading
+AVGT_2 = 0b000
+AVGT_4 = 0b001
+AVGT_8 = 0b010
+AVGT_16 = 0b011
+AVGT_32 = 0b100
+AVGT_64 = 0b101
+AVGT_128 = 0b110
+AVGT_256 = 0b111
+AVGH_4 = 0b000
+AVGH_8 = 0b001
+AVGH_16 = 0b010
+AVGH_32 = 0b011
+AVGH_64 = 0b100
+AVGH_128 = 0b101
+AVGH_256 = 0b110
+AVGH_512 = 0b111
+
+# The current drawn is in proportion to the number of internal samples, these are the upper limits of
+# the total temperature and humidity samples for each class, the default averaging is 48 samples
+CURRENTCLASSES = [(48, "Low"), (192, "Medium"), (384, "High"), (768, "Very High")]
+
+# The heater cycle state, samples are not trusted from when the heater turns on until the temperature
+# has returned to within HEATERTOLERANCE of the baseline taken before it, or HEATERSETTLE seconds have passed
+# if it has not, or there was no baseline
+HEATERTOLERANCE = 0.2
+HEATERSETTLE = 600
+heater = {"state": "idle", "baseline": None, "on_time": 0, "period": 0, "settle_start": 0, "cycles": 0, "timer": None}
+heater_lock = threading.Lock()
+
+# CTRL_REG2 (0x21) is changed by the heater timers and the one shot readings, so changes are made one at a time
+ctrl_reg2_lock = threading.Lock()
+
+# Ts.1 samples, with whether the heater affected them, are published here
+sample_stream = iCogsStream.SampleStream("Ts.1 Samples")
+
+# Calibration values read once from the sensor, and the predicted conversion time, for one shot readings
+calibration = {}
+conversion = {"time": None}
 
 def ReadAllData():
     # Read out all 255 bytes from the device
@@ -62,6 +127,24 @@ def ReadAllData():
         print(" ")
     return
 
+def ReadRegisterMap(volatile=False):
+    # Read the configuration registers in the register map, a block at a time, and print them decoded
+    # The status and data registers are only read if volatile is True, as reading them can clear flags
+    snapshot = iCogsRegisters.ReadSnapshot(bus, SENSOR_ADDR, "Ts.1", auto_increment=0b10000000, volatile=volatile)
+    iCogsRegisters.PrintSnapshot("Ts.1", snapshot)
+    return
+
+def WatchRegisters():
+    # Repeatedly read a range of registers and print the fields that change, until Ctrl-C is pressed
+    start = int(input("First register (hex):"), 16)
+    length = int(input("Number of registers:"))
+    rate = float(input("Reads per second:"))
+    if length < 1 or rate <= 0:
+        print("At least 1 register and a positive rate are required")
+        return
+    iCogsWatch.Watch(bus, SENSOR_ADDR, "Ts.1", start, length, rate, auto_increment=0b10000000)
+    return
+
 def WhoAmI():
     # Read out and confirm the 'Who Am I' value of 0xBC
     reg_addr = 0x0F
@@ -78,22 +161,8 @@ def ReadAV_Conf():
     reg_addr = 0x10
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.debug ("AV_Conf setting (0x10):%x" % byte)
-    # Decode the values
-    # Temperature is bits 5:3
-    temp_avg = (byte & 0b00111000) >> 3
-    logging.debug("Bits read for averaged temperature samples %s" % temp_avg)
-    # The number of values is 2 ^ the 3 bits + 1
-    temp_samp = math.pow(2, (temp_avg + 1))
-    logging.info("Quantity of Temperature Samples :%d" % temp_samp)
-    print ("Quantity of Temperature Samples :%d" % temp_samp)
-
-    # Humidity is bits 2:0
-    humid_avg = (byte & 0b00000111)
-    logging.debug("Bits read for averaged humidity samples %s" % humid_avg)
-    # The number of values is 2 ^ the 3 bits + 2
-    humid_samp = math.pow(2, (humid_avg + 2))
-    logging.info("Quantity of Humidity Samples :%d" % humid_samp)
-    print ("Quantity of Humidity Samples :%d" % humid_samp)
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ts.1", reg_addr, byte)
     return
 
 def ReadCtrl_Reg1():
@@ -101,57 +170,26 @@ def ReadCtrl_Reg1():
     reg_addr = 0x20
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 1 setting (0x20):%x" % byte)
-    # Decode the values
-    # Power Down Control
-    pd = (byte & 0b10000000) >> 7
-    logging.debug("Power Down Control (1=Active) %s" % pd)
-    if pd:
-        print("Ts.1 in Active Mode")
-    else:
-        print("Ts.1 in Power-Down Mode")
-
-    # Block Data Update
-    bdu = (byte & 0b00000100) >> 2
-    logging.debug("Block Data Update (1=update on MSB and LSB) %s" % bdu)
-    if bdu:
-        print("Ts.1 Block Update Mode: Output Registers Not Updated until MSB and LSB reading")
-    else:
-        print("Ts.1 Block Update Mode: Continuous Update")
-
-    # Output Data Rate
-    odr = (byte & 0b00000011)
-    logging.debug("Output Data Rate Selection %s" % odr)
-    if odr == 0b00:
-        print("Ts.1 Output Data Rate Configuration: One Shot")
-    elif odr == 0b01:
-        print("Ts.1 Output Data Rate Configuration: 1 Hz")
-    elif odr == 0b10:
-        print("Ts.1 Output Data Rate Configuration: 7 Hz")
-    elif odr == 0b11:
-        print("Ts.1 Output Data Rate Configuration: 12.5 Hz")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ts.1", reg_addr, byte)
     return
 
 def ReadCtrl_Reg2():
     #Read out and decode the second control register.
-    # Most values are for control, hence not decoded
     reg_addr = 0x21
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 2 setting (0x21):%x" % byte)
-
-    # Heater Status
-    heat = (byte & 0b00000010) >> 1
-    logging.debug("Heater Status (1=On) %s" % heat)
-    if heat:
-        print("Ts.1 Heater is currently ON")
-    else:
-        print("Ts.1 Heater is currently OFF")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ts.1", reg_addr, byte)
     return
 
 def ReadCtrl_Reg3():
-    #Read out the third control register
+    #Read out and decode the third control register
     reg_addr = 0x22
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Control Register 3 setting (0x22):%x" % byte)
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ts.1", reg_addr, byte)
     return
 
 def ReadStatus_Reg():
@@ -159,23 +197,8 @@ def ReadStatus_Reg():
     reg_addr = 0x27
     byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
     logging.info ("Status Register setting (0x27):0x%x" % byte)
-    # Decode the Values
-
-    # Humidity Data Status
-    humid = (byte & 0b00000010) >> 1
-    logging.debug("Humidity Data Status (1=data available) %s" % humid)
-    if humid:
-        print("Ts.1 Humidity data available")
-    else:
-        print("Ts.1 Humidity data NOT available")
-
-    # Temperature Data Status
-    temp = byte & 0b00000001
-    logging.debug("Temperature Data Status (1=data available) %s" % temp)
-    if temp:
-        print("Ts.1 Temperature data available")
-    else:
-        print("Ts.1 Temperature data NOT available")
+    # Decode the values using the register map
+    iCogsRegisters.PrintRegister("Ts.1", reg_addr, byte)
     return
 
 
@@ -226,24 +249,333 @@ def TurnOffSensor():
         logging.debug("Sensor already Turned off")
     return
 
-def TurnOnHeater():
-    # Turn on the heater for 1 second, setting bit 1 = 1 for On
+def SetCtrlReg2Fields(fields):
+    # Set the fields of CTRL_REG2 (0x21), given as a dictionary of the field names in the Ts.1 register map
+    # The ONE_SHOT bit is never written back as 1, so this does not start a conversion
     reg_addr = 0x21
-    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
-    logging.info ("Control Register Before turning on heater (0x21):%x" % byte)
-    # Set the On and Off values
-    to_on = (byte | 0b00000010)     # sets bit 1 = 1
-    to_off = (byte & 0b11111101)    # sets bit 1 = 0
-    logging.debug("Byte to write to turn off / on 0x%2x / 0x%2x" % (to_on, to_off))
-    # turn on the heater
-    bus.write_byte_data(SENSOR_ADDR, reg_addr, to_on)
+    with ctrl_reg2_lock:
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        towrite = iCogsRegisters.EncodeFields("Ts.1", reg_addr, dict(fields, ONE_SHOT=0), byte)
+        logging.debug("Control Register 2 (0x21) %x, byte to write 0x%2x" % (byte, towrite))
+        bus.write_byte_data(SENSOR_ADDR, reg_addr, towrite)
+    return
+
+def HeaterOn():
+    # Turn on the heater, setting the HEATER bit of CTRL_REG2
+    SetCtrlReg2Fields({"HEATER": 1})
     logging.info("Heater turned ON")
-    print("Heater ON")
-    time.sleep(1)
-    # turn off the heater
-    bus.write_byte_data(SENSOR_ADDR, reg_addr, to_off)
+    return
+
+def HeaterOff():
+    # Turn off the heater, clearing the HEATER bit of CTRL_REG2
+    SetCtrlReg2Fields({"HEATER": 0})
     logging.info("Heater turned OFF")
-    print ("Heater OFF")
+    return
+
+def TurnOnHeater(on_time=1):
+    # Turn on the heater for on_time seconds, a timer turns it off so the program is not held up
+    HeaterOn()
+    print("Heater ON for %d seconds" % on_time)
+    timer = threading.Timer(on_time, HeaterOff)
+    timer.daemon = True
+    timer.start()
+    return
+
+def HeaterCycleOn():
+    # Timer function to start a heater cycle, the next cycle is scheduled period seconds later
+    with heater_lock:
+        if heater["state"] == "stopped":
+            return
+        heater["state"] = "heating"
+        heater["cycles"] = heater["cycles"] + 1
+        heater["timer"] = threading.Timer(heater["on_time"], HeaterCycleOff)
+        heater["timer"].daemon = True
+        HeaterOn()
+        heater["timer"].start()
+    logging.info("Heater cycle %d started, baseline temperature %s" % (heater["cycles"], heater["baseline"]))
+    return
+
+def HeaterCycleOff():
+    # Timer function to end the heating part of a cycle, samples are not trusted until the output settles
+    with heater_lock:
+        if heater["state"] == "stopped":
+            return
+        HeaterOff()
+        heater["state"] = "settling"
+        heater["settle_start"] = time.monotonic()
+        heater["timer"] = threading.Timer(heater["period"] - heater["on_time"], HeaterCycleOn)
+        heater["timer"].daemon = True
+        heater["timer"].start()
+    return
+
+def StartHeaterCycles(on_time=10, period=3600):
+    # Start turning the heater on for on_time seconds every period seconds, using timers
+    # Sampling carries on, with the samples taken during and after heating marked by MarkSample
+    with heater_lock:
+        heater["on_time"] = on_time
+        heater["period"] = max(period, on_time)
+        heater["state"] = "idle"
+        heater["cycles"] = 0
+    HeaterCycleOn()
+    return
+
+def StopHeaterCycles():
+    # Stop the heater cycles and turn the heater off
+    with heater_lock:
+        heater["state"] = "stopped"
+        if heater["timer"] is not None:
+            heater["timer"].cancel()
+            heater["timer"] = None
+        HeaterOff()
+    logging.info("Heater cycles stopped after %d cycles" % heater["cycles"])
+    return
+
+def MarkSample(sample):
+    # Mark the sample with whether the heater affected it, sample["heater"] is True if it is not trusted
+    # A trusted sample updates the baseline, and a sample back within the tolerance of the baseline
+    # after heating ends the settling, so the following samples are trusted again
+    with heater_lock:
+        if heater["state"] == "heating":
+            sample["heater"] = True
+        elif heater["state"] == "settling":
+            # Without a baseline, e.g. when cycles start before any trusted sample, only HEATERSETTLE applies
+            settled = (heater["baseline"] is not None and
+                       abs(sample["temperature"] - heater["baseline"]) <= HEATERTOLERANCE)
+            if settled or time.monotonic() - heater["settle_start"] > HEATERSETTLE:
+                logging.info("Heater cycle %d settled, temperature %f" % (heater["cycles"], sample["temperature"]))
+                heater["state"] = "idle"
+                sample["heater"] = False
+            else:
+                sample["heater"] = True
+        else:
+            sample["heater"] = False
+        if not sample["heater"]:
+            heater["baseline"] = sample["temperature"]
+    return sample
+
+def HeaterCycleMonitor(interval=1.0):
+    # Take a one shot reading every interval seconds whilst running heater cycles, publishing the
+    # marked samples and printing them until Ctrl-C is pressed
+    on_time = int(input("Heater on time (seconds):"))
+    period = int(input("Heater cycle period (seconds):"))
+    SetDataRate(ODR_ONESHOT)
+    # Take a trusted baseline before the first cycle
+    reading = OneShotReading()
+    if reading is None:
+        return
+    MarkSample({"time": time.time(), "temperature": reading[0], "humidity": reading[1]})
+    StartHeaterCycles(on_time, period)
+    print("Printing readings, press Ctrl-C to stop")
+    try:
+        while True:
+            reading = OneShotReading()
+            if reading is not None:
+                sample = MarkSample({"time": time.time(), "temperature": reading[0], "humidity": reading[1]})
+                sample_stream.Publish(sample)
+                if sample["heater"]:
+                    marker = "(heater affected)"
+                else:
+                    marker = ""
+                print("%s Temperature: %.3f  Relative Humidity: %.3f %s" % (time.strftime("%H:%M:%S", time.localtime(sample["time"])), sample["temperature"], sample["humidity"], marker))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("")
+    StopHeaterCycles()
+    return
+
+def SetDataRate(rate):
+    # Turn the sensor on and set the Output Data Rate bits 1 & 0 of the CTRL Register 0x20
+    # rate is ODR_ONESHOT, ODR_1HZ, ODR_7HZ or ODR_12_5HZ
+    # Block Data Update is set so the MSB and LSB of a reading always belong together
+    if iCogsRegisters.WriteFields(bus, SENSOR_ADDR, "Ts.1", 0x20, {"PD": 1, "BDU": 1, "ODR": rate}, WAITTIME):
+        print("Sensor Output Data Rate set")
+    else:
+        print("Sensor Output Data Rate NOT set")
+    return
+
+def PredictConversionTime():
+    # Predict the time a one shot conversion takes from the averaging set in AV_CONF (0x10)
+    # and cache it for the one shot readings
+    reg_addr = 0x10
+    byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+    temp_samp = 2 ** (((byte & 0b00111000) >> 3) + 1)
+    humid_samp = 2 ** ((byte & 0b00000111) + 2)
+    conversion["time"] = CONVERSIONBASE + (temp_samp + humid_samp) * SAMPLETIME
+    logging.info("Predicted conversion time for %d temperature and %d humidity samples: %f" % (temp_samp, humid_samp, conversion["time"]))
+    return conversion["time"]
+
+def ReadCalibration():
+    # Read all the calibration registers 0x30 - 0x3F in one transaction and cache the values
+    # Setting bit 7 of the register address makes the sensor increment the address for each byte
+    reg_addr = 0x30
+    data = bus.read_i2c_block_data(SENSOR_ADDR, reg_addr | 0b10000000, 16)
+    logging.debug("Calibration Registers (0x30 - 0x3f):%s" % data)
+    calibration["H0_rH"] = data[0] / 2
+    calibration["H1_rH"] = data[1] / 2
+    calibration["T0_degC"] = (((data[5] & 0b00000011) << 8) + data[2]) / 8
+    calibration["T1_degC"] = (((data[5] & 0b00001100) << 6) + data[3]) / 8
+    calibration["H0_OUT"] = iCogsDecode.Unpack("ts1_word", data[6:8])[0]
+    calibration["H1_OUT"], calibration["T0_OUT"], calibration["T1_OUT"] = iCogsDecode.Unpack("ts1_word", data[10:16])
+    logging.info("Calibration values %s" % calibration)
+    return
+
+def ConvertReadings(h_out, t_out):
+    # Convert the raw humidity and temperature readings using the cached calibration values
+    # Returns [temperature in Deg C, relative humidity in %]
+    c = calibration
+    T_DegC = c["T0_degC"] + (t_out - c["T0_OUT"]) * (c["T1_degC"] - c["T0_degC"]) / (c["T1_OUT"] - c["T0_OUT"])
+    H_rH = c["H0_rH"] + (h_out - c["H0_OUT"]) * (c["H1_rH"] - c["H0_rH"]) / (c["H1_OUT"] - c["H0_OUT"])
+    return [T_DegC, H_rH]
+
+def ReadConvertedValues():
+    # Read H_OUT and T_OUT in one transaction and convert them using the cached calibration values
+    # Returns [temperature in Deg C, relative humidity in %]
+    if len(calibration) == 0:
+        ReadCalibration()
+    data = bus.read_i2c_block_data(SENSOR_ADDR, 0x28 | 0b10000000, 4)
+    return ConvertReadings(*iCogsDecode.Unpack("ts1_word", data))
+
+def OneShotReading():
+    # Take a single on demand reading, the sensor must be set to ODR_ONESHOT
+    # Sets the ONE_SHOT bit 0 of CTRL_REG2 (0x21), which clears itself, and waits for the predicted
+    # conversion time, then reads the status and the readings in one transaction
+    # Returns [temperature in Deg C, relative humidity in %], or None if the reading was not available
+    reg_addr = 0x21
+    status_addr = 0x27
+    if len(calibration) == 0:
+        ReadCalibration()
+    if conversion["time"] is None:
+        PredictConversionTime()
+    with ctrl_reg2_lock:
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        bus.write_byte_data(SENSOR_ADDR, reg_addr, byte | 0b00000001)
+    time.sleep(conversion["time"])
+    # STATUS_REG, H_OUT and T_OUT are consecutive
+    data = bus.read_i2c_block_data(SENSOR_ADDR, status_addr | 0b10000000, 5)
+    if (data[0] & 0b00000011) != 0b00000011:
+        # The conversion took longer than predicted, so wait for it
+        logging.info("One Shot conversion not complete after %f, status %x" % (conversion["time"], data[0]))
+        def ConversionComplete():
+            return bus.read_byte_data(SENSOR_ADDR, status_addr) & 0b00000011 == 0b00000011
+        if not iCogsPoll.PollUntil(ConversionComplete, expected=conversion["time"] / 4, timeout=0.5, max_interval=0.01, name="Ts.1 One Shot"):
+            print("One Shot reading NOT available, check the sensor is turned on in One Shot mode")
+            return None
+        data = bus.read_i2c_block_data(SENSOR_ADDR, status_addr | 0b10000000, 5)
+    h_out, t_out = iCogsDecode.Unpack("ts1_word", data[1:5])
+    logging.debug("One Shot H_OUT / T_OUT readings %s / %s" % (h_out, t_out))
+    return ConvertReadings(h_out, t_out)
+
+def SetAV_Conf(temp_avg, humid_avg):
+    # Set the temperature (bits 5:3) and humidity (bits 2:0) averaging in AV_CONF (0x10)
+    # temp_avg is one of the AVGT_ values, humid_avg is one of the AVGH_ values
+    # The predicted conversion time for one shot readings is updated to match
+    if not iCogsRegisters.WriteFields(bus, SENSOR_ADDR, "Ts.1", 0x10, {"AVGT": temp_avg, "AVGH": humid_avg}, 0):
+        print("Sensor averaging NOT set")
+    PredictConversionTime()
+    return
+
+def CurrentClass(temp_avg, humid_avg):
+    # Return the current draw class for the averaging setting
+    samples = 2 ** (temp_avg + 1) + 2 ** (humid_avg + 2)
+    for limit, name in CURRENTCLASSES:
+        if samples <= limit:
+            return name
+    return CURRENTCLASSES[-1][1]
+
+def MeasureConversionTime():
+    # Start a one shot conversion and measure how long it takes until both readings are available
+    # Returns the time in seconds, or None if the reading did not become available
+    reg_addr = 0x21
+    status_addr = 0x27
+    with ctrl_reg2_lock:
+        byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
+        start = time.perf_counter()
+        bus.write_byte_data(SENSOR_ADDR, reg_addr, byte | 0b00000001)
+    def ConversionComplete():
+        return bus.read_byte_data(SENSOR_ADDR, status_addr) & 0b00000011 == 0b00000011
+    if not iCogsPoll.PollUntil(ConversionComplete, timeout=0.5, max_interval=iCogsPoll.MIN_INTERVAL, name="Ts.1 Conversion Time"):
+        return None
+    return time.perf_counter() - start
+
+def CharacteriseAveraging(readings=10):
+    # Sweep all the averaging combinations, taking the given number of one shot readings for each
+    # Returns a list of [temp_avg, humid_avg, conversion time, temperature std dev, humidity std dev, current class]
+    # The averaging setting is restored afterwards
+    original = bus.read_byte_data(SENSOR_ADDR, 0x10)
+    SetDataRate(ODR_ONESHOT)
+    results = []
+    for temp_avg in range(AVGT_2, AVGT_256 + 1):
+        for humid_avg in range(AVGH_4, AVGH_512 + 1):
+            SetAV_Conf(temp_avg, humid_avg)
+            times = []
+            temps = []
+            humids = []
+            for n in range(readings):
+                conversion_time = MeasureConversionTime()
+                if conversion_time is None:
+                    continue
+                times.append(conversion_time)
+                temperature, humidity = ReadConvertedValues()
+                temps.append(temperature)
+                humids.append(humidity)
+            if len(times) < 2:
+                print("Averaging %d / %d readings NOT available" % (temp_avg, humid_avg))
+                continue
+            result = [temp_avg, humid_avg, max(times), statistics.stdev(temps), statistics.stdev(humids), CurrentClass(temp_avg, humid_avg)]
+            logging.info("Averaging characterisation %s" % result)
+            results.append(result)
+    SetAV_Conf((original & 0b00111000) >> 3, original & 0b00000111)
+    return results
+
+def RecommendAveraging(results, temp_noise, humid_noise):
+    # Return the result with the fewest internal samples, and then the shortest conversion time, whose
+    # temperature and humidity standard deviations are within the targets, or None if none are
+    suitable = [r for r in results if r[3] <= temp_noise and r[4] <= humid_noise]
+    if len(suitable) == 0:
+        return None
+    return min(suitable, key=lambda r: (2 ** (r[0] + 1) + 2 ** (r[1] + 2), r[2]))
+
+def AveragingTuner():
+    # Characterise all the averaging settings and print a report and the recommended setting
+    temp_noise = float(input("Target temperature noise (Deg C std dev):"))
+    humid_noise = float(input("Target humidity noise (% rH std dev):"))
+    if len(calibration) == 0:
+        ReadCalibration()
+    print("Characterising averaging settings, this can take a minute")
+    results = CharacteriseAveraging()
+    print("  Temp Avg  Humid Avg  Conversion (mS)  Temp Noise  Humid Noise  Current")
+    for temp_avg, humid_avg, conversion_time, temp_sd, humid_sd, current in results:
+        print("  %8d  %9d  %15.2f  %10.4f  %11.4f  %s" % (2 ** (temp_avg + 1), 2 ** (humid_avg + 2), conversion_time * 1000, temp_sd, humid_sd, current))
+    best = RecommendAveraging(results, temp_noise, humid_noise)
+    if best is None:
+        print("No averaging setting meets the target noise")
+        return
+    print("Recommended averaging: %d temperature samples, %d humidity samples" % (2 ** (best[0] + 1), 2 ** (best[1] + 2)))
+    if input("Apply the recommended averaging (y/n):") == "y":
+        SetAV_Conf(best[0], best[1])
+    return
+
+def DerivedReadings(interval=1.0):
+    # Take a one shot reading every interval seconds and publish it on sample_stream, with the
+    # derived values calculated by an iCogsPsychro stage subscribed to it, until Ctrl-C is pressed
+    if iCogsPsychro is None:
+        print("Derived readings require numpy, install it with: sudo apt-get install python3-numpy")
+        return
+    SetDataRate(ODR_ONESHOT)
+    stage = iCogsPsychro.DerivedStage(sample_stream, "Ts.1 Derived", batch=1, table=iCogsPsychro.SaturationTable())
+    derived = stage.Start().Subscribe()
+    print("Printing readings, press Ctrl-C to stop")
+    try:
+        while True:
+            reading = OneShotReading()
+            if reading is not None:
+                sample_stream.Publish(MarkSample({"time": time.time(), "temperature": reading[0], "humidity": reading[1]}))
+                sample = derived.get()
+                print("%s Temp: %.2f  rH: %.2f  Dew Point: %.2f  Abs Humidity: %.2f g/m3  Humidex: %.2f  VPD: %.0f Pa" % (time.strftime("%H:%M:%S", time.localtime(sample["time"])), sample["temperature"], sample["humidity"], sample["dew_point"], sample["absolute_humidity"], sample["humidex"], sample["vpd"]))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("")
+    stage.Stop()
     return
 
 def RefreshRegisters():
@@ -260,36 +592,46 @@ def RefreshRegisters():
     logging.debug("Byte to write to refresh the register %x" % towrite)
     bus.write_byte_data(SENSOR_ADDR, reg_addr, towrite)
     # check bit 7 for return to zero on completion of refresh
-    refreshing = True
-    while refreshing:
+    def RefreshComplete():
         byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
-        refreshing = (byte & mask) >> 7
         logging.debug("Waiting for Refresh %x" % byte)
-    logging.info ("Control Register After refreshing the register (0x20):%x" % byte)
-    print("Registers Refeshed")
+        return (byte & mask) == 0
+    if iCogsPoll.PollUntil(RefreshComplete, expected=0.001, timeout=0.5, max_interval=0.05, name="Ts.1 Refresh"):
+        logging.info ("Control Register After refreshing the register (0x21):%x" % bus.read_byte_data(SENSOR_ADDR,reg_addr))
+        print("Registers Refeshed")
+    else:
+        print("Registers NOT Refreshed, timed out waiting for the refresh to complete")
     return
 
 def HumidityDataAvailable():
     # Waits until the Humidity data available flag is set
+    # Returns True if data is available, False if it timed out
     reg_addr = 0x27
     mask = 0b00000010
-    humid = False
-    while humid == False:
+    def HumidityReady():
         byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
         humid = (byte & mask) >> 1
         logging.debug("Humidity Data Status (1=data available) %s" % humid)
-    return
+        return humid
+    if iCogsPoll.PollUntil(HumidityReady, expected=0.01, timeout=DATATIMEOUT, max_interval=0.1, name="Ts.1 Humidity Data"):
+        return True
+    print("Humidity data NOT available, check the sensor is turned on")
+    return False
 
 def TemperatureDataAvailable():
     # Waits until the Temperature data available flag is set
+    # Returns True if data is available, False if it timed out
     reg_addr = 0x27
     mask = 0b00000001
-    temp = False
-    while temp == False:
+    def TemperatureReady():
         byte = bus.read_byte_data(SENSOR_ADDR,reg_addr)
         temp = byte & mask
         logging.debug("Temperature Data Status (1=data available) %s" % temp)
-    return
+        return temp
+    if iCogsPoll.PollUntil(TemperatureReady, expected=0.01, timeout=DATATIMEOUT, max_interval=0.1, name="Ts.1 Temperature Data"):
+        return True
+    print("Temperature data NOT available, check the sensor is turned on")
+    return False
 
 ### Routines to read out the various temperature values and calculate the current temperature
 
@@ -300,8 +642,7 @@ def ReadT_OUT():
     t_out_h = bus.read_byte_data(SENSOR_ADDR,t_out_addr[1])
     logging.debug ("T_OUT Reading (0x2b/0x2a):%x/%x" % (t_out_h, t_out_l))
     #Merge the values into a single reading
-    t_out = (t_out_h << 8) + t_out_l
-    t_out = TwosCompliment(t_out)
+    t_out = iCogsDecode.Unpack("ts1_word", [t_out_l, t_out_h])[0]
     logging.info ("T_OUT Reading combined (0x2b/0x2a):%s" % t_out)
     return t_out
 
@@ -340,8 +681,7 @@ def ReadT0_OUT():
     t0_out_h = bus.read_byte_data(SENSOR_ADDR,t0_out_reg_addr[1])
     logging.debug ("T0 OUT Reading (0x3c/0x3d):%x/%x" % (t0_out_h, t0_out_l))
     #Merge the values into a single reading
-    t0_out = (t0_out_h << 8) + t0_out_l
-    t0_out = TwosCompliment(t0_out)
+    t0_out = iCogsDecode.Unpack("ts1_word", [t0_out_l, t0_out_h])[0]
     logging.info ("T0 OUT combined (0x3c/0x3d):%s" % t0_out)
     return t0_out
 
@@ -352,8 +692,7 @@ def ReadT1_OUT():
     t1_out_h = bus.read_byte_data(SENSOR_ADDR,t1_out_reg_addr[1])
     logging.debug ("T1_OUT Reading (0x3e/0x3f):%x/%x" % (t1_out_h, t1_out_l))
     #Merge the values into a single reading
-    t1_out = (t1_out_h << 8) + t1_out_l
-    t1_out = TwosCompliment(t1_out)
+    t1_out = iCogsDecode.Unpack("ts1_word", [t1_out_l, t1_out_h])[0]
     logging.info ("T1_OUT Reading combined (0x3e/0x3f):%s" % t1_out)
     return t1_out
 
@@ -376,8 +715,7 @@ def ReadH_OUT():
     h_out_h = bus.read_byte_data(SENSOR_ADDR,h_out_reg_addr[1])
     logging.debug ("H_OUT Reading (0x28/0x29):%x/%x" % (h_out_h, h_out_l))
     #Merge the values into a single reading
-    h_out = (h_out_h << 8) + h_out_l
-    h_out = TwosCompliment(h_out)
+    h_out = iCogsDecode.Unpack("ts1_word", [h_out_l, h_out_h])[0]
     logging.info ("H_OUT Reading combined (0x28/0x29):%s" % h_out)
     return h_out
 
@@ -406,8 +744,7 @@ def ReadH0_OUT():
     h0_out_h = bus.read_byte_data(SENSOR_ADDR,h0_out_reg_addr[1])
     logging.debug ("H0 OUT Reading (0x37/0x36):%x/%x" % (h0_out_h, h0_out_l))
     #Merge the values into a single reading
-    h0_out = (h0_out_h << 8) + h0_out_l
-    h0_out = TwosCompliment(h0_out)
+    h0_out = iCogsDecode.Unpack("ts1_word", [h0_out_l, h0_out_h])[0]
     logging.info ("H0 OUT combined (0x37/0x36):%s" % h0_out)
     return h0_out
 
@@ -418,8 +755,7 @@ def ReadH1_OUT():
     h1_out_h = bus.read_byte_data(SENSOR_ADDR,h0_out_reg_addr[1])
     logging.debug ("H1 OUT Reading (0x3B/0x3A):%x/%x" % (h1_out_h, h1_out_l))
     #Merge the values into a single reading
-    h1_out = (h1_out_h << 8) + h1_out_l
-    h1_out = TwosCompliment(h1_out)
+    h1_out = iCogsDecode.Unpack("ts1_word", [h1_out_l, h1_out_h])[0]
     logging.info ("H1 OUT combined (0x3B/0x3A):%s" % h1_out)
     return h1_out
 
@@ -435,6 +771,85 @@ def CalculateRelativeHumidity():
 
 
 
+def PeriodicReadings():
+    # Read the temperature and humidity at a fixed period, scheduled on absolute deadlines so the
+    # readings stay evenly spaced, until Ctrl-C is pressed, then show the timing histograms
+    # The sensor should be set to an Output Data Rate at least as fast as the period
+    period = float(input("Period (seconds):"))
+    if period <= 0:
+        print("The period must be greater than 0")
+        return
+    def Read():
+        temperature, humidity = ReadConvertedValues()
+        return {"temperature": temperature, "humidity": humidity}
+    sampler = iCogsSampler.PeriodicSampler("Ts.1 Periodic Readings", Read, period)
+    print("Reading every %f seconds, press Ctrl-C to stop" % period)
+    try:
+        for sample in sampler.Samples():
+            print("%f  Temperature %f Deg C  Humidity %f %%  (jitter %.6f)" % (sample["time"], sample["temperature"], sample["humidity"], sample["jitter"]))
+    except KeyboardInterrupt:
+        print("")
+    sampler.Report()
+    return
+
+def ExportReadings():
+    # Read the temperature and humidity at a fixed period and write them to a file until Ctrl-C
+    # is pressed. The samples are written by the export writer's thread, so the readings never
+    # wait for the disk
+    period = float(input("Period (seconds):"))
+    if period <= 0:
+        print("The period must be greater than 0")
+        return
+    filename = input("Filename (.csv, .ndjson or .icc):")
+    writers = {".csv": iCogsExport.CSVWriter, ".ndjson": iCogsExport.NDJSONWriter, ".icc": iCogsExport.ColumnWriter}
+    extension = filename[filename.rfind("."):] if "." in filename else ""
+    if extension not in writers:
+        print("Unknown file type, use .csv, .ndjson or .icc")
+        return
+    def Read():
+        temperature, humidity = ReadConvertedValues()
+        return {"temperature": temperature, "humidity": humidity}
+    sampler = iCogsSampler.PeriodicSampler("Ts.1 Export", Read, period)
+    writer = writers[extension](filename)
+    writer.Start()
+    print("Exporting every %f seconds, press Ctrl-C to stop" % period)
+    try:
+        for sample in sampler.Samples():
+            writer.Add(sample)
+    except KeyboardInterrupt:
+        print("")
+    writer.Stop()
+    print("%d readings written to %d files, %d dropped" % (writer.written, writer.files, writer.dropped))
+    return
+
+def PublishReadings():
+    # Read the temperature and humidity at a fixed period and publish them on a Unix domain socket
+    # for other processes on this machine, until Ctrl-C is pressed
+    # The readings can be received with: python3 iCogsPublish.py ts1
+    period = float(input("Period (seconds):"))
+    if period <= 0:
+        print("The period must be greater than 0")
+        return
+    def Read():
+        temperature, humidity = ReadConvertedValues()
+        return {"temperature": temperature, "humidity": humidity}
+    sampler = iCogsSampler.PeriodicSampler("Ts.1 Publish", Read, period)
+    publisher = iCogsPublish.Publisher(iCogsPublish.SocketPath("ts1"))
+    try:
+        publisher.Start()
+    except IOError as err:
+        print("Unable to publish the readings: %s" % err)
+        return
+    print("Publishing every %f seconds on %s, press Ctrl-C to stop" % (period, publisher.path))
+    try:
+        for sample in sampler.Samples():
+            publisher.Publish(sample)
+    except KeyboardInterrupt:
+        print("")
+    publisher.Stop()
+    print("%d readings published to %d subscribers" % (sampler.samples, publisher.subscribers))
+    return
+
 def HelpText():
     # show the help text
     print("**************************************************************************\n")
@@ -442,12 +857,22 @@ def HelpText():
     print("W - Read Who Am I Information")
     print("R - Read Registers")
     print("A - Read All Data")
+    print("M - Read and decode the configuration registers in the register map")
+    print("G - Watch a range of registers for changes")
     print("F - Refresh Registers")
     print("n - Turn on Sensor")
     print("o - Turn off Sensor")
     print("T - Read the Temperature")
     print("U - Read the Humidity")
     print("q - Turn on Heater for 1 second")
+    print("D - Set Output Data Rate")
+    print("O - One Shot Reading")
+    print("V - Tune Averaging")
+    print("C - Readings with Heater Cycles")
+    print("P - Readings with Dew Point and Derived Values")
+    print("I - Periodic Readings on a fixed interval")
+    print("X - Export Periodic Readings to a file")
+    print("L - Publish Periodic Readings to local subscribers")
     print("e - Exit Program")
 
 
@@ -461,7 +886,7 @@ print ("")
 print ("Press h for help")
 print ("")
 
-bus = smbus.SMBus(1)
+bus = iCogsRecord.OpenBus(smbus.SMBus, 1)
 
 logging.basicConfig(filename="Ts_1.txt", filemode="w", level=logging.DEBUG, format='%(asctime)s:%(levelname)s:%(message)s')
 
@@ -481,6 +906,10 @@ while True:
         ReadStatus_Reg()
     elif choice == "A":
         ReadAllData()
+    elif choice == "M":
+        ReadRegisterMap()
+    elif choice == "G":
+        WatchRegisters()
     elif choice == "F":
         RefreshRegisters()
     elif choice == "n":
@@ -488,13 +917,43 @@ while True:
     elif choice == "o":
         TurnOffSensor()
     elif choice == "T":
-        TemperatureDataAvailable()
-        print ("Temperature Reading :%.3f" % CalculateTemperature())
+        if TemperatureDataAvailable():
+            print ("Temperature Reading :%.3f" % CalculateTemperature())
     elif choice == "U":
-        HumidityDataAvailable()
-        print ("Relative Humidity Reading:%.3f" % CalculateRelativeHumidity())
+        if HumidityDataAvailable():
+            print ("Relative Humidity Reading:%.3f" % CalculateRelativeHumidity())
     elif choice == "q":
         TurnOnHeater()
+    elif choice == "D":
+        print("Select Output Data Rate:-")
+        print("1 - One Shot")
+        print("2 - 1 Hz")
+        print("3 - 7 Hz")
+        print("4 - 12.5 Hz")
+        print("0 - return")
+        rate = int(input ("Rate:"))
+        if rate >= 1 and rate <= 4:
+            SetDataRate(rate - 1)
+        elif rate != 0:
+            print("Unknown Output Data Rate Option")
+    elif choice == "V":
+        AveragingTuner()
+    elif choice == "C":
+        HeaterCycleMonitor()
+    elif choice == "P":
+        DerivedReadings()
+    elif choice == "I":
+        PeriodicReadings()
+    elif choice == "X":
+        ExportReadings()
+    elif choice == "L":
+        PublishReadings()
+    elif choice == "O":
+        SetDataRate(ODR_ONESHOT)
+        reading = OneShotReading()
+        if reading is not None:
+            print ("Temperature Reading :%.3f" % reading[0])
+            print ("Relative Humidity Reading:%.3f" % reading[1])
     elif choice == "E" or choice == "e":
         sys.exit()
 
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+iCogs I2C Bus Access
+
+For more information see www.BostinTechnology.com
+
+This provides a replacement for the SMBus object used by the iCogs readers. Rather than relying
+on the i2c_bcm2708 'combined' parameter being set (which needs a shell and superuser access and
+changes the setting for every device on the bus), each register read is sent to the kernel as a
+write message (the register address) followed by a read message in a single I2C_RDWR ioctl.
+The kernel issues these with a Repeated Start between them, so no global setting is needed.
+
+As many register reads as required can be chained into the same ioctl, so one system call can
+carry several register reads, e.g. a complete multi-byte sample.
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+Commands provided (the same names as the SMBus commands so it can be used in place of SMBus)
+
+iCog = iCogsBus.I2CBus(i2cbus number)
+
+read_byte_data(address, register) - returns the value of the register
+write_byte_data(address, register, value)
+read_word_data(address, register) - returns the 2 registers as a little endian word
+read_i2c_block_data(address, register, length) - returns a list of length consecutive registers
+write_i2c_block_data(address, register, values) - writes the list of values in one message
+read_combined(address, [(register, length), ...]) - returns a list of lists, one per register
+                                                    block, all read in one system call
+
+"""
+
+import ctypes
+import fcntl
+import logging
+import os
+import threading
+
+# ioctl command and message flag from linux/i2c-dev.h and linux/i2c.h
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+
+# The kernel limits the number of messages in a single I2C_RDWR transfer
+I2C_RDWR_IOCTL_MAX_MSGS = 42
+
+
+class i2c_msg(ctypes.Structure):
+    # struct i2c_msg from linux/i2c.h
+    _fields_ = [("addr", ctypes.c_uint16),
+                ("flags", ctypes.c_uint16),
+                ("len", ctypes.c_uint16),
+                ("buf", ctypes.POINTER(ctypes.c_uint8))]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    # struct i2c_rdwr_ioctl_data from linux/i2c-dev.h
+    _fields_ = [("msgs", ctypes.POINTER(i2c_msg)),
+                ("nmsgs", ctypes.c_uint32)]
+
+
+class I2CBus:
+    # Access to an I2C bus using combined (Repeated Start) transactions
+
+    def __init__(self, busnum):
+        # Open the I2C device for the given bus number, e.g. 1 for /dev/i2c-1
+        # Only read / write access to the device is required, typically via the i2c group
+        self.busnum = busnum
+        self.fd = os.open("/dev/i2c-%d" % busnum, os.O_RDWR)
+        # Only one transfer can be in progress at a time, other threads wait between transfers
+        self.lock = threading.RLock()
+        logging.info("Opened I2C bus %d for combined transactions" % busnum)
+
+    def close(self):
+        # Release the I2C device
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        return
+
+    def transfer(self, address, messages):
+        # Send the given messages in a single I2C_RDWR ioctl
+        # messages is a list of (flags, buffer) pairs, buffers for reads are filled in
+        msgs = (i2c_msg * len(messages))()
+        for index, (flags, buf) in enumerate(messages):
+            msgs[index].addr = address
+            msgs[index].flags = flags
+            msgs[index].len = len(buf)
+            msgs[index].buf = ctypes.cast(buf, ctypes.POINTER(ctypes.c_uint8))
+        data = i2c_rdwr_ioctl_data(msgs, len(messages))
+        with self.lock:
+            fcntl.ioctl(self.fd, I2C_RDWR, data)
+        return
+
+    def read_combined(self, address, blocks):
+        # Read several blocks of registers in one system call
+        # blocks is a list of (register, length) pairs, returns a list of values for each block
+        if len(blocks) * 2 > I2C_RDWR_IOCTL_MAX_MSGS:
+            raise ValueError("Too many register blocks for a single transfer: %d" % len(blocks))
+        messages = []
+        buffers = []
+        for register, length in blocks:
+            reg_buf = (ctypes.c_uint8 * 1)(register)
+            data_buf = (ctypes.c_uint8 * length)()
+            messages.append((0, reg_buf))
+            messages.append((I2C_M_RD, data_buf))
+            buffers.append(data_buf)
+        self.transfer(address, messages)
+        values = [list(buf) for buf in buffers]
+        logging.debug("Combined read from %x of %s returned %s" % (address, blocks, values))
+        return values
+
+    def read_i2c_block_data(self, address, register, length):
+        # Read length consecutive registers starting at register using a Repeated Start
+        return self.read_combined(address, [(register, length)])[0]
+
+    def read_byte_data(self, address, register):
+        # Read a single register using a Repeated Start
+        return self.read_combined(address, [(register, 1)])[0][0]
+
+    def read_word_data(self, address, register):
+        # Read 2 consecutive registers and return them as a little endian word, as SMBus does
+        data_l, data_h = self.read_combined(address, [(register, 2)])[0]
+        return (data_h << 8) + data_l
+
+    def write_i2c_block_data(self, address, register, values):
+        # Write the register address followed by all the values in a single message
+        buf = (ctypes.c_uint8 * (len(values) + 1))(register, *values)
+        self.transfer(address, [(0, buf)])
+        return
+
+    def write_byte_data(self, address, register, value):
+        # Write a single register
+        self.write_i2c_block_data(address, register, [value])
+        return
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Data Format Decoding
+
+For more information see www.BostinTechnology.com
+
+The iCogs sensors return their readings as fixed point numbers spread over several registers.
+Rather than each reader having its own conversion routines, every output format is described
+once in the FORMATS table below, and the same description is used to decode a single reading or
+a whole block of logged raw bytes.
+
+Each format gives
+bytes       - the number of register bytes in each value
+order       - "big" if the first register is the most significant, "little" if it is the least
+bits        - the number of significant bits, which are left justified in the registers
+signed      - True if the value is a 2's compliment number
+fraction    - the number of fractional bits, the value is divided by 2 ^ fraction
+
+Unpack(name, data)                  - returns the list of integer values in the bytes of data
+Decode(name, data, scale)           - returns the list of values, including the fraction and scale
+UnpackArray(name, data)             - as Unpack, but returns a numpy array
+DecodeArray(name, data, scale)      - as Decode, but returns a numpy array
+
+The array functions need numpy, and decode all the values in a single operation.
+
+It can also be run to decode a file of logged raw bytes into a CSV file
+    python3 iCogsDecode.py format input.bin output.csv [columns]
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import sys
+
+# numpy is only needed to decode arrays of values
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FORMATS = {
+    # Ps.3 OUT_P in Altimeter mode and OUT_P_DELTA, meters as signed Q16.4
+    "ps3_altitude": {"bytes": 3, "order": "big", "bits": 20, "signed": True, "fraction": 4},
+    # Ps.3 OUT_P in Barometer mode, Pascals as unsigned Q18.2
+    "ps3_pressure": {"bytes": 3, "order": "big", "bits": 20, "signed": False, "fraction": 2},
+    # Ps.3 OUT_P_DELTA in Barometer mode, Pascals as signed Q18.2
+    "ps3_pressure_delta": {"bytes": 3, "order": "big", "bits": 20, "signed": True, "fraction": 2},
+    # Ps.3 OUT_P in Raw mode, the 24 bit ADC count
+    "ps3_raw": {"bytes": 3, "order": "big", "bits": 24, "signed": False, "fraction": 0},
+    # Ps.3 OUT_T and OUT_T_DELTA, Deg C as signed Q8.4
+    "ps3_temperature": {"bytes": 2, "order": "big", "bits": 12, "signed": True, "fraction": 4},
+    # Rs.2 OUT_X / Y / Z, 12 bit left justified counts, scaled by the Full Scale Range
+    "rs2_axis": {"bytes": 2, "order": "big", "bits": 12, "signed": True, "fraction": 0},
+    # Rs.2 OUT_X / Y / Z_MSB in Fast Read mode, the top 8 bits of the 12 bit counts
+    "rs2_axis8": {"bytes": 1, "order": "big", "bits": 8, "signed": True, "fraction": 0},
+    # Ts.1 H_OUT, T_OUT and the calibration OUT values, 16 bit little endian counts
+    "ts1_word": {"bytes": 2, "order": "little", "bits": 16, "signed": True, "fraction": 0},
+}
+
+
+def BuildFormat(fmt):
+    # Add the values used by the decoding to a format description
+    # shifts are the left shift for each byte, justify is the right shift to remove unused low bits
+    size = fmt["bytes"]
+    if fmt["order"] == "big":
+        fmt["shifts"] = [8 * (size - 1 - n) for n in range(size)]
+    else:
+        fmt["shifts"] = [8 * n for n in range(size)]
+    fmt["justify"] = 8 * size - fmt["bits"]
+    fmt["sign"] = 1 << (fmt["bits"] - 1)
+    fmt["divisor"] = 1 << fmt["fraction"]
+    return fmt
+
+for fmt in FORMATS.values():
+    BuildFormat(fmt)
+
+
+def Unpack(name, data):
+    # Return the integer values of the given format held in the list of bytes read from the registers
+    fmt = FORMATS[name]
+    size = fmt["bytes"]
+    if len(data) % size != 0:
+        raise ValueError("%d bytes is not a whole number of %s values" % (len(data), name))
+    values = []
+    for n in range(0, len(data), size):
+        value = 0
+        for byte, shift in zip(data[n:n + size], fmt["shifts"]):
+            value = value | (byte << shift)
+        value = value >> fmt["justify"]
+        if fmt["signed"]:
+            value = (value ^ fmt["sign"]) - fmt["sign"]
+        values.append(value)
+    return values
+
+def Decode(name, data, scale=1.0):
+    # Return the values of the given format held in the list of bytes, with the fraction removed
+    # and multiplied by scale, e.g. the Full Scale Range of the Rs.2
+    fmt = FORMATS[name]
+    return [value * scale / fmt["divisor"] for value in Unpack(name, data)]
+
+def UnpackArray(name, data):
+    # Return a numpy array of the integer values of the given format held in data, which is any array
+    # of bytes, e.g. a bytes object read from a file or a list of register values
+    if numpy is None:
+        raise RuntimeError("Decoding arrays requires numpy, install it with: sudo apt-get install python3-numpy")
+    fmt = FORMATS[name]
+    raw = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+    if len(raw) % fmt["bytes"] != 0:
+        raise ValueError("%d bytes is not a whole number of %s values" % (len(raw), name))
+    raw = raw.reshape(-1, fmt["bytes"]).astype(numpy.int64)
+    values = (raw << numpy.array(fmt["shifts"], dtype=numpy.int64)).sum(axis=1) >> fmt["justify"]
+    if fmt["signed"]:
+        values = (values ^ fmt["sign"]) - fmt["sign"]
+    return values
+
+def DecodeArray(name, data, scale=1.0):
+    # Return a numpy array of the values of the given format held in data, with the fraction removed
+    # and multiplied by scale
+    return UnpackArray(name, data) * (scale / FORMATS[name]["divisor"])
+
+
+def DecodeFile(name, input_file, output_file, columns=1):
+    # Decode a file of raw register bytes in the given format and write the values to a CSV file,
+    # with columns values on each line, e.g. 3 for the x, y, z values of the Rs.2
+    with open(input_file, "rb") as raw_file:
+        data = raw_file.read()
+    values = DecodeArray(name, data)
+    values = values[:len(values) - len(values) % columns].reshape(-1, columns)
+    numpy.savetxt(output_file, values, delimiter=",", fmt="%.6f")
+    print("Decoded %d %s values into %s" % (values.size, name, output_file))
+    return
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in [4, 5] or sys.argv[1] not in FORMATS:
+        print("Usage: python3 iCogsDecode.py format input.bin output.csv [columns]")
+        print("Formats: %s" % ", ".join(sorted(FORMATS)))
+        sys.exit()
+    columns = 1
+    if len(sys.argv) == 5:
+        columns = int(sys.argv[4])
+    DecodeFile(sys.argv[1], sys.argv[2], sys.argv[3], columns)
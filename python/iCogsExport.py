@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Sample Export
+
+For more information see www.BostinTechnology.com
+
+Writes samples, such as those published on a SampleStream, to files as CSV, newline delimited
+JSON, or compressed column chunks. Adding a sample only places it in a batch in memory; the
+batches are formatted, compressed and written by a background thread, so taking readings never
+waits for the disk. A batch is written when it reaches the batch size, or when its oldest sample
+has waited max_delay seconds.
+
+Each file is given the time it was started and its number in its name, e.g.
+capture-20170601-120000-001.csv, and a new file is started when the current one reaches
+rotate_bytes or is rotate_seconds old.
+
+If the disk falls so far behind that max_pending samples are waiting, the oldest samples are
+discarded and counted, so the memory used stays bounded. Samples that cannot be written, e.g.
+because the disk is full, are also counted as dropped, and a new file is tried for the next batch.
+
+writer = iCogsExport.CSVWriter(filename, batch, max_delay, rotate_bytes, rotate_seconds)
+writer = iCogsExport.NDJSONWriter(...)
+writer = iCogsExport.ColumnWriter(...)
+writer.Start()
+writer.Add(sample)                      - add a sample to the current batch
+writer.Follow(stream)                   - add every sample published on a SampleStream
+writer.Stop()                           - write out any remaining samples and close the file
+
+The column chunk files (.icc) hold a sequence of chunks, each a CHUNKHEADER giving the compressed
+and uncompressed lengths followed by the zlib compressed chunk. A chunk is a JSON description of
+the columns, a newline, then the columns in order: numeric columns as little endian doubles and
+other columns as a JSON list. ReadColumnChunks(filename) reads them back.
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import array
+import collections
+import json
+import logging
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+# The defaults for the number of samples in a batch, the longest a sample waits to be written in
+# seconds, the size and age of a file before a new one is started, and the most samples waiting
+BATCH = 500
+MAXDELAY = 1.0
+ROTATEBYTES = 64 * 1024 * 1024
+ROTATESECONDS = 3600
+MAXPENDING = 100000
+
+# The compressed and uncompressed lengths of a column chunk
+CHUNKHEADER = struct.Struct("<II")
+
+
+class ExportWriter:
+    # Batches samples in memory and writes them to rotating files on a background thread
+    # The formats provide Extension, Open and Format
+
+    def __init__(self, filename, batch=BATCH, max_delay=MAXDELAY, rotate_bytes=ROTATEBYTES,
+                 rotate_seconds=ROTATESECONDS, max_pending=MAXPENDING):
+        # filename is the base name of the files, the start time is added before the extension
+        self.base = os.path.splitext(filename)[0]
+        self.batch = batch
+        self.max_delay = max_delay
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.pending = collections.deque(maxlen=max_pending)
+        self.pending_since = None
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.cancel = threading.Event()
+        self.thread = None
+        self.stop_following = threading.Event()
+        self.followers = []
+        self.file = None
+        self.filename = None
+        self.file_bytes = 0
+        self.file_started = 0
+        self.written = 0
+        self.dropped = 0
+        self.files = 0
+
+    def Add(self, sample):
+        # Add a sample to the batch waiting to be written, discarding the oldest if too many are waiting
+        with self.lock:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped = self.dropped + 1
+            self.pending.append(sample)
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            if len(self.pending) >= self.batch:
+                self.ready.set()
+        return
+
+    def TakeBatch(self):
+        # Return the samples waiting to be written, if there are enough or they have waited long enough
+        with self.lock:
+            if len(self.pending) == 0:
+                return []
+            if len(self.pending) < self.batch and time.monotonic() - self.pending_since < self.max_delay and not self.cancel.is_set():
+                return []
+            batch = list(self.pending)
+            self.pending.clear()
+            self.pending_since = None
+            self.ready.clear()
+        return batch
+
+    def Run(self):
+        # Write the batches as they become ready until stopped, then write out what is left
+        while True:
+            self.ready.wait(self.max_delay / 2)
+            stopping = self.cancel.is_set()
+            batch = self.TakeBatch()
+            while len(batch) > 0:
+                self.Write(batch)
+                batch = self.TakeBatch()
+            if stopping:
+                break
+        self.Close()
+        return
+
+    def Write(self, batch):
+        # Format the batch and write it to the current file, starting a new file when needed
+        if self.file is not None and (self.file_bytes >= self.rotate_bytes or time.time() - self.file_started >= self.rotate_seconds):
+            self.Close()
+        if self.file is None:
+            self.file_started = time.time()
+            filename = "%s-%s-%03d%s" % (self.base, time.strftime("%Y%m%d-%H%M%S", time.localtime(self.file_started)), self.files + 1, self.Extension())
+            try:
+                self.file = self.Open(filename)
+            except IOError as err:
+                # The file is opened again for the next batch, e.g. once space has been freed
+                logging.warning("Export could not open %s, %d samples dropped: %s" % (filename, len(batch), err))
+                self.dropped = self.dropped + len(batch)
+                return
+            self.filename = filename
+            self.files = self.files + 1
+            self.file_bytes = 0
+            logging.info("Export started file %s" % self.filename)
+        data = self.Format(batch)
+        try:
+            self.file.write(data)
+            self.file.flush()
+        except IOError as err:
+            # Close the file so a new one is started for the next batch
+            logging.warning("Export of %d samples to %s failed: %s" % (len(batch), self.filename, err))
+            self.dropped = self.dropped + len(batch)
+            self.Close()
+            return
+        self.file_bytes = self.file_bytes + len(data)
+        self.written = self.written + len(batch)
+        return
+
+    def Close(self):
+        # Close the current file
+        if self.file is not None:
+            try:
+                self.file.close()
+            except IOError as err:
+                logging.warning("Export could not close %s: %s" % (self.filename, err))
+            logging.info("Export closed file %s, %d bytes" % (self.filename, self.file_bytes))
+            self.file = None
+        return
+
+    def Start(self):
+        # Start the thread writing the batches
+        self.cancel.clear()
+        self.thread = threading.Thread(target=self.Run, name="Export %s" % self.base, daemon=True)
+        self.thread.start()
+        return
+
+    def Stop(self):
+        # Stop following any streams, write out the samples waiting and close the file
+        self.stop_following.set()
+        for thread in self.followers:
+            thread.join()
+        self.followers = []
+        self.stop_following.clear()
+        self.cancel.set()
+        self.ready.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logging.info("Export of %s stopped, %d samples written to %d files, %d dropped" % (self.base, self.written, self.files, self.dropped))
+        return
+
+    def Follow(self, stream):
+        # Add every sample published on the SampleStream, until stopped
+        samples = stream.Subscribe()
+        def Run():
+            while not self.stop_following.is_set():
+                try:
+                    self.Add(samples.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+            stream.Unsubscribe(samples)
+        thread = threading.Thread(target=Run, name="Export %s %s" % (self.base, stream.name), daemon=True)
+        thread.start()
+        self.followers.append(thread)
+        return
+
+
+class CSVWriter(ExportWriter):
+    # Comma separated values, with a header line of the entries of the first sample in each file
+
+    def Extension(self):
+        return ".csv"
+
+    def Open(self, filename):
+        self.columns = None
+        return open(filename, "wb")
+
+    def Format(self, batch):
+        lines = []
+        if self.columns is None:
+            self.columns = list(batch[0].keys())
+            lines.append(",".join(self.columns))
+        for sample in batch:
+            lines.append(",".join(FormatValue(sample.get(column, "")) for column in self.columns))
+        return ("\n".join(lines) + "\n").encode()
+
+
+class NDJSONWriter(ExportWriter):
+    # One JSON object for each sample on each line
+
+    def Extension(self):
+        return ".ndjson"
+
+    def Open(self, filename):
+        return open(filename, "wb")
+
+    def Format(self, batch):
+        return "".join(json.dumps(sample, separators=(",", ":")) + "\n" for sample in batch).encode()
+
+
+class ColumnWriter(ExportWriter):
+    # Each batch is written as a compressed chunk of columns
+
+    def Extension(self):
+        return ".icc"
+
+    def Open(self, filename):
+        return open(filename, "wb")
+
+    def Format(self, batch):
+        columns = []
+        for sample in batch:
+            for column in sample:
+                if column not in columns:
+                    columns.append(column)
+        types = []
+        parts = []
+        for column in columns:
+            values = [sample.get(column) for sample in batch]
+            if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                types.append("f8")
+                parts.append(array.array("d", values).tobytes() if sys.byteorder == "little" else Swapped(values))
+            else:
+                encoded = json.dumps(values, separators=(",", ":")).encode()
+                types.append("json:%d" % len(encoded))
+                parts.append(encoded)
+        description = json.dumps({"count": len(batch), "columns": columns, "types": types}).encode()
+        chunk = description + b"\n" + b"".join(parts)
+        compressed = zlib.compress(chunk, 6)
+        return CHUNKHEADER.pack(len(compressed), len(chunk)) + compressed
+
+
+def FormatValue(value):
+    # Format a value for a CSV file, quoting text that contains commas or quotes
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value)
+    if "," in text or '"' in text or "\n" in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def Swapped(values):
+    # Return the values as little endian doubles on a big endian machine
+    column = array.array("d", values)
+    column.byteswap()
+    return column.tobytes()
+
+def ReadColumnChunks(filename):
+    # Read a column chunk file, generating a dictionary of the lists of values for each chunk
+    with open(filename, "rb") as chunks:
+        while True:
+            header = chunks.read(CHUNKHEADER.size)
+            if len(header) < CHUNKHEADER.size:
+                return
+            compressed, length = CHUNKHEADER.unpack(header)
+            chunk = zlib.decompress(chunks.read(compressed))
+            end = chunk.index(b"\n")
+            description = json.loads(chunk[:end].decode())
+            offset = end + 1
+            result = {}
+            for column, kind in zip(description["columns"], description["types"]):
+                if kind == "f8":
+                    values = array.array("d", chunk[offset:offset + 8 * description["count"]])
+                    if sys.byteorder != "little":
+                        values.byteswap()
+                    result[column] = list(values)
+                    offset = offset + 8 * description["count"]
+                else:
+                    size = int(kind.split(":")[1])
+                    result[column] = json.loads(chunk[offset:offset + size].decode())
+                    offset = offset + size
+            yield result
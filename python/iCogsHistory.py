@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Reading History
+
+For more information see www.BostinTechnology.com
+
+Keeps the recent readings of each channel, e.g. the temperature from a Ts.1 or the x axis from
+an Rs.2, in fixed size numpy arrays used as ring buffers, so the memory used is known when the
+channel is created and never grows.
+
+As well as the raw readings, each channel keeps rollups of the readings at coarser resolutions,
+by default every 10 seconds for a day, every minute for 31 days and every hour for a year. Each
+rollup bucket holds the minimum, maximum, sum and count of the readings in its period. The
+buckets are updated as each reading arrives, and when a bucket's period ends it is stored and
+added into the current bucket of the next coarser resolution, so no readings are ever scanned
+again to build a rollup.
+
+Queries for a time range are answered from the raw readings or from the rollup at the requested
+resolution, using a binary search of the times in the ring buffer.
+
+history = iCogsHistory.History(raw_capacity, resolutions)
+history.Add(sample)                         - add every numeric entry in a sample as a channel
+history.Follow(stream)                      - add all the samples published on a SampleStream
+history.Query(channel, start, end, resolution) - returns a dictionary of arrays
+Footprint(raw_capacity, resolutions)        - the number of bytes used by each channel
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import logging
+import queue
+import threading
+
+import numpy
+
+# The default number of raw readings kept for each channel, an hour at 10 readings per second
+RAWCAPACITY = 36000
+
+# The default rollups, as [period in seconds, number of buckets kept]
+RESOLUTIONS = [[10, 8640], [60, 44640], [3600, 8784]]
+
+# The bytes used for each raw reading (time and value) and each rollup bucket (time, min, max, sum, count)
+RAWBYTES = 2 * 8
+BUCKETBYTES = 5 * 8
+
+
+def Footprint(raw_capacity=RAWCAPACITY, resolutions=RESOLUTIONS):
+    # Return the number of bytes used by the arrays of one channel
+    return raw_capacity * RAWBYTES + sum(buckets for period, buckets in resolutions) * BUCKETBYTES
+
+def RingRange(times, head, size, start, end):
+    # Return the indices of the entries in a ring buffer with times from start up to, but not
+    # including, end, in time order
+    # head is the index the next entry will be written to and size the number of entries held
+    # The entries from head to the end of the array are older than those before head
+    capacity = len(times)
+    if size < capacity:
+        segments = [[0, size]]
+    else:
+        segments = [[head, capacity], [0, head]]
+    indices = []
+    for first, last in segments:
+        segment = times[first:last]
+        low = first + numpy.searchsorted(segment, start, side="left")
+        high = first + numpy.searchsorted(segment, end, side="left")
+        indices.append(numpy.arange(low, high))
+    return numpy.concatenate(indices)
+
+
+class Rollup:
+    # The buckets of one resolution, with the bucket currently being filled
+
+    def __init__(self, period, capacity):
+        self.period = period
+        self.times = numpy.zeros(capacity)
+        self.minimum = numpy.zeros(capacity)
+        self.maximum = numpy.zeros(capacity)
+        self.total = numpy.zeros(capacity)
+        self.count = numpy.zeros(capacity)
+        self.head = 0
+        self.size = 0
+        # The current bucket, as [start time, min, max, sum, count]
+        self.current = None
+
+    def Add(self, bucket_time, minimum, maximum, total, count):
+        # Add a reading, or a completed bucket of a finer resolution, to the current bucket
+        # Returns the bucket that has been completed, or None
+        start = bucket_time - bucket_time % self.period
+        completed = None
+        if self.current is not None and start > self.current[0]:
+            completed = self.current
+            self.Store(completed)
+            self.current = None
+        if self.current is None:
+            self.current = [start, minimum, maximum, total, count]
+        else:
+            self.current[1] = min(self.current[1], minimum)
+            self.current[2] = max(self.current[2], maximum)
+            self.current[3] = self.current[3] + total
+            self.current[4] = self.current[4] + count
+        return completed
+
+    def Store(self, bucket):
+        # Write a completed bucket into the ring buffer, replacing the oldest when it is full
+        index = self.head
+        self.times[index], self.minimum[index], self.maximum[index], self.total[index], self.count[index] = bucket
+        self.head = (self.head + 1) % len(self.times)
+        self.size = min(self.size + 1, len(self.times))
+        return
+
+    def Oldest(self):
+        # Return the start time of the oldest bucket held
+        if self.size == 0:
+            return self.current[0] if self.current is not None else None
+        if self.size < len(self.times):
+            return self.times[0]
+        return self.times[self.head]
+
+    def Query(self, start, end):
+        # Return the buckets starting from start up to end, including the current bucket
+        indices = RingRange(self.times, self.head, self.size, start - self.period, end)
+        times = self.times[indices]
+        minimum = self.minimum[indices]
+        maximum = self.maximum[indices]
+        total = self.total[indices]
+        count = self.count[indices]
+        if self.current is not None and start - self.period < self.current[0] < end:
+            times, minimum, maximum, total, count = [numpy.append(column, value) for column, value in
+                                                     zip([times, minimum, maximum, total, count], self.current)]
+        # Only keep the buckets that overlap the range
+        keep = times + self.period > start
+        return {"time": times[keep], "min": minimum[keep], "max": maximum[keep],
+                "mean": total[keep] / count[keep], "count": count[keep], "period": self.period}
+
+
+class Channel:
+    # The raw readings and rollups of a single channel
+
+    def __init__(self, name, raw_capacity=RAWCAPACITY, resolutions=RESOLUTIONS):
+        self.name = name
+        self.times = numpy.zeros(raw_capacity)
+        self.values = numpy.zeros(raw_capacity)
+        self.head = 0
+        self.size = 0
+        self.rollups = [Rollup(period, buckets) for period, buckets in resolutions]
+        self.lock = threading.Lock()
+        logging.info("History channel %s created using %d bytes" % (name, Footprint(raw_capacity, resolutions)))
+
+    def Add(self, reading_time, value):
+        # Store a reading and add it to the rollups, cascading any completed buckets to the next resolution
+        with self.lock:
+            self.times[self.head] = reading_time
+            self.values[self.head] = value
+            self.head = (self.head + 1) % len(self.times)
+            self.size = min(self.size + 1, len(self.times))
+            bucket = [reading_time, value, value, value, 1]
+            for rollup in self.rollups:
+                bucket = rollup.Add(*bucket)
+                if bucket is None:
+                    break
+        return
+
+    def Query(self, start, end, resolution=None):
+        # Return the readings from start up to end
+        # resolution is the rollup period in seconds, 0 for the raw readings, or None to use the
+        # finest resolution that still holds the start of the range
+        with self.lock:
+            if resolution is None:
+                resolution = 0
+                if self.size == 0 or start < self.OldestRaw():
+                    for rollup in self.rollups:
+                        resolution = rollup.period
+                        oldest = rollup.Oldest()
+                        if oldest is not None and oldest <= start:
+                            break
+            if resolution == 0:
+                indices = RingRange(self.times, self.head, self.size, start, end)
+                return {"time": self.times[indices], "value": self.values[indices], "period": 0}
+            for rollup in self.rollups:
+                if rollup.period == resolution:
+                    return rollup.Query(start, end)
+        raise ValueError("Channel %s has no rollup with a period of %s seconds" % (self.name, resolution))
+
+    def OldestRaw(self):
+        # Return the time of the oldest raw reading held
+        if self.size < len(self.times):
+            return self.times[0]
+        return self.times[self.head]
+
+
+class History:
+    # The channels of readings, created as readings for them arrive
+
+    def __init__(self, raw_capacity=RAWCAPACITY, resolutions=RESOLUTIONS):
+        self.raw_capacity = raw_capacity
+        self.resolutions = resolutions
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.cancel = threading.Event()
+        self.threads = []
+
+    def GetChannel(self, name):
+        # Return the named channel, creating it if needed
+        with self.lock:
+            if name not in self.channels:
+                self.channels[name] = Channel(name, self.raw_capacity, self.resolutions)
+            return self.channels[name]
+
+    def Add(self, sample, prefix=""):
+        # Add every numeric entry of the sample, other than the time, to the channel of the same name
+        # prefix is added to the channel names, e.g. to identify the sensor
+        for name, value in sample.items():
+            if name == "time" or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            self.GetChannel(prefix + name).Add(sample["time"], value)
+        return
+
+    def Query(self, name, start, end, resolution=None):
+        # Return the readings of the named channel from start up to end, see Channel.Query
+        return self.GetChannel(name).Query(start, end, resolution)
+
+    def Memory(self):
+        # Return the number of bytes used by the arrays of all the channels
+        return len(self.channels) * Footprint(self.raw_capacity, self.resolutions)
+
+    def Follow(self, stream, prefix=""):
+        # Add every sample published on the SampleStream, using a thread to read them
+        samples = stream.Subscribe()
+        def Run():
+            while not self.cancel.is_set():
+                try:
+                    self.Add(samples.get(timeout=0.5), prefix)
+                except queue.Empty:
+                    pass
+            stream.Unsubscribe(samples)
+        thread = threading.Thread(target=Run, name="%s History" % stream.name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return
+
+    def Stop(self):
+        # Stop following all the streams
+        self.cancel.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.cancel.clear()
+        return
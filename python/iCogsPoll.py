@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Bounded Polling
+
+For more information see www.BostinTechnology.com
+
+Several of the iCogs sensors need the program to wait for a bit in a register to change, for
+example waiting for a Software Reset to complete or for new data to be available. Rather than
+reading the register continuously, PollUntil waits for the expected time before the first read,
+then backs off exponentially between reads up to a maximum interval. It gives up when the
+deadline passes or when it is cancelled from another thread.
+
+The bus is not held while waiting, so other sensors on the same bus can be read between attempts.
+The number of reads made by each wait is recorded against the name given, so slow or missing
+devices can be identified.
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import collections
+import logging
+import threading
+import time
+
+# The shortest time between polls, in seconds
+MIN_INTERVAL = 0.0005
+
+# The number of waits remembered for each name
+HISTORY = 100
+
+# The number of polls made for each of the recent waits, by name
+poll_counts = {}
+poll_counts_lock = threading.Lock()
+
+
+def PollUntil(check, expected=0.0, timeout=1.0, max_interval=0.1, cancel=None, name="Poll"):
+    # Repeatedly call check() until it returns a value that is True, the timeout passes or cancel is set
+    # expected is the time in seconds the condition is expected to take, the first check is made after it
+    # The time between checks then doubles until it reaches max_interval
+    # cancel is an optional threading.Event that stops the wait when set
+    # timeout can be None to wait until the condition is met or cancelled, e.g. for an event that may never come
+    # A check that fails with an IOError (e.g. device not responding during a reset) counts as not ready
+    # Returns the value from check(), or None if the wait timed out or was cancelled
+    if cancel is None:
+        cancel = threading.Event()
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+    interval = max(expected, MIN_INTERVAL)
+    wait = expected
+    polls = 0
+    result = None
+    while True:
+        if wait > 0:
+            # Don't wait past the deadline, and wake immediately if cancelled
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            if cancel.wait(wait):
+                logging.info("%s cancelled after %d polls" % (name, polls))
+                break
+        polls = polls + 1
+        try:
+            result = check()
+        except IOError as err:
+            logging.debug("%s poll %d failed with %s" % (name, polls, err))
+            result = None
+        if result:
+            logging.debug("%s complete after %d polls in %f seconds" % (name, polls, time.monotonic() - start))
+            break
+        result = None
+        if deadline is not None and time.monotonic() >= deadline:
+            logging.warning("%s timed out after %d polls in %f seconds" % (name, polls, timeout))
+            break
+        wait = interval
+        interval = min(interval * 2, max_interval)
+    RecordPolls(name, polls)
+    return result
+
+def RecordPolls(name, polls):
+    # Add the number of polls for a wait to the history for the given name
+    with poll_counts_lock:
+        if name not in poll_counts:
+            poll_counts[name] = collections.deque(maxlen=HISTORY)
+        poll_counts[name].append(polls)
+    return
+
+def PollStatistics(name):
+    # Return the number of waits, minimum, maximum and mean number of polls for the given name
+    with poll_counts_lock:
+        counts = list(poll_counts.get(name, []))
+    if len(counts) == 0:
+        return [0, 0, 0, 0]
+    return [len(counts), min(counts), max(counts), sum(counts) / len(counts)]
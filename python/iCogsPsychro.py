@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Psychrometric Derived Metrics
+
+For more information see www.BostinTechnology.com
+
+Calculates the values derived from temperature and relative humidity readings, such as those from
+the Ts.1, for whole arrays of readings at once using numpy:
+
+saturation_pressure - saturation vapour pressure over water, Pa (Magnus formula)
+vapour_pressure     - actual vapour pressure, Pa
+dew_point           - dew point, Deg C
+absolute_humidity   - water vapour density, g/m3
+humidex             - Canadian humidex, Deg C
+vpd                 - vapour pressure deficit, Pa
+
+The saturation vapour pressure is the only exponential, and it can optionally be looked up in a
+precomputed table instead of being calculated for every reading.
+
+A DerivedStage subscribes to a SampleStream of samples with "temperature" and "humidity" entries,
+and publishes each sample with the derived values added, calculating them a batch at a time.
+
+It can also be run to backfill a CSV file with time, temperature and humidity columns
+    python3 iCogsPsychro.py input.csv output.csv
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import iCogsStream
+import logging
+import queue
+import sys
+import threading
+import time
+
+import numpy
+
+# Magnus formula coefficients for saturation vapour pressure over water, valid -45 to 60 Deg C
+MAGNUS_A = 611.2
+MAGNUS_B = 17.62
+MAGNUS_C = 243.12
+
+# Specific gas constant for water vapour, J/(kg K)
+RV = 461.5
+
+# Zero Deg C in Kelvin
+KELVIN = 273.15
+
+# The names of the derived values, in the order they are written out
+DERIVED = ["saturation_pressure", "vapour_pressure", "dew_point", "absolute_humidity", "humidex", "vpd"]
+
+
+def SaturationTable(t_min=-45.0, t_max=60.0, step=0.01):
+    # Precompute the saturation vapour pressure over the temperature range, at the given step in Deg C
+    # Returns [temperatures, pressures] for use with DerivedMetrics
+    temperatures = numpy.arange(t_min, t_max + step, step)
+    pressures = MAGNUS_A * numpy.exp(MAGNUS_B * temperatures / (MAGNUS_C + temperatures))
+    return [temperatures, pressures]
+
+def DerivedMetrics(temperature, humidity, table=None):
+    # Calculate all the derived values for arrays of temperature (Deg C) and relative humidity (%)
+    # table is an optional saturation table from SaturationTable, used instead of calculating it
+    # Returns a dictionary of arrays, one for each of the DERIVED names
+    t = numpy.asarray(temperature, dtype=numpy.float64)
+    rh = numpy.clip(numpy.asarray(humidity, dtype=numpy.float64), 0.01, 100.0)
+    if table is None:
+        es = MAGNUS_A * numpy.exp(MAGNUS_B * t / (MAGNUS_C + t))
+    else:
+        es = numpy.interp(t, table[0], table[1])
+    e = es * rh / 100
+    # The dew point is the inverse of the Magnus formula for the actual vapour pressure
+    gamma = numpy.log(e / MAGNUS_A)
+    dew_point = MAGNUS_C * gamma / (MAGNUS_B - gamma)
+    absolute_humidity = 1000 * e / (RV * (t + KELVIN))
+    # Humidex uses the vapour pressure in hPa
+    humidex = t + 0.5555 * (e / 100 - 10)
+    return {"saturation_pressure": es, "vapour_pressure": e, "dew_point": dew_point,
+            "absolute_humidity": absolute_humidity, "humidex": humidex, "vpd": es - e}
+
+
+class DerivedStage:
+    # Adds the derived values to the samples from one stream and publishes them on another
+
+    def __init__(self, source, name="Derived Metrics", batch=50, max_delay=1.0, table=None):
+        # source is the SampleStream to read, batch is the most samples to calculate at once and
+        # max_delay is the longest time in seconds a sample waits for the rest of its batch
+        self.source = source
+        self.output = iCogsStream.SampleStream(name)
+        self.batch = batch
+        self.max_delay = max_delay
+        self.table = table
+        self.cancel = threading.Event()
+        self.thread = None
+        self.queue = None
+
+    def Start(self):
+        # Subscribe to the source and start the thread calculating the derived values
+        self.queue = self.source.Subscribe(self.batch * 10)
+        self.cancel.clear()
+        self.thread = threading.Thread(target=self.Run, name=self.output.name, daemon=True)
+        self.thread.start()
+        return self.output
+
+    def Stop(self):
+        # Stop the thread and unsubscribe from the source
+        self.cancel.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.source.Unsubscribe(self.queue)
+        return
+
+    def Run(self):
+        # Collect a batch of samples, calculate the derived values in one go and publish them
+        while not self.cancel.is_set():
+            samples = []
+            deadline = time.monotonic() + self.max_delay
+            while len(samples) < self.batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.cancel.is_set():
+                    break
+                try:
+                    samples.append(self.queue.get(timeout=min(remaining, 0.1)))
+                except queue.Empty:
+                    pass
+            if len(samples) == 0:
+                continue
+            derived = DerivedMetrics([s["temperature"] for s in samples], [s["humidity"] for s in samples], self.table)
+            for index, sample in enumerate(samples):
+                result = dict(sample)
+                for name in DERIVED:
+                    result[name] = float(derived[name][index])
+                self.output.Publish(result)
+            logging.debug("%s calculated for %d samples" % (self.output.name, len(samples)))
+        return
+
+
+def Backfill(input_file, output_file, use_table=True):
+    # Read a CSV file with a header and time, temperature and humidity columns, and write it out with
+    # the derived values added as extra columns
+    # A file with a single reading gives a 0-d array, so make it 1-d
+    data = numpy.atleast_1d(numpy.genfromtxt(input_file, delimiter=",", names=True))
+    table = None
+    if use_table:
+        table = SaturationTable()
+    derived = DerivedMetrics(data["temperature"], data["humidity"], table)
+    columns = [data["time"], data["temperature"], data["humidity"]] + [derived[name] for name in DERIVED]
+    numpy.savetxt(output_file, numpy.column_stack(columns), delimiter=",", fmt="%.6f",
+                  header=",".join(["time", "temperature", "humidity"] + DERIVED), comments="")
+    print("Backfilled %d readings into %s" % (len(data), output_file))
+    return
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 iCogsPsychro.py input.csv output.csv")
+        sys.exit()
+    Backfill(sys.argv[1], sys.argv[2])
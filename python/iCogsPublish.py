@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Sample Publisher
+
+For more information see www.BostinTechnology.com
+
+Only one process can own a sensor, but several, e.g. alerting, a dashboard and an uploader, may
+want its readings. A Publisher lets the process reading the sensor publish each sample once to a
+Unix domain socket, and any number of local processes connect to the socket to receive them.
+
+Each sample is encoded once, and the encoded frame is passed to every connected subscriber
+through an iCogsStream.SampleStream, so each subscriber has its own bounded queue and the oldest
+frames are discarded when it falls behind. Each subscriber has a thread sending its frames, so a
+slow or stuck subscriber never holds up the thread reading the sensor.
+
+publisher = iCogsPublish.Publisher(path, maxsize)
+publisher.Start()                       - start accepting subscribers, IOError if already in use
+publisher.Publish(sample)               - send the sample to every subscriber
+publisher.Follow(stream)                - publish every sample published on a SampleStream
+publisher.Stop()
+for sample in Subscribe(path):          - connect to a publisher and generate the samples received
+SocketPath(reader)                      - the default socket for a reader, e.g. SocketPath("ts1")
+
+Each reader publishes on its own socket, so several can run at once. A publisher will not start
+on a socket another publisher is still using, but replaces one left behind by a stopped process.
+
+Each frame is a FRAME giving the length of the rest of the frame, then the number of entries in
+the sample, then for each entry the length of its name, the name, a type and the value:
+    d - a little endian double
+    q - a little endian 64 bit integer
+    s - a 32 bit length and UTF-8 text
+    j - a 32 bit length and JSON, for any other value
+
+It can also be run to print the samples from a reader's publisher, or the one on a socket path
+    python3 iCogsPublish.py ts1
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import iCogsStream
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+
+# The default socket each reader publishes its samples on, e.g. /tmp/icogs-ts1.sock
+SOCKETPATH = "/tmp/icogs-%s.sock"
+
+# The default number of frames held for each subscriber
+QUEUESIZE = 100
+
+# The length of the frame after the header
+FRAME = struct.Struct("<I")
+NAME = struct.Struct("<B")
+DOUBLE = struct.Struct("<cd")
+INTEGER = struct.Struct("<cq")
+TEXT = struct.Struct("<cI")
+
+
+def SocketPath(reader):
+    # Return the default socket for a reader, e.g. "ts1"
+    return SOCKETPATH % reader
+
+def EncodeSample(sample):
+    # Return the frame for a sample
+    parts = []
+    for name, value in list(sample.items())[:255]:
+        encoded = str(name).encode()[:255]
+        parts.append(NAME.pack(len(encoded)) + encoded)
+        if isinstance(value, float):
+            parts.append(DOUBLE.pack(b"d", value))
+        elif isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63:
+            parts.append(INTEGER.pack(b"q", value))
+        elif isinstance(value, str):
+            text = value.encode()
+            parts.append(TEXT.pack(b"s", len(text)) + text)
+        else:
+            text = json.dumps(value, separators=(",", ":")).encode()
+            parts.append(TEXT.pack(b"j", len(text)) + text)
+    body = NAME.pack(len(parts) // 2) + b"".join(parts)
+    return FRAME.pack(len(body)) + body
+
+def DecodeSample(frame):
+    # Return the sample from a frame, without its FRAME header length
+    count = frame[0]
+    offset = 1
+    sample = {}
+    for entry in range(count):
+        length = frame[offset]
+        name = frame[offset + 1:offset + 1 + length].decode()
+        offset = offset + 1 + length
+        kind = frame[offset:offset + 1]
+        if kind == b"d":
+            sample[name] = DOUBLE.unpack_from(frame, offset)[1]
+            offset = offset + DOUBLE.size
+        elif kind == b"q":
+            sample[name] = INTEGER.unpack_from(frame, offset)[1]
+            offset = offset + INTEGER.size
+        else:
+            length = TEXT.unpack_from(frame, offset)[1]
+            text = frame[offset + TEXT.size:offset + TEXT.size + length].decode()
+            sample[name] = text if kind == b"s" else json.loads(text)
+            offset = offset + TEXT.size + length
+    return sample
+
+
+class Publisher:
+    # Sends each sample published to every process connected to the Unix domain socket
+
+    def __init__(self, path, maxsize=QUEUESIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.frames = iCogsStream.SampleStream("Publisher %s" % path)
+        self.listener = None
+        self.bound = False
+        self.cancel = threading.Event()
+        self.threads = []
+        self.followers = []
+        self.connections = []
+        self.subscribers = 0
+
+    def Publish(self, sample):
+        # Encode the sample and pass it to every subscriber's queue, never waiting for a subscriber
+        self.frames.Publish(EncodeSample(sample))
+        return
+
+    def Start(self):
+        # Create the socket and start accepting subscribers
+        # Raises IOError if another publisher is using the socket, one left from a stopped process is replaced
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                logging.info("Removing the stale socket %s" % self.path)
+                os.unlink(self.path)
+            else:
+                raise IOError("Another publisher is using %s" % self.path)
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.bound = True
+        self.listener.listen(5)
+        self.listener.settimeout(0.5)
+        self.cancel.clear()
+        thread = threading.Thread(target=self.Accept, name="%s Accept" % self.frames.name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        logging.info("Publishing samples on %s" % self.path)
+        return
+
+    def Accept(self):
+        # Accept subscribers until cancelled, starting a thread to send each one its frames
+        while not self.cancel.is_set():
+            try:
+                connection, address = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            connection.settimeout(None)
+            self.connections.append(connection)
+            frames = self.frames.Subscribe(self.maxsize)
+            self.subscribers = self.subscribers + 1
+            thread = threading.Thread(target=self.Send, args=(connection, frames, self.subscribers),
+                                      name="%s Subscriber %d" % (self.frames.name, self.subscribers), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return
+
+    def Send(self, connection, frames, number):
+        # Send the frames in the subscriber's queue until cancelled or the subscriber disconnects
+        logging.info("Subscriber %d connected to %s" % (number, self.path))
+        while not self.cancel.is_set():
+            try:
+                frame = frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                connection.sendall(frame)
+            except OSError as err:
+                logging.info("Subscriber %d disconnected from %s: %s" % (number, self.path, err))
+                break
+        logging.info("Subscriber %d had %d frames dropped" % (number, self.frames.Dropped(frames)))
+        self.frames.Unsubscribe(frames)
+        self.connections.remove(connection)
+        connection.close()
+        return
+
+    def Follow(self, stream):
+        # Publish every sample published on the SampleStream, until stopped
+        samples = stream.Subscribe()
+        def Run():
+            while not self.cancel.is_set():
+                try:
+                    self.Publish(samples.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+            stream.Unsubscribe(samples)
+        thread = threading.Thread(target=Run, name="%s %s" % (self.frames.name, stream.name), daemon=True)
+        thread.start()
+        self.followers.append(thread)
+        return
+
+    def Stop(self):
+        # Stop following any streams, disconnect the subscribers and remove the socket
+        self.cancel.set()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        # A subscriber that has stopped reading leaves its thread waiting to send, so shut down
+        # the connections to release them
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for thread in self.followers + self.threads:
+            thread.join()
+        self.followers = []
+        self.threads = []
+        if self.bound and os.path.exists(self.path):
+            os.unlink(self.path)
+        self.bound = False
+        logging.info("Stopped publishing on %s after %d samples" % (self.path, self.frames.published))
+        return
+
+
+def ReadExactly(connection, length):
+    # Read length bytes from the socket, returns fewer if the publisher has closed it
+    data = b""
+    while len(data) < length:
+        received = connection.recv(length - len(data))
+        if len(received) == 0:
+            break
+        data = data + received
+    return data
+
+def Subscribe(path):
+    # Connect to a publisher and generate the samples received, until it closes the socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+    try:
+        while True:
+            header = ReadExactly(connection, FRAME.size)
+            if len(header) < FRAME.size:
+                return
+            length = FRAME.unpack(header)[0]
+            frame = ReadExactly(connection, length)
+            if len(frame) < length:
+                return
+            yield DecodeSample(frame)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 iCogsPublish.py reader|path, e.g. python3 iCogsPublish.py ts1")
+        sys.exit()
+    path = sys.argv[1] if "/" in sys.argv[1] else SocketPath(sys.argv[1])
+    try:
+        for sample in Subscribe(path):
+            print(sample)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Bus Recording and Replay
+
+For more information see www.BostinTechnology.com
+
+Records every transaction a reader makes on the I2C bus, with the time it completed, into a
+compact binary file, and replays the file in place of the bus. A session captured in the field
+can then be run again, and profiled, on a machine with no sensors attached.
+
+A RecordingBus wraps the SMBus or iCogsBus used by a reader and writes each register read or
+write, and any IOError, to the file as it passes it on. A ReplayBus reads the file and returns the
+recorded values for each read in turn, checking each request, and the values of each write, are
+the same as the ones recorded. It can replay as fast as possible, or wait until each
+transaction's original time.
+
+The readers open their bus with OpenBus, which uses the environment variables
+    ICOGS_RECORD=file       - record the session to file
+    ICOGS_REPLAY=file       - replay the session from file instead of opening the bus
+    ICOGS_REPLAY_TIMING=1   - replay with the original timing
+e.g. ICOGS_RECORD=session.icb python3 Rs_2.py
+The same menu choices must be made when replaying, e.g. by redirecting the input from a file.
+
+The file starts with the HEADER (identifier, version and the time the recording started), then
+has a RECORD for each transaction: the seconds since the start, the kind, address, register and
+number of data bytes, followed by the data bytes.
+
+It can also be run to summarise a recording
+    python3 iCogsRecord.py session.icb
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import atexit
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+
+IDENTIFIER = b"iCogsBus"
+VERSION = 1
+HEADER = struct.Struct("<8sBd")
+RECORD = struct.Struct("<dBBBH")
+
+# The kinds of transaction
+READ = 1
+WRITE = 2
+ERROR = 3
+KINDS = {READ: "Read", WRITE: "Write", ERROR: "Error"}
+
+
+class RecordingBus:
+    # Passes every transaction on to the bus and records it in the file
+
+    def __init__(self, bus, filename):
+        self.bus = bus
+        self.file = open(filename, "wb")
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        self.file.write(HEADER.pack(IDENTIFIER, VERSION, time.time()))
+        # Make sure the recording is written out however the reader exits
+        atexit.register(self.close)
+        logging.info("Recording bus transactions to %s" % filename)
+
+    def Record(self, kind, address, register, data):
+        # Write a transaction to the file
+        with self.lock:
+            self.file.write(RECORD.pack(time.monotonic() - self.start, kind, address, register, len(data)) + bytes(data))
+        return
+
+    def Read(self, address, register, length, read):
+        # Make the read, recording its values or the error
+        try:
+            values = read()
+        except IOError:
+            self.Record(ERROR, address, register, [length & 0xff])
+            raise
+        self.Record(READ, address, register, values)
+        return values
+
+    def close(self):
+        # Write out the recording and close the bus
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+        if hasattr(self.bus, "close"):
+            self.bus.close()
+        return
+
+    def read_byte_data(self, address, register):
+        return self.Read(address, register, 1, lambda: [self.bus.read_byte_data(address, register)])[0]
+
+    def read_word_data(self, address, register):
+        word = self.Read(address, register, 2, lambda: list(self.bus.read_word_data(address, register).to_bytes(2, "little")))
+        return (word[1] << 8) + word[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        return self.Read(address, register, length, lambda: self.bus.read_i2c_block_data(address, register, length))
+
+    def read_combined(self, address, blocks):
+        # Each block is recorded as a separate read, the bus is used for a single transaction if it can
+        if not hasattr(self.bus, "read_combined"):
+            return [self.read_i2c_block_data(address, register, length) for register, length in blocks]
+        try:
+            values = self.bus.read_combined(address, blocks)
+        except IOError:
+            self.Record(ERROR, address, blocks[0][0], [blocks[0][1] & 0xff])
+            raise
+        for (register, length), data in zip(blocks, values):
+            self.Record(READ, address, register, data)
+        return values
+
+    def Write(self, address, register, values, write):
+        # Make the write, recording its values or the error
+        try:
+            write()
+        except IOError:
+            self.Record(ERROR, address, register, [len(values) & 0xff])
+            raise
+        self.Record(WRITE, address, register, values)
+        return
+
+    def write_byte_data(self, address, register, value):
+        self.Write(address, register, [value], lambda: self.bus.write_byte_data(address, register, value))
+        return
+
+    def write_i2c_block_data(self, address, register, values):
+        self.Write(address, register, values, lambda: self.bus.write_i2c_block_data(address, register, values))
+        return
+
+
+def ReadRecording(filename):
+    # Read a recording, returns the time it started and a list of [time, kind, address, register, data]
+    with open(filename, "rb") as recording:
+        content = recording.read()
+    identifier, version, started = HEADER.unpack_from(content, 0)
+    if identifier != IDENTIFIER or version != VERSION:
+        raise ValueError("%s is not a version %d bus recording" % (filename, VERSION))
+    transactions = []
+    offset = HEADER.size
+    while offset + RECORD.size <= len(content):
+        when, kind, address, register, length = RECORD.unpack_from(content, offset)
+        offset = offset + RECORD.size
+        transactions.append([when, kind, address, register, list(content[offset:offset + length])])
+        offset = offset + length
+    return [started, transactions]
+
+
+class ReplayBus:
+    # Returns the recorded values for each read in place of the bus
+
+    def __init__(self, filename, timing=False):
+        # timing is True to wait for each transaction's original time, False to replay as fast as possible
+        self.started, self.transactions = ReadRecording(filename)
+        self.timing = timing
+        self.position = 0
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        logging.info("Replaying %d bus transactions from %s" % (len(self.transactions), filename))
+
+    def Next(self, kind, address, register, length, values=None):
+        # Return the next transaction, checking it is the one requested
+        # values are the bytes of a write, which must be the ones recorded
+        with self.lock:
+            if self.position >= len(self.transactions):
+                raise IOError("Bus replay has reached the end of the recording")
+            when, recorded, rec_address, rec_register, data = self.transactions[self.position]
+            self.position = self.position + 1
+        if self.timing:
+            delay = when - (time.monotonic() - self.start)
+            if delay > 0:
+                time.sleep(delay)
+        if recorded == ERROR and (rec_address, rec_register) == (address, register):
+            raise IOError("Recorded bus error %s %x register %x" % ("reading" if kind == READ else "writing", rec_address, rec_register))
+        if (recorded, rec_address, rec_register) != (kind, address, register) or (length is not None and len(data) != length):
+            raise ValueError("Bus replay transaction %d is %s %x register %x of %d bytes, not %s %x register %x"
+                             % (self.position - 1, KINDS[recorded], rec_address, rec_register, len(data), KINDS[kind], address, register))
+        if values is not None and list(values) != data:
+            raise ValueError("Bus replay transaction %d wrote %s to %x register %x, not %s"
+                             % (self.position - 1, data, rec_address, rec_register, list(values)))
+        return data
+
+    def close(self):
+        logging.info("Bus replay finished after %d of %d transactions" % (self.position, len(self.transactions)))
+        return
+
+    def read_byte_data(self, address, register):
+        return self.Next(READ, address, register, 1)[0]
+
+    def read_word_data(self, address, register):
+        data = self.Next(READ, address, register, 2)
+        return (data[1] << 8) + data[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        return self.Next(READ, address, register, length)
+
+    def read_combined(self, address, blocks):
+        return [self.Next(READ, address, register, length) for register, length in blocks]
+
+    def write_byte_data(self, address, register, value):
+        self.Next(WRITE, address, register, 1, [value])
+        return
+
+    def write_i2c_block_data(self, address, register, values):
+        self.Next(WRITE, address, register, len(values), values)
+        return
+
+
+def OpenBus(bus_class, busnum):
+    # Open the bus for a reader, e.g. OpenBus(iCogsBus.I2CBus, 1), recording or replaying the session
+    # if the ICOGS_RECORD or ICOGS_REPLAY environment variables are set
+    replay = os.environ.get("ICOGS_REPLAY")
+    if replay:
+        print("Replaying the bus from %s" % replay)
+        return ReplayBus(replay, os.environ.get("ICOGS_REPLAY_TIMING", "0") == "1")
+    bus = bus_class(busnum)
+    record = os.environ.get("ICOGS_RECORD")
+    if record:
+        print("Recording the bus to %s" % record)
+        return RecordingBus(bus, record)
+    return bus
+
+
+def Summarise(filename):
+    # Print the number of reads, writes and errors and the bytes transferred for each register
+    started, transactions = ReadRecording(filename)
+    print("Recording started %s, %d transactions over %.3f seconds" % (time.ctime(started), len(transactions),
+          transactions[-1][0] if len(transactions) > 0 else 0))
+    registers = {}
+    for when, kind, address, register, data in transactions:
+        key = (address, register)
+        if key not in registers:
+            registers[key] = {READ: 0, WRITE: 0, ERROR: 0, "bytes": 0}
+        registers[key][kind] = registers[key][kind] + 1
+        if kind != ERROR:
+            registers[key]["bytes"] = registers[key]["bytes"] + len(data)
+    print("Addr Reg    Reads  Writes  Errors   Bytes")
+    for (address, register), counts in sorted(registers.items()):
+        print("0x%02x 0x%02x %7d %7d %7d %7d" % (address, register, counts[READ], counts[WRITE], counts[ERROR], counts["bytes"]))
+    return
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python3 iCogsRecord.py recording")
+        sys.exit()
+    Summarise(sys.argv[1])
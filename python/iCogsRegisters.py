@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Register Maps
+
+For more information see www.BostinTechnology.com
+
+Describes the registers of each of the iCogs sensors, and the bit fields within them, so the
+readers can decode, dump, compare and set registers from the same description rather than each
+having its own decoding routines.
+
+When the module is loaded a 256 entry table is built for every register in the maps, holding the
+decoded fields for each possible value of the register. Decoding a register, or a whole snapshot
+of registers, is then a lookup in the tables.
+
+Each register is given as
+    address: [name, [fields]]
+or, for the status, source and data registers that change as the sensor runs,
+    address: [name, [fields], VOLATILE]
+and each field as a dictionary with the field name, a description, the mask of the bits in the
+register and optionally the text for each value, created with Field() or Flag().
+
+Reading some volatile registers changes the sensor, e.g. it clears the Rs.2 latched event sources
+and pops a sample from its FIFO, so snapshots only read the configuration registers unless the
+volatile registers are asked for.
+
+Decode(device, reg_addr, byte)              - returns a list of [field, value, text] for the register
+DecodeSnapshot(device, snapshot)            - decodes a dictionary of register values by address
+PrintRegister(device, reg_addr, byte)       - prints the decoded fields of the register
+PrintSnapshot(device, snapshot)             - prints the decoded fields of all registers in the snapshot
+DiffRegister(device, reg_addr, old, new)    - returns a list of the fields that differ in a register
+DiffSnapshots(device, old, new)             - returns a list of the fields that differ
+FieldValues(device, reg_addr, byte)         - returns a dictionary of the value of each field
+EncodeFields(device, reg_addr, fields, byte) - returns byte with each field in the dictionary set
+EncodeField(device, reg_addr, field, value, byte) - returns byte with the field set to value
+ReadSnapshot(bus, address, device, auto_increment, volatile) - reads the mapped registers from the device
+WriteFields(bus, address, device, reg_addr, fields, wait) - sets the fields in one write and verifies them
+WriteField(bus, address, device, reg_addr, field, value) - sets a single field and verifies it
+
+The readers' setters use EncodeFields and WriteFields, so the bit layouts are only given here.
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import logging
+import time
+
+# The time between a write and subsequent read
+WAITTIME = 0.5
+
+# Marks a register whose value changes as the sensor runs, or is changed by reading it
+VOLATILE = True
+
+
+def Field(name, description, mask, values=None):
+    # A bit field within a register, values is an optional dictionary of the text for each value
+    return {"name": name, "description": description, "mask": mask, "values": values}
+
+def Flag(name, description, mask, clear="Disabled", active="Enabled"):
+    # A single bit field within a register, with the text for when it is clear and set
+    return Field(name, description, mask, {0: clear, 1: active})
+
+def Byte(name, description):
+    # A register holding a single 8 bit value
+    return Field(name, description, 0b11111111)
+
+
+LS1 = {
+    0x00: ["COMMAND_I", [
+        Field("OP", "Operation Mode", 0b11100000, {0b000: "Powered down", 0b001: "Measuring ALS once every integration cycle",
+              0b010: "IR Once", 0b101: "Measuring ALS continuously", 0b110: "Measuring IR continuously"}),
+        Flag("FLAG", "Interrupt Flag Bit", 0b00000100, "Interrupt is cleared or not triggered yet", "Interrupt is Triggered"),
+        Field("PRST", "Interrupt Persist Number of Cycles", 0b00000011, {0b00: "1", 0b01: "4", 0b10: "8", 0b11: "16"})]],
+    0x01: ["COMMAND_II", [
+        Field("RES", "ADC Resolution", 0b00001100, {0b00: "16 bit", 0b01: "12 bit", 0b10: "8 bit", 0b11: "4 bit"}),
+        Field("RANGE", "Full Scale Range", 0b00000011, {0b00: "1,000 Lux", 0b01: "4,000 Lux", 0b10: "16,000 Lux", 0b11: "64,000 Lux"})]],
+    0x02: ["DATA_LSB", [Byte("DATA_LSB", "Data LSB")], VOLATILE],
+    0x03: ["DATA_MSB", [Byte("DATA_MSB", "Data MSB")], VOLATILE],
+    0x04: ["INT_LT_LSB", [Byte("INT_LT_LSB", "Interrupt Low Threshold LSB")]],
+    0x05: ["INT_LT_MSB", [Byte("INT_LT_MSB", "Interrupt Low Threshold MSB")]],
+    0x06: ["INT_HT_LSB", [Byte("INT_HT_LSB", "Interrupt High Threshold LSB")]],
+    0x07: ["INT_HT_MSB", [Byte("INT_HT_MSB", "Interrupt High Threshold MSB")]],
+}
+
+TS1 = {
+    0x0F: ["WHO_AM_I", [Byte("WHO_AM_I", "Who Am I")]],
+    0x10: ["AV_CONF", [
+        Field("AVGT", "Quantity of Temperature Samples", 0b00111000, dict((n, "%d" % (2 ** (n + 1))) for n in range(8))),
+        Field("AVGH", "Quantity of Humidity Samples", 0b00000111, dict((n, "%d" % (2 ** (n + 2))) for n in range(8)))]],
+    0x20: ["CTRL_REG1", [
+        Flag("PD", "Power Down Control", 0b10000000, "Power-Down Mode", "Active Mode"),
+        Flag("BDU", "Block Update Mode", 0b00000100, "Continuous Update", "Output Registers Not Updated until MSB and LSB reading"),
+        Field("ODR", "Output Data Rate Configuration", 0b00000011, {0b00: "One Shot", 0b01: "1 Hz", 0b10: "7 Hz", 0b11: "12.5 Hz"})]],
+    0x21: ["CTRL_REG2", [
+        Flag("BOOT", "Reboot Memory Content", 0b10000000, "Normal Mode", "Reboot in progress"),
+        Flag("HEATER", "Heater", 0b00000010, "OFF", "ON"),
+        Flag("ONE_SHOT", "One Shot", 0b00000001, "Waiting for start of conversion", "Conversion started")]],
+    0x22: ["CTRL_REG3", [
+        Flag("DRDY_H_L", "Data Ready Output Signal", 0b10000000, "Active High", "Active Low"),
+        Flag("PP_OD", "Data Ready Output", 0b01000000, "Push-pull", "Open Drain"),
+        Flag("DRDY_EN", "Data Ready Enable", 0b00000100)]],
+    0x27: ["STATUS_REG", [
+        Flag("H_DA", "Humidity data", 0b00000010, "NOT available", "available"),
+        Flag("T_DA", "Temperature data", 0b00000001, "NOT available", "available")], VOLATILE],
+}
+
+PS3_DR_STATUS = [
+    Flag("PTOW", "Pressure / Temperature Data Overwrite", 0b10000000, "No", "Yes"),
+    Flag("POW", "Pressure Data Overwrite", 0b01000000, "No", "Yes"),
+    Flag("TOW", "Temperature Data Overwrite", 0b00100000, "No", "Yes"),
+    Flag("PTDR", "Pressure / Temperature Data Ready", 0b00001000, "No", "Yes"),
+    Flag("PDR", "Pressure Data Ready", 0b00000100, "No", "Yes"),
+    Flag("TDR", "Temperature Data Ready", 0b00000010, "No", "Yes")]
+
+PS3_INTERRUPTS = ["DRDY", "FIFO", "PW", "TW", "PTH", "TTH", "PCHG", "TCHG"]
+
+PS3 = {
+    0x00: ["STATUS", PS3_DR_STATUS, VOLATILE],
+    0x01: ["OUT_P_MSB", [Byte("OUT_P_MSB", "Pressure MSB")], VOLATILE],
+    0x02: ["OUT_P_CSB", [Byte("OUT_P_CSB", "Pressure CSB")], VOLATILE],
+    0x03: ["OUT_P_LSB", [Byte("OUT_P_LSB", "Pressure LSB")], VOLATILE],
+    0x04: ["OUT_T_MSB", [Byte("OUT_T_MSB", "Temperature MSB")], VOLATILE],
+    0x05: ["OUT_T_LSB", [Byte("OUT_T_LSB", "Temperature LSB")], VOLATILE],
+    0x06: ["DR_STATUS", PS3_DR_STATUS, VOLATILE],
+    0x0C: ["WHO_AM_I", [Byte("WHO_AM_I", "Who Am I")]],
+    0x0D: ["F_STATUS", [
+        Flag("F_OVF", "FIFO Overflow", 0b10000000, "No", "Yes"),
+        Flag("F_WMRK_FLAG", "FIFO Watermark Event", 0b01000000, "No", "Yes"),
+        Field("F_CNT", "FIFO Sample Count", 0b00111111)], VOLATILE],
+    0x0F: ["F_SETUP", [
+        Field("F_MODE", "FIFO Mode", 0b11000000, {0b00: "FIFO is disabled", 0b01: "Circular Buffer", 0b10: "Stop accepting samples when overflowed"}),
+        Field("F_WMRK", "FIFO Event Sample Count Watermark", 0b00111111)]],
+    0x12: ["INT_SOURCE", [Flag("SRC_" + name, "Interrupt Source " + name, 1 << (7 - n), "No", "Yes")
+                          for n, name in enumerate(PS3_INTERRUPTS)], VOLATILE],
+    0x13: ["PT_DATA_CFG", [
+        Flag("DREM", "Data Ready Event Mode", 0b00000100),
+        Flag("PDEFE", "Pressure Data Event Flag", 0b00000010),
+        Flag("TDEFE", "Temperature Data Event Flag", 0b00000001)]],
+    0x14: ["BAR_IN_MSB", [Byte("BAR_IN_MSB", "Barometric Input MSB")]],
+    0x15: ["BAR_IN_LSB", [Byte("BAR_IN_LSB", "Barometric Input LSB")]],
+    0x16: ["P_TGT_MSB", [Byte("P_TGT_MSB", "Pressure / Altitude Target MSB")]],
+    0x17: ["P_TGT_LSB", [Byte("P_TGT_LSB", "Pressure / Altitude Target LSB")]],
+    0x18: ["T_TGT", [Byte("T_TGT", "Temperature Target")]],
+    0x19: ["P_WND_MSB", [Byte("P_WND_MSB", "Pressure / Altitude Window MSB")]],
+    0x1A: ["P_WND_LSB", [Byte("P_WND_LSB", "Pressure / Altitude Window LSB")]],
+    0x1B: ["T_WND", [Byte("T_WND", "Temperature Window")]],
+    0x26: ["CTRL_REG1", [
+        Flag("ALT", "Measurement Mode", 0b10000000, "Barometer Mode", "Altimeter Mode"),
+        Flag("RAW", "Raw Mode", 0b01000000),
+        Field("OS", "Oversample Ratio", 0b00111000, dict((n, "%d" % (2 ** n)) for n in range(8))),
+        Flag("RST", "Software Reset", 0b00000100),
+        Flag("OST", "One Shot", 0b00000010),
+        Flag("SBYB", "System Mode", 0b00000001, "STANDBY", "ACTIVE")]],
+    0x27: ["CTRL_REG2", [
+        Flag("LOAD_OUTPUT", "Load Output", 0b00100000),
+        Flag("ALARM_SEL", "Alarm Select", 0b00010000, "Target", "Target and Window"),
+        Field("ST", "Auto Acquisition Time Step", 0b00001111, dict((n, "%d seconds" % (2 ** n)) for n in range(16)))]],
+    0x28: ["CTRL_REG3", [
+        Flag("IPOL1", "INT1 Polarity", 0b00100000, "Active Low", "Active High"),
+        Flag("PP_OD1", "INT1 Output", 0b00010000, "Push-pull", "Open Drain"),
+        Flag("IPOL2", "INT2 Polarity", 0b00000010, "Active Low", "Active High"),
+        Flag("PP_OD2", "INT2 Output", 0b00000001, "Push-pull", "Open Drain")]],
+    0x29: ["CTRL_REG4", [Flag("INT_EN_" + name, "Interrupt Enable " + name, 1 << (7 - n))
+                         for n, name in enumerate(PS3_INTERRUPTS)]],
+    0x2A: ["CTRL_REG5", [Flag("INT_CFG_" + name, "Interrupt Pin " + name, 1 << (7 - n), "INT2", "INT1")
+                         for n, name in enumerate(PS3_INTERRUPTS)]],
+    0x2B: ["OFF_P", [Byte("OFF_P", "Pressure Offset")]],
+    0x2C: ["OFF_T", [Byte("OFF_T", "Temperature Offset")]],
+    0x2D: ["OFF_H", [Byte("OFF_H", "Altitude Offset")]],
+}
+
+RS2_POWERMODES = {0b00: "Normal", 0b01: "Low Noise Low Power", 0b10: "High Resolution", 0b11: "Low Power"}
+
+RS2_INTERRUPTS = [["ASLP", 0b10000000], ["FIFO", 0b01000000], ["TRANS", 0b00100000], ["LNDPRT", 0b00010000],
+                  ["PULSE", 0b00001000], ["FF_MT", 0b00000100], ["DRDY", 0b00000001]]
+
+RS2 = {
+    0x00: ["STATUS", [
+        Flag("ZYXOW", "X, Y, Z Data Overwrite", 0b10000000, "No", "Yes"),
+        Flag("ZOW", "Z Data Overwrite", 0b01000000, "No", "Yes"),
+        Flag("YOW", "Y Data Overwrite", 0b00100000, "No", "Yes"),
+        Flag("XOW", "X Data Overwrite", 0b00010000, "No", "Yes"),
+        Flag("ZYXDR", "X, Y, Z Data Ready", 0b00001000, "No", "Yes"),
+        Flag("ZDR", "Z Data Ready", 0b00000100, "No", "Yes"),
+        Flag("YDR", "Y Data Ready", 0b00000010, "No", "Yes"),
+        Flag("XDR", "X Data Ready", 0b00000001, "No", "Yes")], VOLATILE],
+    # In Fast Read mode, or with the FIFO enabled, these read the packed MSBs or the FIFO instead
+    0x01: ["OUT_X_MSB", [Byte("OUT_X_MSB", "X Axis MSB")], VOLATILE],
+    0x02: ["OUT_X_LSB", [Byte("OUT_X_LSB", "X Axis LSB")], VOLATILE],
+    0x03: ["OUT_Y_MSB", [Byte("OUT_Y_MSB", "Y Axis MSB")], VOLATILE],
+    0x04: ["OUT_Y_LSB", [Byte("OUT_Y_LSB", "Y Axis LSB")], VOLATILE],
+    0x05: ["OUT_Z_MSB", [Byte("OUT_Z_MSB", "Z Axis MSB")], VOLATILE],
+    0x06: ["OUT_Z_LSB", [Byte("OUT_Z_LSB", "Z Axis LSB")], VOLATILE],
+    0x09: ["F_SETUP", [
+        Field("F_MODE", "FIFO Mode", 0b11000000, {0b00: "FIFO is disabled", 0b01: "Contains the most recent samples when overflowed",
+              0b10: "Stops accepting new samples when overflowed", 0b11: "Trigger mode"}),
+        Field("F_WMRK", "FIFO Event Sample Count Watermark", 0b00111111)]],
+    0x0A: ["TRIG_CFG", [
+        Flag("TRIG_TRANS", "FIFO Trigger on Transient", 0b00100000),
+        Flag("TRIG_LNDPRT", "FIFO Trigger on Orientation", 0b00010000),
+        Flag("TRIG_PULSE", "FIFO Trigger on Pulse", 0b00001000),
+        Flag("TRIG_FF_MT", "FIFO Trigger on Freefall / Motion", 0b00000100)]],
+    0x0B: ["SYSMOD", [
+        Flag("FGERR", "FIFO Gate Error", 0b10000000, "NOT detected", "Detected"),
+        Field("FGT", "ODR time units since FIFO Gate Error", 0b01111100),
+        Field("SYSMOD", "System Mode", 0b00000011, {0b00: "Standby", 0b01: "Wake", 0b10: "Sleep"})], VOLATILE],
+    0x0C: ["INT_SOURCE", [Flag("SRC_" + name, "Interrupt Source " + name, mask, "No", "Yes") for name, mask in RS2_INTERRUPTS], VOLATILE],
+    0x0D: ["WHO_AM_I", [Byte("WHO_AM_I", "Who Am I")]],
+    0x0E: ["XYZ_DATA_CFG", [
+        Flag("HPF_OUT", "High Pass Filter Output", 0b00010000),
+        Field("FS", "Full Scale Range", 0b00000011, {0b00: "+/- 2g", 0b01: "+/- 4g", 0b10: "+/- 8g"})]],
+    0x0F: ["HP_FILTER_CUTOFF", [
+        Flag("PULSE_HPF_BYP", "Pulse High Pass Filter Bypass", 0b00100000),
+        Flag("PULSE_LPF_EN", "Pulse Low Pass Filter", 0b00010000),
+        Field("SEL", "High Pass Filter Cutoff Selection", 0b00000011)]],
+    0x15: ["FF_MT_CFG", [
+        Flag("ELE", "Event Latch", 0b10000000),
+        Flag("OAE", "Motion / Freefall Detection", 0b01000000, "Freefall", "Motion"),
+        Flag("ZEFE", "Z Event Flag", 0b00100000),
+        Flag("YEFE", "Y Event Flag", 0b00010000),
+        Flag("XEFE", "X Event Flag", 0b00001000)]],
+    0x16: ["FF_MT_SRC", [
+        Flag("EA", "Motion Event Active", 0b10000000, "No", "Yes"),
+        Flag("ZHE", "Z Motion Event", 0b00100000, "No", "Yes"),
+        Flag("ZHP", "Z Motion Polarity", 0b00010000, "Positive", "Negative"),
+        Flag("YHE", "Y Motion Event", 0b00001000, "No", "Yes"),
+        Flag("YHP", "Y Motion Polarity", 0b00000100, "Positive", "Negative"),
+        Flag("XHE", "X Motion Event", 0b00000010, "No", "Yes"),
+        Flag("XHP", "X Motion Polarity", 0b00000001, "Positive", "Negative")], VOLATILE],
+    0x17: ["FF_MT_THS", [
+        Flag("DBCNTM", "Debounce Counter Mode", 0b10000000, "Decremented", "Cleared"),
+        Field("THS", "Freefall / Motion Threshold (0.063g steps)", 0b01111111)]],
+    0x18: ["FF_MT_COUNT", [Byte("FF_MT_COUNT", "Freefall / Motion Debounce Count")]],
+    0x1D: ["TRANSIENT_CFG", [
+        Flag("ELE", "Event Latch", 0b00010000),
+        Flag("ZTEFE", "Z Transient Event Flag", 0b00001000),
+        Flag("YTEFE", "Y Transient Event Flag", 0b00000100),
+        Flag("XTEFE", "X Transient Event Flag", 0b00000010),
+        Flag("HPF_BYP", "High Pass Filter Bypass", 0b00000001)]],
+    0x1E: ["TRANSIENT_SRC", [
+        Flag("EA", "Transient Event Active", 0b01000000, "No", "Yes"),
+        Flag("ZTRANSE", "Z Transient Event", 0b00100000, "No", "Yes"),
+        Flag("Z_TRANS_POL", "Z Transient Polarity", 0b00010000, "Positive", "Negative"),
+        Flag("YTRANSE", "Y Transient Event", 0b00001000, "No", "Yes"),
+        Flag("Y_TRANS_POL", "Y Transient Polarity", 0b00000100, "Positive", "Negative"),
+        Flag("XTRANSE", "X Transient Event", 0b00000010, "No", "Yes"),
+        Flag("X_TRANS_POL", "X Transient Polarity", 0b00000001, "Positive", "Negative")], VOLATILE],
+    0x1F: ["TRANSIENT_THS", [
+        Flag("DBCNTM", "Debounce Counter Mode", 0b10000000, "Decremented", "Cleared"),
+        Field("THS", "Transient Threshold (0.063g steps)", 0b01111111)]],
+    0x20: ["TRANSIENT_COUNT", [Byte("TRANSIENT_COUNT", "Transient Debounce Count")]],
+    0x21: ["PULSE_CFG", [
+        Flag("DPA", "Double Pulse Abort", 0b10000000),
+        Flag("ELE", "Event Latch", 0b01000000),
+        Flag("ZDPEFE", "Z Double Pulse Event Flag", 0b00100000),
+        Flag("ZSPEFE", "Z Single Pulse Event Flag", 0b00010000),
+        Flag("YDPEFE", "Y Double Pulse Event Flag", 0b00001000),
+        Flag("YSPEFE", "Y Single Pulse Event Flag", 0b00000100),
+        Flag("XDPEFE", "X Double Pulse Event Flag", 0b00000010),
+        Flag("XSPEFE", "X Single Pulse Event Flag", 0b00000001)]],
+    0x22: ["PULSE_SRC", [
+        Flag("EA", "Pulse Event Active", 0b10000000, "No", "Yes"),
+        Flag("AXZ", "Z Pulse Event", 0b01000000, "No", "Yes"),
+        Flag("AXY", "Y Pulse Event", 0b00100000, "No", "Yes"),
+        Flag("AXX", "X Pulse Event", 0b00010000, "No", "Yes"),
+        Flag("DPE", "Pulse Type", 0b00001000, "Single Pulse", "Double Pulse"),
+        Flag("POLZ", "Z Pulse Polarity", 0b00000100, "Positive", "Negative"),
+        Flag("POLY", "Y Pulse Polarity", 0b00000010, "Positive", "Negative"),
+        Flag("POLX", "X Pulse Polarity", 0b00000001, "Positive", "Negative")], VOLATILE],
+    0x23: ["PULSE_THSX", [Field("THSX", "X Pulse Threshold", 0b01111111)]],
+    0x24: ["PULSE_THSY", [Field("THSY", "Y Pulse Threshold", 0b01111111)]],
+    0x25: ["PULSE_THSZ", [Field("THSZ", "Z Pulse Threshold", 0b01111111)]],
+    0x26: ["PULSE_TMLT", [Byte("TMLT", "Pulse Time Limit")]],
+    0x27: ["PULSE_LTCY", [Byte("LTCY", "Pulse Latency")]],
+    0x28: ["PULSE_WIND", [Byte("WIND", "Second Pulse Time Window")]],
+    0x29: ["ASLP_COUNT", [Byte("ASLP_COUNT", "Auto Sleep Count")]],
+    0x2A: ["CTRL_REG1", [
+        Field("ASLP_RATE", "Auto Sleep Data Rate", 0b11000000, {0b00: "50 Hz", 0b01: "12.5 Hz", 0b10: "6.25 Hz", 0b11: "1.56 Hz"}),
+        Field("DR", "Data Rate", 0b00111000, {0b000: "800 Hz", 0b001: "400 Hz", 0b010: "200 Hz", 0b011: "100 Hz",
+              0b100: "50 Hz", 0b101: "12.5 Hz", 0b110: "6.25 Hz", 0b111: "1.56 Hz"}),
+        Flag("F_READ", "Fast Read Mode", 0b00000010),
+        Flag("ACTIVE", "System Mode", 0b00000001, "Standby", "Active")]],
+    0x2B: ["CTRL_REG2", [
+        Flag("ST", "Self Test", 0b10000000),
+        Flag("RST", "Software Reset", 0b01000000),
+        Field("SMODS", "Sleep Mode Power Mode", 0b00011000, RS2_POWERMODES),
+        Flag("SLPE", "Auto Sleep Mode Flag", 0b00000100),
+        Field("MODS", "Active Mode Power Mode", 0b00000011, RS2_POWERMODES)]],
+    0x2C: ["CTRL_REG3", [
+        Flag("FIFO_GATE", "FIFO Gate", 0b10000000),
+        Flag("WAKE_TRANS", "Wake from Transient", 0b01000000),
+        Flag("WAKE_LNDPRT", "Wake from Orientation", 0b00100000),
+        Flag("WAKE_PULSE", "Wake from Pulse", 0b00010000),
+        Flag("WAKE_FF_MT", "Wake from Freefall / Motion", 0b00001000),
+        Flag("IPOL", "Interrupt Polarity", 0b00000010, "Active Low", "Active High"),
+        Flag("PP_OD", "Interrupt Output", 0b00000001, "Push-pull", "Open Drain")]],
+    0x2D: ["CTRL_REG4", [Flag("INT_EN_" + name, "Interrupt Enable " + name, mask) for name, mask in RS2_INTERRUPTS]],
+    0x2E: ["CTRL_REG5", [Flag("INT_CFG_" + name, "Interrupt Pin " + name, mask, "INT2", "INT1") for name, mask in RS2_INTERRUPTS]],
+    0x2F: ["OFF_X", [Byte("OFF_X", "X Axis Offset (2mg steps)")]],
+    0x30: ["OFF_Y", [Byte("OFF_Y", "Y Axis Offset (2mg steps)")]],
+    0x31: ["OFF_Z", [Byte("OFF_Z", "Z Axis Offset (2mg steps)")]],
+}
+
+# The register maps by device name
+MAPS = {"Ls.1": LS1, "Ps.3": PS3, "Rs.2": RS2, "Ts.1": TS1}
+
+
+def FieldShift(mask):
+    # Return the number of bits the field is shifted up within the register
+    shift = 0
+    while (mask >> shift) & 1 == 0:
+        shift = shift + 1
+    return shift
+
+def DecodeByte(fields, byte):
+    # Decode the given value of a register into a list of [field, value, text] for each field
+    decoded = []
+    for field in fields:
+        value = (byte & field["mask"]) >> field["shift"]
+        if field["values"] is None:
+            text = "%s: %d" % (field["description"], value)
+        else:
+            text = "%s: %s" % (field["description"], field["values"].get(value, "Reserved (%d)" % value))
+        decoded.append([field["name"], value, text])
+    return decoded
+
+def Blocks(addresses):
+    # Return the blocks of consecutive register addresses as [start, length]
+    blocks = []
+    for reg_addr in sorted(addresses):
+        if len(blocks) > 0 and blocks[-1][0] + blocks[-1][1] == reg_addr:
+            blocks[-1][1] = blocks[-1][1] + 1
+        else:
+            blocks.append([reg_addr, 1])
+    return blocks
+
+def IsVolatile(device, reg_addr):
+    # Return True if the register is marked VOLATILE in the map
+    return len(MAPS[device][reg_addr]) > 2 and MAPS[device][reg_addr][2] == VOLATILE
+
+def BuildTables(device_map):
+    # Build the 256 entry decode table for every register in the map, and the blocks of consecutive
+    # registers used to read a snapshot, with and without the volatile registers
+    tables = {}
+    for reg_addr, register in device_map.items():
+        for field in register[1]:
+            field["shift"] = FieldShift(field["mask"])
+        tables[reg_addr] = [DecodeByte(register[1], byte) for byte in range(256)]
+    configuration = [reg_addr for reg_addr, register in device_map.items() if len(register) < 3 or register[2] != VOLATILE]
+    return {"tables": tables, "blocks": Blocks(device_map), "configuration": Blocks(configuration)}
+
+# The decode tables and snapshot blocks by device name, built when the module is loaded
+decoders = dict((device, BuildTables(device_map)) for device, device_map in MAPS.items())
+
+
+def RegisterName(device, reg_addr):
+    # Return the name of the register
+    return MAPS[device][reg_addr][0]
+
+def Decode(device, reg_addr, byte):
+    # Return the list of [field, value, text] for the given value of the register
+    return decoders[device]["tables"][reg_addr][byte]
+
+def DecodeSnapshot(device, snapshot):
+    # Decode a dictionary of register values by address, returns a dictionary of the decoded fields
+    tables = decoders[device]["tables"]
+    return dict((reg_addr, tables[reg_addr][byte]) for reg_addr, byte in snapshot.items() if reg_addr in tables)
+
+def PrintRegister(device, reg_addr, byte):
+    # Print the decoded fields of the register, one per line
+    for name, value, text in Decode(device, reg_addr, byte):
+        logging.debug("%s %s (%x) %s %d" % (device, RegisterName(device, reg_addr), reg_addr, name, value))
+        print("%s %s" % (device, text))
+    return
+
+def PrintSnapshot(device, snapshot):
+    # Print the decoded fields of every register in the snapshot
+    for reg_addr, decoded in sorted(DecodeSnapshot(device, snapshot).items()):
+        print("%s (0x%02x): 0x%02x" % (RegisterName(device, reg_addr), reg_addr, snapshot[reg_addr]))
+        for name, value, text in decoded:
+            print("    %s" % text)
+    return
+
+def DiffRegister(device, reg_addr, old, new):
+    # Compare two values of a register and return a list of [field name, old text, new text] for each
+    # field that has changed, or None if the register is not in the map
+    table = decoders[device]["tables"].get(reg_addr)
+    if table is None:
+        return None
+    return [[after[0], before[2], after[2]] for before, after in zip(table[old], table[new]) if before[1] != after[1]]
+
+def DiffSnapshots(device, old, new):
+    # Compare two snapshots of the registers and return a list of the fields that have changed
+    # Each change is [register address, register name, field name, old text, new text]
+    changes = []
+    for reg_addr, byte in new.items():
+        if old.get(reg_addr, byte) == byte:
+            continue
+        for field, before, after in DiffRegister(device, reg_addr, old[reg_addr], byte) or []:
+            changes.append([reg_addr, RegisterName(device, reg_addr), field, before, after])
+    return changes
+
+def FindField(device, reg_addr, field_name):
+    # Return the description of the named field in the register
+    for field in MAPS[device][reg_addr][1]:
+        if field["name"] == field_name:
+            return field
+    raise ValueError("%s register %x has no field %s" % (device, reg_addr, field_name))
+
+def FieldValues(device, reg_addr, byte):
+    # Return a dictionary of the value of each field for the given value of the register
+    return dict((name, value) for name, value, text in Decode(device, reg_addr, byte))
+
+def EncodeFields(device, reg_addr, fields, byte):
+    # Return the register value byte with each field in the dictionary of field names and values set
+    for field_name, value in fields.items():
+        field = FindField(device, reg_addr, field_name)
+        if (value << field["shift"]) & ~field["mask"] or (field["values"] is not None and value not in field["values"]):
+            raise ValueError("%d is not a valid value for %s %s" % (value, device, field_name))
+        byte = (byte & ~field["mask"]) | (value << field["shift"])
+    return byte
+
+def EncodeField(device, reg_addr, field_name, value, byte):
+    # Return the register value byte with the named field set to value
+    return EncodeFields(device, reg_addr, {field_name: value}, byte)
+
+def ReadSnapshot(bus, address, device, auto_increment=0, volatile=False):
+    # Read the configuration registers in the map for the device, a block of consecutive registers
+    # at a time, and the volatile registers as well if volatile is True
+    # Reading the volatile registers can clear latched events and data ready flags, and pop FIFO samples
+    # auto_increment is added to the start register of each block, for devices such as the Ts.1
+    # that need bit 7 set to read more than one register
+    # Returns a dictionary of the register values by address
+    if volatile:
+        blocks = decoders[device]["blocks"]
+    else:
+        blocks = decoders[device]["configuration"]
+    if hasattr(bus, "read_combined"):
+        # All the blocks can be read in a single transaction
+        data = bus.read_combined(address, [(start | auto_increment, length) for start, length in blocks])
+    else:
+        data = [bus.read_i2c_block_data(address, start | auto_increment, length) for start, length in blocks]
+    snapshot = {}
+    for (start, length), values in zip(blocks, data):
+        for offset in range(length):
+            snapshot[start + offset] = values[offset]
+    logging.debug("%s register snapshot %s" % (device, snapshot))
+    return snapshot
+
+def WriteFields(bus, address, device, reg_addr, fields, wait=WAITTIME):
+    # Set each field in the dictionary of field names and values in a single write, leaving the other
+    # fields unchanged, waiting wait seconds before reading the register back to verify it
+    # Returns True if all the fields were set
+    byte = bus.read_byte_data(address, reg_addr)
+    towrite = EncodeFields(device, reg_addr, fields, byte)
+    names = ", ".join(fields)
+    logging.info("%s %s (%x) before setting %s: %x" % (device, RegisterName(device, reg_addr), reg_addr, names, byte))
+    if towrite != byte:
+        bus.write_byte_data(address, reg_addr, towrite)
+        time.sleep(wait)
+        byte = bus.read_byte_data(address, reg_addr)
+        logging.info("%s %s (%x) after setting %s: %x" % (device, RegisterName(device, reg_addr), reg_addr, names, byte))
+    values = FieldValues(device, reg_addr, byte)
+    return all(values[field_name] == value for field_name, value in fields.items())
+
+def WriteField(bus, address, device, reg_addr, field_name, value):
+    # Set the named field of the register to value, leaving the other fields unchanged, and verify it
+    # Returns True if the field was set
+    return WriteFields(bus, address, device, reg_addr, {field_name: value})
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Periodic Sampler
+
+For more information see www.BostinTechnology.com
+
+Calling a reading function and then sleeping for the period drifts by the time the reading takes
+on every cycle. A PeriodicSampler instead schedules each reading at an absolute deadline, the
+start time plus a whole number of periods on the monotonic clock, so the readings stay evenly
+spaced however long each one takes.
+
+Each sample is timestamped at the middle of the bus read, and records its jitter, the time the
+read started after its deadline. When a reading takes so long that one or more deadlines have
+passed, those deadlines are skipped and counted as overruns, so the following samples stay on
+the same grid.
+
+Histograms of the jitter and the read durations are kept, and can be printed with Report().
+
+sampler = iCogsSampler.PeriodicSampler(name, read, period)
+stream = sampler.Start()                - take samples on a thread, publishing them on the stream
+sampler.Stop()
+samples = sampler.Collect(count)        - take count samples in the calling thread
+sampler.Report()                        - print the jitter and read duration histograms
+
+read is a function taking no parameters, returning a dictionary of the values read, e.g.
+{"temperature": 21.5, "humidity": 45.2}
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import iCogsStream
+import logging
+import threading
+import time
+
+# The upper limits, in seconds, of the bins of the jitter and read duration histograms
+# The last bin counts everything above the highest limit
+HISTOGRAMBINS = [0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1]
+
+
+def HistogramBin(value):
+    # Return the index of the histogram bin for the value
+    for index, limit in enumerate(HISTOGRAMBINS):
+        if value <= limit:
+            return index
+    return len(HISTOGRAMBINS)
+
+
+class PeriodicSampler:
+    # Readings at a fixed period on absolute deadlines, with jitter and overrun accounting
+
+    def __init__(self, name, read, period):
+        self.name = name
+        self.read = read
+        self.period = period
+        self.stream = iCogsStream.SampleStream(name)
+        self.cancel = threading.Event()
+        self.thread = None
+        self.Reset()
+
+    def Reset(self):
+        # Clear the statistics
+        self.samples = 0
+        self.overruns = 0
+        self.errors = 0
+        self.max_jitter = 0.0
+        self.jitter = [0] * (len(HISTOGRAMBINS) + 1)
+        self.durations = [0] * (len(HISTOGRAMBINS) + 1)
+        return
+
+    def Sample(self, deadline):
+        # Take a reading, which should start at deadline on the monotonic clock
+        # Returns the sample, or None if the read failed
+        started = time.monotonic()
+        wall = time.time()
+        try:
+            values = self.read()
+        except IOError as err:
+            logging.warning("%s reading failed: %s" % (self.name, err))
+            self.errors = self.errors + 1
+            return None
+        duration = time.monotonic() - started
+        jitter = started - deadline
+        self.samples = self.samples + 1
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.jitter[HistogramBin(jitter)] = self.jitter[HistogramBin(jitter)] + 1
+        self.durations[HistogramBin(duration)] = self.durations[HistogramBin(duration)] + 1
+        sample = {"time": wall + duration / 2, "monotonic": started + duration / 2, "jitter": jitter, "duration": duration}
+        sample.update(values)
+        return sample
+
+    def Samples(self):
+        # Generate the samples on their deadlines until cancelled
+        start = time.monotonic()
+        cycle = 0
+        while not self.cancel.is_set():
+            deadline = start + cycle * self.period
+            delay = deadline - time.monotonic()
+            if delay > 0 and self.cancel.wait(delay):
+                break
+            sample = self.Sample(deadline)
+            if sample is not None:
+                yield sample
+            # The next deadline is the first one that has not already passed
+            cycle = cycle + 1
+            late = int((time.monotonic() - start) / self.period) + 1 - cycle
+            if late > 0:
+                logging.debug("%s overrun, %d deadlines missed" % (self.name, late))
+                self.overruns = self.overruns + late
+                cycle = cycle + late
+        return
+
+    def Collect(self, count):
+        # Take count samples in the calling thread, returns the list of samples
+        samples = []
+        self.cancel.clear()
+        for sample in self.Samples():
+            samples.append(sample)
+            if len(samples) >= count:
+                break
+        return samples
+
+    def Run(self):
+        # Publish the samples on the stream until cancelled
+        for sample in self.Samples():
+            self.stream.Publish(sample)
+        return
+
+    def Start(self):
+        # Start taking samples on a thread, returns the stream the samples are published on
+        self.cancel.clear()
+        self.thread = threading.Thread(target=self.Run, name=self.name, daemon=True)
+        self.thread.start()
+        logging.info("%s started with a period of %f seconds" % (self.name, self.period))
+        return self.stream
+
+    def Stop(self):
+        # Stop taking samples
+        self.cancel.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logging.info("%s stopped after %d samples, %d overruns, %d errors" % (self.name, self.samples, self.overruns, self.errors))
+        return
+
+    def Report(self):
+        # Print the sample counts and the jitter and read duration histograms
+        print("%s: %d samples every %f seconds, %d deadlines missed, %d read errors, maximum jitter %.6f seconds"
+              % (self.name, self.samples, self.period, self.overruns, self.errors, self.max_jitter))
+        print("    Up to (ms)    Jitter  Duration")
+        labels = ["%10.1f" % (limit * 1000) for limit in HISTOGRAMBINS] + ["     above"]
+        for label, jitter, duration in zip(labels, self.jitter, self.durations):
+            print("    %s %9d %9d" % (label, jitter, duration))
+        return
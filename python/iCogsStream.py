@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Sample Streams
+
+For more information see www.BostinTechnology.com
+
+A SampleStream passes samples or events from the thread reading a sensor to any number of
+subscribers. Each subscriber has its own bounded queue. When a queue is full the oldest sample is
+discarded, so a slow subscriber never holds up the thread reading the sensor. The number of
+samples discarded is counted for each subscriber.
+
+Samples are dictionaries, and always contain a "time" entry with the time the sample was taken.
+
+stream = iCogsStream.SampleStream(name)
+queue = stream.Subscribe(maxsize)       - returns a queue.Queue to read samples from
+stream.Unsubscribe(queue)
+stream.Publish(sample)                  - pass the sample to every subscriber
+stream.Dropped(queue)                   - the number of samples discarded for the subscriber
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import logging
+import queue
+import threading
+
+# The default number of samples held for each subscriber
+QUEUESIZE = 100
+
+
+class SampleStream:
+    # Fan out of samples to subscribers with a bounded queue each
+
+    def __init__(self, name):
+        self.name = name
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def Subscribe(self, maxsize=QUEUESIZE):
+        # Add a subscriber and return the queue its samples are placed in
+        subscriber = queue.Queue(maxsize)
+        with self.lock:
+            self.subscribers[subscriber] = 0
+        logging.info("%s subscriber added with queue size %d" % (self.name, maxsize))
+        return subscriber
+
+    def Unsubscribe(self, subscriber):
+        # Remove a subscriber, samples already in its queue are left there
+        with self.lock:
+            dropped = self.subscribers.pop(subscriber, 0)
+        logging.info("%s subscriber removed, %d samples were dropped" % (self.name, dropped))
+        return
+
+    def Publish(self, sample):
+        # Pass the sample to every subscriber, discarding the oldest sample if a queue is full
+        with self.lock:
+            self.published = self.published + 1
+            for subscriber in self.subscribers:
+                while True:
+                    try:
+                        subscriber.put_nowait(sample)
+                        break
+                    except queue.Full:
+                        try:
+                            subscriber.get_nowait()
+                            self.subscribers[subscriber] = self.subscribers[subscriber] + 1
+                        except queue.Empty:
+                            pass
+        return
+
+    def Dropped(self, subscriber):
+        # Return the number of samples discarded because the subscriber's queue was full
+        with self.lock:
+            return self.subscribers.get(subscriber, 0)
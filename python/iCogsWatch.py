@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""
+iCogs Register Watch
+
+For more information see www.BostinTechnology.com
+
+Rather than dumping all the registers repeatedly and comparing them by eye, a RegisterWatch reads
+a chosen range of registers with block reads at a fixed rate and reports only the registers, and
+the bit fields within them, that have changed since the previous read.
+
+Each read is copied into the spare one of two buffers, which is then compared with the previous
+read and becomes the current buffer. The changes are decoded using the register maps in
+iCogsRegisters, and registers not in the map are reported as their raw values.
+
+Each change is published on the watch's SampleStream as a dictionary with the time of the read,
+the register address and name, the old and new values and the list of changed fields.
+
+watch = iCogsWatch.RegisterWatch(bus, address, device, start, length, auto_increment)
+stream = watch.Start(rate)              - start reading at rate reads per second on a thread
+watch.Stop()
+Watch(bus, address, device, start, length, rate, auto_increment) - print changes until Ctrl-C
+
+Note: Some registers are cleared by reading them, e.g. the Rs.2 PULSE_SRC and TRANSIENT_SRC,
+so watching them changes the behaviour of the sensor.
+
+The code here is experimental, and is not intended to be used in a production environment. It
+demonstrates the basics of what is required to get the Raspberry Pi receiving data from the
+iCogs range of sensors.
+
+This program is free software; you can redistribute it and / or modify it under the terms of
+the GNU General Public licence as published by the Free Foundation version 2 of the licence.
+
+"""
+
+import iCogsRegisters
+import iCogsStream
+import logging
+import threading
+import time
+
+# The largest block that can be read in one SMBus block read
+MAXBLOCK = 32
+
+
+class RegisterWatch:
+    # Repeated block reads of a range of registers, publishing the changes between reads
+
+    def __init__(self, bus, address, device, start, length, auto_increment=0):
+        # bus is the SMBus or iCogsBus, address the sensor address and device the name of the register map
+        # auto_increment is added to the start register of each block read, for devices such as
+        # the Ts.1 that need bit 7 set to read more than one register
+        self.bus = bus
+        self.address = address
+        self.device = device
+        self.start = start
+        self.length = length
+        self.blocks = [[reg_addr | auto_increment, min(MAXBLOCK, start + length - reg_addr)]
+                       for reg_addr in range(start, start + length, MAXBLOCK)]
+        self.buffers = [bytearray(length), bytearray(length)]
+        self.current = 0
+        self.changes = iCogsStream.SampleStream("%s Register Watch" % device)
+        self.reads = 0
+        self.overruns = 0
+        self.cancel = threading.Event()
+        self.thread = None
+
+    def Snapshot(self):
+        # Read the registers into the spare buffer and make it the current one
+        # Returns the time of the read
+        spare = self.buffers[1 - self.current]
+        if hasattr(self.bus, "read_combined"):
+            data = self.bus.read_combined(self.address, self.blocks)
+        else:
+            data = [self.bus.read_i2c_block_data(self.address, reg_addr, length) for reg_addr, length in self.blocks]
+        read_time = time.time()
+        offset = 0
+        for values in data:
+            spare[offset:offset + len(values)] = bytes(values)
+            offset = offset + len(values)
+        self.current = 1 - self.current
+        self.reads = self.reads + 1
+        return read_time
+
+    def Compare(self, read_time):
+        # Publish a change for each register that differs between the current and previous reads
+        new = self.buffers[self.current]
+        old = self.buffers[1 - self.current]
+        if new == old:
+            return 0
+        changed = 0
+        for offset in range(self.length):
+            if new[offset] == old[offset]:
+                continue
+            reg_addr = self.start + offset
+            fields = iCogsRegisters.DiffRegister(self.device, reg_addr, old[offset], new[offset])
+            if fields is None:
+                name = "0x%02x" % reg_addr
+            else:
+                name = iCogsRegisters.RegisterName(self.device, reg_addr)
+            self.changes.Publish({"time": read_time, "register": reg_addr, "name": name,
+                                  "old": old[offset], "new": new[offset], "fields": fields})
+            changed = changed + 1
+        return changed
+
+    def Run(self, rate):
+        # Read the registers rate times per second until cancelled, publishing the changes
+        # The first read is the starting point that later reads are compared with, it is retried
+        # until it succeeds
+        interval = 1 / rate
+        while True:
+            try:
+                self.Snapshot()
+                break
+            except IOError as err:
+                logging.warning("%s register watch first read failed: %s" % (self.device, err))
+                if self.cancel.wait(interval):
+                    return
+        next_read = time.monotonic() + interval
+        while not self.cancel.is_set():
+            delay = next_read - time.monotonic()
+            if delay > 0:
+                if self.cancel.wait(delay):
+                    break
+            else:
+                # Reading is falling behind, so skip the missed reads rather than catching up
+                missed = int(-delay / interval)
+                self.overruns = self.overruns + missed
+                next_read = next_read + missed * interval
+            next_read = next_read + interval
+            try:
+                read_time = self.Snapshot()
+            except IOError as err:
+                logging.warning("%s register watch read failed: %s" % (self.device, err))
+                continue
+            self.Compare(read_time)
+        return
+
+    def Start(self, rate):
+        # Start reading the registers on a thread, returns the stream the changes are published on
+        self.cancel.clear()
+        self.thread = threading.Thread(target=self.Run, args=(rate,), name=self.changes.name, daemon=True)
+        self.thread.start()
+        logging.info("%s started watching %d registers from %x at %f reads per second" % (self.device, self.length, self.start, rate))
+        return self.changes
+
+    def Stop(self):
+        # Stop reading the registers
+        self.cancel.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        logging.info("%s stopped watching registers after %d reads, %d missed" % (self.device, self.reads, self.overruns))
+        return
+
+
+def PrintChange(change):
+    # Print a change published by a RegisterWatch, with the fields that changed
+    stamp = time.strftime("%H:%M:%S", time.localtime(change["time"])) + ("%.3f" % (change["time"] % 1))[1:]
+    print("%s %s (0x%02x): 0x%02x -> 0x%02x" % (stamp, change["name"], change["register"], change["old"], change["new"]))
+    for field, before, after in change["fields"] or []:
+        print("    %s -> %s" % (before, after.split(": ", 1)[-1]))
+    return
+
+def Watch(bus, address, device, start, length, rate, auto_increment=0):
+    # Watch the registers and print the changes as they happen until Ctrl-C is pressed
+    watch = RegisterWatch(bus, address, device, start, length, auto_increment)
+    changes = watch.changes.Subscribe()
+    watch.Start(rate)
+    print("Watching %d registers from 0x%02x, press Ctrl-C to stop" % (length, start))
+    try:
+        while True:
+            PrintChange(changes.get())
+    except KeyboardInterrupt:
+        pass
+    watch.Stop()
+    watch.changes.Unsubscribe(changes)
+    print("\n%d reads, %d reads missed" % (watch.reads, watch.overruns))
+    return